@@ -12,7 +12,7 @@ from wandb.sdk.lib.hashutil import hex_to_b64_id, b64_to_hex_id
 
 
 from . import uris
-from . import util
+from . import cache
 from . import errors
 from . import wandb_client_api
 from . import file_base
@@ -51,6 +51,40 @@ class WandbArtifactManifestV1(typing.TypedDict):
     contents: typing.Dict[str, WandbArtifactManifestEntry]
 
 
+@dataclasses.dataclass
+class WandbArtifactManifestDir:
+    # Total size of all files under this directory
+    size: int = 0
+    # Name -> full path, for files directly in this directory
+    files: dict[str, str] = dataclasses.field(default_factory=dict)
+    # Name -> full path of the first file under it, for sub directories
+    dirs: dict[str, str] = dataclasses.field(default_factory=dict)
+
+
+def build_manifest_dir_index(
+    paths: typing.Iterable[str],
+    get_entry: typing.Callable[[str], typing.Any],
+) -> dict[str, WandbArtifactManifestDir]:
+    """Index the directories of a manifest by path ("" is the root)."""
+    index: dict[str, WandbArtifactManifestDir] = {}
+    for path in paths:
+        entry = get_entry(path)
+        size = entry["size"] if entry is not None and entry["size"] is not None else 0
+        parts = path.split("/")
+        dir_path = ""
+        for i, part in enumerate(parts):
+            dir_ = index.get(dir_path)
+            if dir_ is None:
+                dir_ = index[dir_path] = WandbArtifactManifestDir()
+            dir_.size += size
+            if i == len(parts) - 1:
+                dir_.files[part] = path
+            else:
+                dir_.dirs.setdefault(part, path)
+                dir_path = part if i == 0 else dir_path + "/" + part
+    return index
+
+
 # We used to use wandb.sdk.wandb_artifacts.ArtifactManifest directly, but it
 # is expensive to construct because it makes new objects for every entry and
 # causes a lot of memory/gc churn. This implementation leaves the manifest
@@ -62,6 +96,11 @@ class WandbArtifactManifest:
         V2 = "V2"
 
     _manifest_json: WandbArtifactManifestV1
+    # Built on first directory lookup. Manifests are shared through the
+    # process-wide manifest cache, so this is only built once per manifest.
+    _dir_index: typing.Optional[
+        dict[str, WandbArtifactManifestDir]
+    ] = dataclasses.field(default=None, compare=False, repr=False)
 
     @property
     def _storage_policy_config(self):
@@ -86,6 +125,18 @@ class WandbArtifactManifest:
             k for k in self._manifest_json["contents"].keys() if k.startswith(dir_path)
         ]
 
+    def get_dir(self, path: str) -> typing.Optional[WandbArtifactManifestDir]:
+        if self._dir_index is None:
+            self._dir_index = build_manifest_dir_index(
+                self._manifest_json["contents"].keys(), self.get_entry_by_path
+            )
+        return self._dir_index.get(path)
+
+    def approx_size_bytes(self) -> int:
+        # Roughly what a parsed entry (path, digest, size, ...) and its index
+        # entries take in memory.
+        return 1024 + 512 * len(self._manifest_json["contents"])
+
 
 # TODO: Get rid of this, we have the new wandb api service! But this
 # is still used in a couple places.
@@ -583,7 +634,18 @@ class WandbArtifact(artifact_fs.FilesystemArtifact):
             raise errors.WeaveInternalError(
                 'cannot get path info for unsaved artifact"'
             )
-        return self.io_service.manifest(self._read_artifact_uri)
+        from . import wandb_file_manager
+
+        # Check the process-wide cache first, to skip the io service round
+        # trip (and in process mode, re-pickling the manifest).
+        manifest_path = wandb_file_manager.manifest_path(self._read_artifact_uri)
+        manifest = wandb_file_manager.get_manifest_cache().get(manifest_path)
+        if not isinstance(manifest, cache.LruSizeBoundedCache.NotFound):
+            return manifest
+        manifest = self.io_service.manifest(self._read_artifact_uri)
+        if isinstance(manifest, WandbArtifactManifest):
+            wandb_file_manager.cache_manifest(manifest_path, manifest)
+        return manifest
 
     def digest(self, path: str) -> typing.Optional[str]:
         manifest_entry = self._manifest_entry(path)
@@ -630,53 +692,32 @@ class WandbArtifact(artifact_fs.FilesystemArtifact):
             return artifact_fs.FilesystemArtifactFile(self, path)
 
         # This is not a file, assume its a directory. If not, we'll return an empty result.
-        dir_paths = manifest.get_paths_in_directory(path)
+        dir_ = manifest.get_dir(path)
+        if dir_ is None:
+            return None
+        files = {
+            name: artifact_fs.FilesystemArtifactFile(self, file_path)
+            for name, file_path in dir_.files.items()
+        }
         sub_dirs: dict[str, file_base.SubDir] = {}
-        files = {}
-        total_size = 0
-        sub_dir_sizes = {}
-        cwd = os.getcwd()
-        for entry_path in dir_paths:
-            entry = manifest.get_entry_by_path(entry_path)
-            path_size = (
-                entry["size"] if entry is not None and entry["size"] is not None else 0
+        for dir_name, first_path in dir_.dirs.items():
+            sub_dir = manifest.get_dir(
+                dir_name if path == "" else path + "/" + dir_name
+            )
+            if sub_dir is None:
+                continue
+            sub_dirs[dir_name] = file_base.SubDir(
+                first_path,
+                sub_dir.size,
+                {name: 1 for name in sub_dir.dirs},
+                {
+                    name: artifact_fs.FilesystemArtifactFile(self, file_path)
+                    for name, file_path in sub_dir.files.items()
+                },
             )
-            total_size += path_size
-
-            # this used to be os.path.relpath but that called os.getcwd() every time
-            # that turned out to be a bottleneck in production for artifacts with many
-            # dir paths, so we use our own implementation that takes the cwd as input
-            # and doesn't need to ever call os.getcwd()
-            rel_path = util.relpath_no_syscalls(entry_path, path, cwd)
-            rel_path_parts = rel_path.split("/")
-            if len(rel_path_parts) == 1:
-                files[rel_path_parts[0]] = artifact_fs.FilesystemArtifactFile(
-                    self,
-                    entry_path,
-                )
-            else:
-                dir_name = rel_path_parts[0]
-                if dir_name not in sub_dirs:
-                    dir_ = file_base.SubDir(entry_path, 0, {}, {})
-                    sub_dir_sizes[dir_name] = 0
-                    sub_dirs[dir_name] = dir_
-                sub_dir_sizes[dir_name] += path_size
-                dir_ = sub_dirs[dir_name]
-                if len(rel_path_parts) == 2:
-                    dir_files = typing.cast(dict, dir_.files)
-                    dir_files[rel_path_parts[1]] = artifact_fs.FilesystemArtifactFile(
-                        self,
-                        entry_path,
-                    )
-                else:
-                    dir_.dirs[rel_path_parts[1]] = 1
         if not sub_dirs and not files:
             return None
-        for dir_name, dir_ in sub_dirs.items():
-            dir_.size = sub_dir_sizes[dir_name]
-        return artifact_fs.FilesystemArtifactDir(
-            self, path, total_size, sub_dirs, files
-        )
+        return artifact_fs.FilesystemArtifactDir(self, path, dir_.size, sub_dirs, files)
 
     def _get_file_paths(self) -> list[str]:
         manifest = self._manifest()
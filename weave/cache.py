@@ -1,5 +1,7 @@
+import collections
 import typing
 import datetime
+import threading
 
 from . import engine_trace
 from . import wandb_api
@@ -81,3 +83,101 @@ class LruTimeWindowCache(typing.Generic[CacheKeyType, CacheValueType]):
             del self._cache[full_key]
         self._cache[full_key] = (now, value)
         self._prune(now)
+
+
+class LruSizeBoundedCache(typing.Generic[CacheKeyType, CacheValueType]):
+    """A thread-safe LRU cache bounded by entry count and approximate size in bytes.
+
+    Entries may be given a ttl, after which they are treated as missing.
+    Respects the user cache key, so that different users don't share the same cache.
+    """
+
+    class NotFound:
+        pass
+
+    NOT_FOUND = NotFound()
+
+    def __init__(
+        self,
+        max_entries: int,
+        max_bytes: int,
+        stats_name: str = "weave.cache",
+        now_fn: typing.Callable[[], datetime.datetime] = datetime.datetime.now,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._stats_name = stats_name
+        self._now_fn = now_fn
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+
+        # Items are access ordered, with least recently used at the front.
+        self._cache: collections.OrderedDict[
+            typing.Tuple[typing.Optional[str], CacheKeyType],
+            typing.Tuple[typing.Optional[datetime.datetime], int, CacheValueType],
+        ] = collections.OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def _full_key(
+        self, key: CacheKeyType
+    ) -> typing.Tuple[typing.Optional[str], CacheKeyType]:
+        return (get_user_cache_key(), key)
+
+    def _remove(
+        self, full_key: typing.Tuple[typing.Optional[str], CacheKeyType]
+    ) -> None:
+        _, size, _ = self._cache.pop(full_key)
+        self._total_bytes -= size
+
+    def _evict(self) -> None:
+        while self._cache and (
+            len(self._cache) > self.max_entries or self._total_bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._cache)))
+            statsd.increment(f"{self._stats_name}.eviction")
+        statsd.gauge(f"{self._stats_name}.size", len(self._cache))
+        statsd.gauge(f"{self._stats_name}.bytes", self._total_bytes)
+
+    def get(self, key: CacheKeyType) -> typing.Union[NotFound, CacheValueType]:
+        full_key = self._full_key(key)
+        with self._lock:
+            val = self._cache.get(full_key)
+            if val is not None and val[0] is not None and val[0] < self._now_fn():
+                self._remove(full_key)
+                statsd.increment(f"{self._stats_name}.expired")
+                val = None
+            if val is None:
+                statsd.increment(f"{self._stats_name}.miss")
+                return self.NOT_FOUND
+            self._cache.move_to_end(full_key)
+        statsd.increment(f"{self._stats_name}.hit")
+        return val[2]
+
+    def set(
+        self,
+        key: CacheKeyType,
+        value: CacheValueType,
+        size_bytes: int,
+        ttl: typing.Optional[datetime.timedelta] = None,
+    ) -> None:
+        if size_bytes > self.max_bytes:
+            return
+        full_key = self._full_key(key)
+        expires_at = None if ttl is None else self._now_fn() + ttl
+        with self._lock:
+            if full_key in self._cache:
+                self._remove(full_key)
+            self._cache[full_key] = (expires_at, size_bytes, value)
+            self._total_bytes += size_bytes
+            self._evict()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._total_bytes = 0
@@ -1,5 +1,7 @@
+import collections
 import re
 import random
+import time
 import typing
 
 import logging
@@ -9,6 +11,7 @@ import contextlib
 
 from . import value_or_error
 from . import debug_compile
+from . import compile_cache
 
 
 from . import serialize
@@ -385,6 +388,215 @@ def compile_apply_column_pushdown(
     return graph.map_nodes_full(leaf_nodes, _replace_with_column_pushdown, on_error)
 
 
+# Filter predicate ops on row["_step"], and the bounds they imply given a
+# constant c, as (lower, upper).
+_HISTORY_STEP_COMPARISONS: dict[
+    str, typing.Callable[[float], tuple[typing.Optional[float], typing.Optional[float]]]
+] = {
+    "number-equal": lambda c: (c, c),
+    "number-greater": lambda c: (c, None),
+    "number-greaterEqual": lambda c: (c, None),
+    "number-less": lambda c: (None, c),
+    "number-lessEqual": lambda c: (None, c),
+}
+_FLIPPED_COMPARISONS = {
+    "number-equal": "number-equal",
+    "number-greater": "number-less",
+    "number-greaterEqual": "number-lessEqual",
+    "number-less": "number-greater",
+    "number-lessEqual": "number-greaterEqual",
+}
+
+
+def _is_step_pick(node: graph.Node) -> bool:
+    if not isinstance(node, graph.OutputNode) or not node.from_op.name.endswith("pick"):
+        return False
+    obj, key = list(node.from_op.inputs.values())
+    return (
+        isinstance(obj, graph.VarNode)
+        and isinstance(key, graph.ConstNode)
+        and key.val == "_step"
+    )
+
+
+def _is_number_const(node: graph.Node) -> bool:
+    return (
+        isinstance(node, graph.ConstNode)
+        and isinstance(node.val, (int, float))
+        and not isinstance(node.val, bool)
+    )
+
+
+def _history_step_bounds(
+    node: graph.Node,
+) -> tuple[typing.Optional[float], typing.Optional[float]]:
+    """Inclusive bounds on row["_step"] for rows that pass a filter predicate.
+
+    The bounds may be looser than the predicate, but never tighter.
+    """
+    if not isinstance(node, graph.OutputNode):
+        return None, None
+    name = node.from_op.name
+    inputs = list(node.from_op.inputs.values())
+    if name == "and":
+        (l_lo, l_hi), (r_lo, r_hi) = (_history_step_bounds(i) for i in inputs)
+        return (
+            l_lo if r_lo is None else r_lo if l_lo is None else max(l_lo, r_lo),
+            l_hi if r_hi is None else r_hi if l_hi is None else min(l_hi, r_hi),
+        )
+    if name in _HISTORY_STEP_COMPARISONS:
+        lhs, rhs = inputs
+        if _is_step_pick(lhs) and _is_number_const(rhs):
+            return _HISTORY_STEP_COMPARISONS[name](rhs.val)  # type: ignore
+        if _is_step_pick(rhs) and _is_number_const(lhs):
+            return _HISTORY_STEP_COMPARISONS[_FLIPPED_COMPARISONS[name]](lhs.val)  # type: ignore
+    return None, None
+
+
+def _history_step_window_node(
+    history_node: graph.OutputNode,
+    min_step: typing.Optional[float] = None,
+    max_step: typing.Optional[float] = None,
+    row_limit: typing.Optional[int] = None,
+    sample_method: typing.Optional[str] = None,
+    sample_y: typing.Optional[str] = None,
+    sample_n: typing.Optional[int] = None,
+) -> graph.OutputNode:
+    return graph.OutputNode(
+        history_node.type,
+        "run-history3_with_columns_step_window",
+        {
+            "run": history_node.from_op.inputs["run"],
+            "history_cols": history_node.from_op.inputs["history_cols"],
+            "min_step": weave_internal.const(min_step),
+            "max_step": weave_internal.const(max_step),
+            "row_limit": weave_internal.const(row_limit),
+            "sample_method": weave_internal.const(sample_method),
+            "sample_y": weave_internal.const(sample_y),
+            "sample_n": weave_internal.const(sample_n),
+        },
+    )
+
+
+_HISTORY_DOWNSAMPLE_METHODS = {
+    "ArrowWeaveList-downsampleLTTB": "lttb",
+    "ArrowWeaveList-downsampleMinMax": "minMax",
+}
+
+
+def _history_pick_key(fn_node: graph.Node) -> typing.Optional[str]:
+    """The key of a function which is just row[<key>], if it is one."""
+    if not isinstance(fn_node, graph.ConstNode) or not isinstance(
+        fn_node.val, graph.OutputNode
+    ):
+        return None
+    node = fn_node.val
+    if not node.from_op.name.endswith("pick"):
+        return None
+    obj, key = list(node.from_op.inputs.values())
+    if (
+        isinstance(obj, graph.VarNode)
+        and obj.name == "row"
+        and isinstance(key, graph.ConstNode)
+        and isinstance(key.val, str)
+    ):
+        return key.val
+    return None
+
+
+def compile_apply_history_step_pushdown(
+    leaf_nodes: list[graph.Node], on_error: graph.OnErrorFnType = None
+) -> list[graph.Node]:
+    # Push _step filters and limits on run history down into the history read,
+    # which can then skip parquet row groups outside of the _step window. This
+    # runs after column pushdown, so we only look for history3_with_columns. The
+    # filter or limit stays in the graph, the window just has to contain its
+    # result. Downsampling over _step is pushed down the same way: the history
+    # read picks the same rows as the downsample op, which then keeps them all.
+    def _is_history_node(node: graph.Node) -> bool:
+        return (
+            isinstance(node, graph.OutputNode)
+            and node.from_op.name == "run-history3_with_columns"
+        )
+
+    if not graph.filter_nodes_full(leaf_nodes, _is_history_node):
+        return leaf_nodes
+
+    # Only push down into history nodes that nothing else consumes.
+    consumer_counts: dict[graph.Node, int] = {}
+
+    def _count_consumers(node: graph.Node) -> bool:
+        if isinstance(node, graph.OutputNode):
+            for input_node in node.from_op.inputs.values():
+                if _is_history_node(input_node):
+                    consumer_counts[input_node] = consumer_counts.get(input_node, 0) + 1
+        return False
+
+    graph.filter_nodes_full(leaf_nodes, _count_consumers)
+    for leaf in leaf_nodes:
+        if _is_history_node(leaf):
+            consumer_counts[leaf] = consumer_counts.get(leaf, 0) + 1
+
+    def _replace_with_step_window(node: graph.Node) -> graph.Node:
+        if not isinstance(node, graph.OutputNode) or node.from_op.name not in (
+            "ArrowWeaveList-filter",
+            "ArrowWeaveList-limit",
+            *_HISTORY_DOWNSAMPLE_METHODS,
+        ):
+            return node
+        if node.from_op.name in _HISTORY_DOWNSAMPLE_METHODS:
+            return _replace_downsample_input(node)
+        inputs = dict(node.from_op.inputs)
+        self_name, arg_name = list(inputs.keys())
+        history_node, arg = inputs[self_name], inputs[arg_name]
+        if not _is_history_node(history_node) or consumer_counts.get(history_node) != 1:
+            return node
+        history_node = typing.cast(graph.OutputNode, history_node)
+        if node.from_op.name == "ArrowWeaveList-filter":
+            if not isinstance(arg, graph.ConstNode) or not isinstance(
+                arg.val, graph.Node
+            ):
+                return node
+            min_step, max_step = _history_step_bounds(arg.val)
+            if min_step is None and max_step is None:
+                return node
+            inputs[self_name] = _history_step_window_node(
+                history_node, min_step=min_step, max_step=max_step
+            )
+        else:
+            if not _is_number_const(arg) or not isinstance(arg.val, int):  # type: ignore
+                return node
+            inputs[self_name] = _history_step_window_node(
+                history_node, row_limit=arg.val  # type: ignore
+            )
+        return graph.OutputNode(node.type, node.from_op.name, inputs)
+
+    def _replace_downsample_input(node: graph.OutputNode) -> graph.Node:
+        inputs = dict(node.from_op.inputs)
+        self_name, x_fn_name, y_fn_name, n_name = list(inputs.keys())
+        history_node, n = inputs[self_name], inputs[n_name]
+        if not _is_history_node(history_node) or consumer_counts.get(history_node) != 1:
+            return node
+        sample_y = _history_pick_key(inputs[y_fn_name])
+        if (
+            _history_pick_key(inputs[x_fn_name]) != "_step"
+            or sample_y is None
+            or not _is_number_const(n)
+            or not isinstance(n.val, int)  # type: ignore
+            or n.val <= 0  # type: ignore
+        ):
+            return node
+        inputs[self_name] = _history_step_window_node(
+            typing.cast(graph.OutputNode, history_node),
+            sample_method=_HISTORY_DOWNSAMPLE_METHODS[node.from_op.name],
+            sample_y=sample_y,
+            sample_n=n.val,  # type: ignore
+        )
+        return graph.OutputNode(node.type, node.from_op.name, inputs)
+
+    return graph.map_nodes_full(leaf_nodes, _replace_with_step_window, on_error)
+
+
 def compile_fix_calls(
     nodes: typing.List[graph.Node],
     on_error: graph.OnErrorFnType = None,
@@ -618,65 +830,142 @@ def _track_errors(fn):
     return final
 
 
-def _compile(
-    nodes: typing.List[graph.Node],
-) -> value_or_error.ValueOrErrors[graph.Node]:
-    tracer = engine_trace.tracer()
-    # logging.info("Starting compilation of graph with %s leaf nodes" % len(nodes))
+MapFnType = typing.Callable[[graph.Node], typing.Optional[graph.Node]]
+CompileFnType = typing.Callable[
+    [typing.List[graph.Node], graph.OnErrorFnType], typing.List[graph.Node]
+]
 
-    results = value_or_error.ValueOrErrors.from_values(nodes)
 
-    # If we're being called from WeaveJS, we need to use dispatch to determine
-    # which ops to use. Critically, this first phase does not actually refine
-    # op output types, so after this, the types in the graph are not yet correct.
-    with tracer.trace("compile:fix_calls"):
-        results = results.batch_map(_track_errors(compile_fix_calls))
+class CompilePass(typing.NamedTuple):
+    name: str
+    compile_fn: CompileFnType
+    # Set for local passes: passes that rewrite one node at a time, given the
+    # node with its inputs already rewritten, without executing anything.
+    # Consecutive local passes are fused into a single graph traversal.
+    local_map_fn: typing.Optional[MapFnType] = None
 
-    with tracer.trace("compile:simple_optimizations"):
-        results = results.batch_map(_track_errors(compile_simple_optimizations))
 
-    with tracer.trace("compile:lambda_uniqueness"):
-        results = results.batch_map(_track_errors(compile_lambda_uniqueness))
+def _node_inputs(node: graph.Node) -> typing.Iterable[graph.Node]:
+    if isinstance(node, graph.OutputNode):
+        return node.from_op.inputs.values()
+    elif isinstance(node, graph.ConstNode) and isinstance(node.val, graph.Node):
+        return [node.val]
+    return []
+
+
+def _fused_map_fn(
+    passes: typing.Sequence[CompilePass],
+    done: set[graph.Node],
+    timings: dict[str, float],
+) -> MapFnType:
+    def map_fn(node: graph.Node) -> graph.Node:
+        for i, compile_pass in enumerate(passes):
+            start_time = time.perf_counter()
+            res = compile_pass.local_map_fn(node)  # type: ignore
+            timings[compile_pass.name] += time.perf_counter() - start_time
+            if res is None or res is node:
+                continue
+            if res in done:
+                # Passes already ran on this node, like when a pass replaces
+                # a node with one of its inputs.
+                return res
+            node = res
+            if any(n not in done for n in _node_inputs(node)):
+                # The pass made new nodes (like the body of a called function).
+                # The remaining passes need to visit them, just like they would
+                # if each pass traversed the graph on its own.
+                return graph.map_new_nodes_full(
+                    node, _fused_map_fn(passes[i + 1 :], done, timings), done
+                )
+        done.add(node)
+        return node
 
+    return map_fn
+
+
+def _fuse_local_passes(passes: typing.Sequence[CompilePass]) -> CompilePass:
+    def compile_fn(
+        nodes: typing.List[graph.Node], on_error: graph.OnErrorFnType = None
+    ) -> typing.List[graph.Node]:
+        timings: dict[str, float] = collections.defaultdict(float)
+        try:
+            return graph.map_nodes_full(
+                nodes, _fused_map_fn(passes, set(), timings), on_error
+            )
+        finally:
+            span = engine_trace.tracer().current_span()
+            if span is not None:
+                for name, seconds in timings.items():
+                    span.set_tag(f"compile:{name}.sec", seconds)
+
+    return CompilePass("+".join(p.name for p in passes), compile_fn)
+
+
+def _fuse_passes(passes: typing.Sequence[CompilePass]) -> list[CompilePass]:
+    fused: list[CompilePass] = []
+    local_run: list[CompilePass] = []
+    for compile_pass in list(passes) + [None]:  # type: ignore
+        if compile_pass is not None and compile_pass.local_map_fn is not None:
+            local_run.append(compile_pass)
+            continue
+        if len(local_run) == 1:
+            fused.append(local_run[0])
+        elif local_run:
+            fused.append(_fuse_local_passes(local_run))
+        local_run = []
+        if compile_pass is not None:
+            fused.append(compile_pass)
+    return fused
+
+
+COMPILE_PASSES = [
+    # If we're being called from WeaveJS, we need to use dispatch to determine
+    # which ops to use. Critically, this first phase does not actually refine
+    # op output types, so after this, the types in the graph are not yet correct.
+    CompilePass("fix_calls", compile_fix_calls, _dispatch_map_fn_no_refine),
+    CompilePass(
+        "simple_optimizations", compile_simple_optimizations, _simple_optimizations
+    ),
+    CompilePass("lambda_uniqueness", compile_lambda_uniqueness),
     # Auto-transforms, where we insert operations to convert between types
     # as needed.
     # TODO: is it ok to have this before final refine?
-    with tracer.trace("compile:await"):
-        results = results.batch_map(_track_errors(compile_await))
-    with tracer.trace("compile:execute"):
-        results = results.batch_map(_track_errors(compile_execute))
-    with tracer.trace("compile:function_calls"):
-        results = results.batch_map(_track_errors(compile_function_calls))
-    with tracer.trace("compile:quote"):
-        results = results.batch_map(_track_errors(compile_quote))
-
+    CompilePass("await", compile_await, _await_run_outputs_map_fn),
+    CompilePass("execute", compile_execute, _execute_nodes_map_fn),
+    CompilePass("function_calls", compile_function_calls, _resolve_function_calls),
+    CompilePass("quote", compile_quote, _quote_nodes_map_fn),
     # Some ops require const input nodes. This pass executes any branches necessary
     # to ensure that requirement holds.
     # Only gql ops require this for now.
-    with tracer.trace("compile:resolve_required_consts"):
-        results = results.batch_map(_track_errors(compile_resolve_required_consts))
-
-    with tracer.trace("compile:node_ops"):
-        results = results.batch_map(_track_errors(compile_node_ops))
-
+    CompilePass("resolve_required_consts", compile_resolve_required_consts),
+    CompilePass("node_ops", compile_node_ops),
     # Now that we have the correct calls, we can do our forward-looking pushdown
     # optimizations. These do not depend on having correct types in the graph.
-
-    with tracer.trace("compile:gql"):
-        results = results.batch_map(
-            _track_errors(compile_domain.apply_domain_op_gql_translation)
-        )
-
-    with tracer.trace("compile:column_pushdown"):
-        results = results.batch_map(_track_errors(compile_apply_column_pushdown))
-
+    CompilePass("gql", compile_domain.apply_domain_op_gql_translation),
+    CompilePass("column_pushdown", compile_apply_column_pushdown),
+    CompilePass("history_step_pushdown", compile_apply_history_step_pushdown),
     # Final refine, to ensure the graph types are exactly what Weave python
     # produces. This phase can execute parts of the graph. It's very important
     # that this is the final phase, so that when we execute the rest of the
     # graph, we reuse any results produced in this phase, instead of re-executing
     # those nodes.
-    with tracer.trace("compile:refine"):
-        results = results.batch_map(_track_errors(compile_refine))
+    CompilePass("refine", compile_refine),
+]
+
+_FUSED_COMPILE_PASSES = _fuse_passes(COMPILE_PASSES)
+
+
+def _compile(
+    nodes: typing.List[graph.Node],
+) -> value_or_error.ValueOrErrors[graph.Node]:
+    tracer = engine_trace.tracer()
+    # logging.info("Starting compilation of graph with %s leaf nodes" % len(nodes))
+
+    results = value_or_error.ValueOrErrors.from_values(nodes)
+
+    for compile_pass in _FUSED_COMPILE_PASSES:
+        with tracer.trace(f"compile:{compile_pass.name}"):
+            results = results.batch_map(_track_errors(compile_pass.compile_fn))
 
     # This is very expensive!
     # loggable_nodes = graph_debug.combine_common_nodes(n)
@@ -733,5 +1022,15 @@ def compile(
     # graph.
     if _is_compiling():
         return value_or_error.ValueOrErrors.from_values(nodes)
+    key = None
+    if compile_cache.get_compiled_plan_cache() is not None:
+        key = compile_cache.graph_key(nodes)
+        if key is not None:
+            plan = compile_cache.get(key[0])
+            if plan is not None:
+                return plan
     with _compiling():
-        return _compile(nodes)
+        results = _compile(nodes)
+    if key is not None:
+        compile_cache.put(key[0], key[1], results)
+    return results
@@ -0,0 +1,152 @@
+"""Cache of compiled graphs, shared across execute requests.
+
+WeaveJS sends the same panel graphs over and over, and compiling them runs
+every compile pass from scratch. The compiled plan cache keys the incoming
+graph by a structural hash (op names, types, const values and graph shape)
+and returns the previously compiled graph on a hit.
+
+Compiling is not a pure function of the graph: the refine pass executes parts
+of it, gql stitching bakes const values into queries, and refined types can
+depend on data that changes (like the runs in a project). So const values are
+part of the key rather than parameters, and entries expire after a ttl.
+"""
+
+import datetime
+import hashlib
+import json
+import logging
+import typing
+
+from . import cache
+from . import environment
+from . import graph
+from . import value_or_error
+from . import weave_types as types
+
+CompiledPlan = value_or_error.ValueOrErrors[graph.Node]
+
+# Rough memory held by one compiled node, used to bound the cache in bytes.
+APPROX_NODE_SIZE_BYTES = 2048
+
+_compiled_plan_cache: typing.Optional[
+    cache.LruSizeBoundedCache[str, CompiledPlan]
+] = None
+
+
+def get_compiled_plan_cache() -> typing.Optional[
+    cache.LruSizeBoundedCache[str, CompiledPlan]
+]:
+    global _compiled_plan_cache
+    max_entries = environment.compiled_plan_cache_max_entries()
+    if max_entries <= 0:
+        return None
+    if _compiled_plan_cache is None:
+        _compiled_plan_cache = cache.LruSizeBoundedCache(
+            max_entries,
+            environment.compiled_plan_cache_max_bytes(),
+            stats_name="weave.compiled_plan_cache",
+        )
+    return _compiled_plan_cache
+
+
+class _Uncacheable(Exception):
+    pass
+
+
+def _const_key(val: typing.Any) -> typing.Any:
+    # Only graphs with small json-like consts (what WeaveJS sends) are cached,
+    # so hashing stays cheap compared to compiling.
+    if val is None or isinstance(val, (bool, int, float, str)):
+        return val
+    elif isinstance(val, types.Type):
+        return {"__type__": val.to_dict()}
+    elif isinstance(val, list):
+        return [_const_key(v) for v in val]
+    elif isinstance(val, dict):
+        return {"__dict__": [[str(k), _const_key(v)] for k, v in val.items()]}
+    raise _Uncacheable(type(val))
+
+
+def _graph_key(nodes: typing.List[graph.Node]) -> typing.Tuple[str, int]:
+    hashes: dict[int, str] = {}
+
+    def node_hash(node: graph.Node) -> str:
+        node_hash_ = hashes.get(id(node))
+        if node_hash_ is not None:
+            return node_hash_
+        hashable: typing.Any
+        if isinstance(node, graph.OutputNode):
+            hashable = [
+                "output",
+                node.from_op.name,
+                node.type.to_dict(),
+                [[k, node_hash(v)] for k, v in node.from_op.inputs.items()],
+            ]
+        elif isinstance(node, graph.ConstNode):
+            if isinstance(node.val, graph.Node):
+                hashable = ["fn", node.type.to_dict(), node_hash(node.val)]
+            else:
+                hashable = ["const", node.type.to_dict(), _const_key(node.val)]
+        elif isinstance(node, graph.VarNode):
+            hashable = ["var", node.name, node.type.to_dict()]
+        elif isinstance(node, graph.VoidNode):
+            hashable = ["void"]
+        else:
+            raise _Uncacheable(type(node))
+        node_hash_ = hashlib.md5(json.dumps(hashable).encode()).hexdigest()
+        hashes[id(node)] = node_hash_
+        return node_hash_
+
+    key = hashlib.md5(
+        json.dumps([node_hash(node) for node in nodes]).encode()
+    ).hexdigest()
+    return key, len(hashes)
+
+
+def graph_key(
+    nodes: typing.List[graph.Node],
+) -> typing.Optional[typing.Tuple[str, int]]:
+    """Structural key for a list of nodes, and the number of unique nodes.
+
+    Returns None if the graph can't be cached.
+    """
+    try:
+        return _graph_key(nodes)
+    except _Uncacheable:
+        return None
+    except Exception:
+        logging.debug("Could not compute compiled plan key", exc_info=True)
+        return None
+
+
+def get(key: str) -> typing.Optional[CompiledPlan]:
+    plan_cache = get_compiled_plan_cache()
+    if plan_cache is None:
+        return None
+    plan = plan_cache.get(key)
+    if isinstance(plan, cache.LruSizeBoundedCache.NotFound):
+        return None
+    return plan
+
+
+def put(key: str, node_count: int, plan: CompiledPlan) -> None:
+    plan_cache = get_compiled_plan_cache()
+    if plan_cache is None:
+        return
+    # Compile errors may be transient, like a failed gql request.
+    if any(err is not None for _, err in plan.iter_items()):
+        return
+    ttl_sec = environment.compiled_plan_cache_ttl_sec()
+    if ttl_sec <= 0:
+        return
+    plan_cache.set(
+        key,
+        plan,
+        APPROX_NODE_SIZE_BYTES * node_count,
+        ttl=datetime.timedelta(seconds=ttl_sec),
+    )
+
+
+def clear() -> None:
+    if _compiled_plan_cache is not None:
+        _compiled_plan_cache.clear()
@@ -26,6 +26,21 @@ USE_PARALLEL_DOWNLOAD = True
 USE_PARALLEL_REFINE = True
 USE_PARALLEL_RESOLVE = True
 
+_HISTORY_OP_SUFFIXES = (
+    "run-history",
+    "run-history2",
+    "run-history3",
+    "run-history_with_columns",
+    "run-history2_with_columns",
+    "run-history3_with_columns",
+    "run-history3_with_columns_step_window",
+)
+_PARALLEL_DOWNLOAD_OP_SUFFIXES = (
+    "file-table",
+    "file-joinedTable",
+    "file-partitionedTable",
+) + _HISTORY_OP_SUFFIXES
+
 _PARALLEL_ALLOWLIST = ["op-refine_history_metrics", "artifactVersion-historyMetrics"]
 PARALLEL_REFINE_ALLOWLIST = _PARALLEL_ALLOWLIST
 PARALLEL_RESOLVE_ALLOWLIST = _PARALLEL_ALLOWLIST
@@ -243,14 +258,13 @@ class MappedDeriveOpHandler(DeriveOpHandler):
 
             # Just do file-table in parallel for now. We'll do parallelization
             # more generally in the future.
-            if (
-                orig_op.name.endswith("file-table")
-                or orig_op.name.endswith("file-joinedTable")
-                or orig_op.name.endswith("file-partitionedTable")
-                or orig_op.name.endswith("run-history")
-                or orig_op.name.endswith("run-history2")
-                or orig_op.name.endswith("run-history3")
-            ):
+            if orig_op.name.endswith(_PARALLEL_DOWNLOAD_OP_SUFFIXES):
+                if orig_op.name.endswith(_HISTORY_OP_SUFFIXES):
+                    from .ops_domain.run_history import history_op_common
+
+                    # Start all the runs' parquet downloads at once, instead
+                    # of a thread's worth at a time.
+                    history_op_common.prefetch_history_parquet(list_)
 
                 def download_one(x):
                     with tag_store.with_tag_store_state(
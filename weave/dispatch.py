@@ -1,7 +1,9 @@
 """Functions for determining which op is being called."""
 from dataclasses import dataclass
+import collections
 import functools
 import logging
+import threading
 import typing
 import json
 
@@ -16,7 +18,10 @@ from . import graph
 from . import errors
 from . import pyfunc_type_util
 from . import util
-from . import memo
+from . import environment
+from . import engine_trace
+
+statsd = engine_trace.statsd()  # type: ignore
 
 
 # I originally wrote this thinking that we could always choose the more specific
@@ -175,7 +180,7 @@ def _resolve_op_ambiguity(
     return final_candidates[0]
 
 
-def _get_ops_by_name(fq_op_name: str) -> list[op_def.OpDef]:
+def _get_ops_by_name_uncached(fq_op_name: str) -> list[op_def.OpDef]:
     """Returns a single op that matches the given name and raw inputs (inputs can be python objects or nodes)"""
     shared_name_ops: list[op_def.OpDef]
 
@@ -203,20 +208,125 @@ def _dispatch_first_arg_inner(name: str, first_arg: types.Type) -> list[op_def.O
     return ops_with_name_and_arg
 
 
-@memo.memo
-def _dispatch_first_arg_cached(name: str, first_arg: types.Type) -> list[op_def.OpDef]:
-    return _dispatch_first_arg_inner(name, first_arg)
+class DispatchIndex:
+    """Process-wide cache of dispatch results.
+
+    WeaveJS sends the same few type signatures over and over, so we keep the
+    ops sharing each name, the ops whose first param accepts a given type, and
+    the op chosen for each full (name, input types) signature. The last two
+    are bounded LRUs. Everything is dropped when the set of registered ops
+    changes.
+    """
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._registry_version = -1
+        self._ops_by_name: dict[str, list[op_def.OpDef]] = {}
+        self._first_arg_ops: collections.OrderedDict[
+            typing.Tuple[str, types.Type], list[op_def.OpDef]
+        ] = collections.OrderedDict()
+        self._signature_ops: collections.OrderedDict[
+            typing.Tuple[str, typing.Tuple[typing.Tuple[str, types.Type], ...]],
+            op_def.OpDef,
+        ] = collections.OrderedDict()
+
+    def _check_registry_version(self) -> None:
+        # Must hold the lock
+        version = registry_mem.memory_registry.version
+        if version != self._registry_version:
+            self._ops_by_name.clear()
+            self._first_arg_ops.clear()
+            self._signature_ops.clear()
+            self._registry_version = version
+
+    def _lru_get(self, lru: collections.OrderedDict, key: typing.Any) -> typing.Any:
+        with self._lock:
+            self._check_registry_version()
+            val = lru.get(key)
+            if val is not None:
+                lru.move_to_end(key)
+        return val
+
+    def _lru_set(
+        self, lru: collections.OrderedDict, key: typing.Any, val: typing.Any
+    ) -> None:
+        with self._lock:
+            self._check_registry_version()
+            lru[key] = val
+            lru.move_to_end(key)
+            while len(lru) > self.max_entries:
+                lru.popitem(last=False)
+
+    def ops_by_name(self, name: str) -> list[op_def.OpDef]:
+        with self._lock:
+            self._check_registry_version()
+            ops = self._ops_by_name.get(name)
+        if ops is None:
+            ops = _get_ops_by_name_uncached(name)
+            with self._lock:
+                self._check_registry_version()
+                self._ops_by_name[name] = ops
+        return ops
+
+    def first_arg_ops(self, name: str, first_arg: types.Type) -> list[op_def.OpDef]:
+        key = (name, first_arg)
+        ops = self._lru_get(self._first_arg_ops, key)
+        if ops is None:
+            statsd.increment("weave.dispatch_index.first_arg.miss")
+            ops = _dispatch_first_arg_inner(name, first_arg)
+            self._lru_set(self._first_arg_ops, key, ops)
+        return ops
+
+    def signature_op(
+        self, name: str, kwargs: dict[str, types.Type]
+    ) -> typing.Optional[op_def.OpDef]:
+        op = self._lru_get(self._signature_ops, (name, tuple(kwargs.items())))
+        if op is None:
+            statsd.increment("weave.dispatch_index.signature.miss")
+        return op
+
+    def set_signature_op(
+        self, name: str, kwargs: dict[str, types.Type], op: op_def.OpDef
+    ) -> None:
+        self._lru_set(self._signature_ops, (name, tuple(kwargs.items())), op)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._ops_by_name.clear()
+            self._first_arg_ops.clear()
+            self._signature_ops.clear()
+
+
+_dispatch_index: typing.Optional[DispatchIndex] = None
+
+
+def get_dispatch_index() -> typing.Optional[DispatchIndex]:
+    global _dispatch_index
+    max_entries = environment.dispatch_cache_max_entries()
+    if max_entries <= 0:
+        return None
+    if _dispatch_index is None:
+        _dispatch_index = DispatchIndex(max_entries)
+    return _dispatch_index
+
+
+def _get_ops_by_name(fq_op_name: str) -> list[op_def.OpDef]:
+    dispatch_index = get_dispatch_index()
+    if dispatch_index is None:
+        return _get_ops_by_name_uncached(fq_op_name)
+    return dispatch_index.ops_by_name(fq_op_name)
 
 
 def _dispatch_first_arg(name: str, first_arg: types.Type) -> list[op_def.OpDef]:
-    # We want to memoize on the first argument, so that when there are many ops
+    # We want to cache on the first argument, so that when there are many ops
     # hanging off a single node, we don't redo the dispatch for each. If there is
-    # a Const in the Type, we can't hash it (this should be uncommon in the first
-    # argument)
-    # TODO: track stats
-    if not isinstance(first_arg, types.Const):
+    # a Const in the Type, we don't cache, since the Const's value is part of
+    # its hash (this should be uncommon in the first argument)
+    dispatch_index = get_dispatch_index()
+    if dispatch_index is not None and not isinstance(first_arg, types.Const):
         try:
-            return _dispatch_first_arg_cached(name, first_arg)
+            return dispatch_index.first_arg_ops(name, first_arg)
         except errors.WeaveHashConstTypeError:
             pass
     return _dispatch_first_arg_inner(name, first_arg)
@@ -233,6 +343,24 @@ def _dispatch_remaining_args(
 
 
 def get_op_for_inputs(name: str, kwargs: dict[str, types.Type]) -> op_def.OpDef:
+    # Dispatch is a pure function of the registered ops, name and input types,
+    # so the result for a signature is cached. Signatures with Const types
+    # aren't, since they carry arbitrary values.
+    dispatch_index = get_dispatch_index()
+    if dispatch_index is None or any(
+        isinstance(t, types.Const) for t in kwargs.values()
+    ):
+        return _get_op_for_inputs_uncached(name, kwargs)
+    op = dispatch_index.signature_op(name, kwargs)
+    if op is None:
+        op = _get_op_for_inputs_uncached(name, kwargs)
+        dispatch_index.set_signature_op(name, kwargs, op)
+    return op
+
+
+def _get_op_for_inputs_uncached(
+    name: str, kwargs: dict[str, types.Type]
+) -> op_def.OpDef:
     if not kwargs:
         # zero argument ops
         ops = _get_ops_by_name(name)
@@ -273,7 +401,7 @@ def get_op_for_inputs(name: str, kwargs: dict[str, types.Type]) -> op_def.OpDef:
     input_types = list(kwargs.values())
 
     # Dispatch first arg first. This is important for performance for two reasons:
-    # 1. We memoize dispatch_first_arg, so we don't do duplicate work in the case
+    # 1. We cache dispatch_first_arg, so we don't do duplicate work in the case
     #    where executing a graph with lots of fanout. This is common in Weave
     #    (e.g. some_list[0], some_list[1], some_list[2], ...)
     # 2. We don't have to check remaining types for ops that don't match the first
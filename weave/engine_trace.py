@@ -294,6 +294,9 @@ class DummyStatsd:
     def gauge(self, *args, **kwargs):
         pass
 
+    def timing(self, *args, **kwargs):
+        pass
+
     def flush(self, *args, **kwargs):
         pass
 
@@ -68,6 +68,25 @@ def cache_mode() -> CacheMode:
     )
 
 
+# There are currently two execute schedulers:
+# - wave: execute the forward graph level by level, grouping nodes by op name
+# - ready: dispatch each node onto a thread pool as soon as all of its inputs
+#   have results, so a slow node only blocks its own downstream nodes
+class ExecuteScheduler(enum.Enum):
+    WAVE = "wave"
+    READY = "ready"
+
+
+def execute_scheduler() -> ExecuteScheduler:
+    env_scheduler = os.getenv("WEAVE_EXECUTE_SCHEDULER", ExecuteScheduler.WAVE.value)
+    for scheduler in ExecuteScheduler:
+        if scheduler.value == env_scheduler:
+            return scheduler
+    raise errors.WeaveConfigurationError(
+        f"WEAVE_EXECUTE_SCHEDULER must be one of {list(ExecuteScheduler)}"
+    )
+
+
 def wandb_production() -> bool:
     return os.getenv("WEAVE_ENV") == "wandb_production"
 
@@ -166,3 +185,194 @@ def weave_wandb_api_key() -> typing.Optional[str]:
 
 def projection_timeout_sec() -> typing.Optional[typing.Union[int, float]]:
     return util.parse_number_env_var("WEAVE_PROJECTION_TIMEOUT_SEC")
+
+
+# Bounds for the process-wide cache of fitted 2D projections. It is disabled
+# unless a max number of entries is set.
+def projection_cache_max_entries() -> int:
+    return int(util.parse_number_env_var("WEAVE_PROJECTION_CACHE_MAX_ENTRIES") or 0)
+
+
+def projection_cache_max_bytes() -> int:
+    max_bytes = util.parse_number_env_var("WEAVE_PROJECTION_CACHE_MAX_BYTES")
+    if max_bytes is None:
+        return 512 * 1024 * 1024
+    return int(max_bytes)
+
+
+# PCA and UMAP projections of more rows than this are fit on a random sample
+# of this many rows, and the other rows are transformed with the fitted model.
+# 0 (the default) fits on all rows.
+def projection_max_fit_rows() -> int:
+    return int(util.parse_number_env_var("WEAVE_PROJECTION_MAX_FIT_ROWS") or 0)
+
+
+# The shared result cache keeps node results around across execute requests.
+# It is disabled unless a max number of entries is set.
+def shared_result_cache_max_entries() -> int:
+    return int(util.parse_number_env_var("WEAVE_SHARED_RESULT_CACHE_MAX_ENTRIES") or 0)
+
+
+def shared_result_cache_max_bytes() -> int:
+    max_bytes = util.parse_number_env_var("WEAVE_SHARED_RESULT_CACHE_MAX_BYTES")
+    if max_bytes is None:
+        return 1024 * 1024 * 1024
+    return int(max_bytes)
+
+
+# Results that depend on impure ops (like gql queries) are only shared for
+# this many seconds.
+def shared_result_cache_impure_ttl_sec() -> float:
+    ttl = util.parse_number_env_var("WEAVE_SHARED_RESULT_CACHE_IMPURE_TTL_SEC")
+    if ttl is None:
+        return 60
+    return ttl
+
+
+# The trace cache index stores local op runs in a sqlite index instead of one
+# artifact per run, and evicts old runs so the cache doesn't grow forever.
+def trace_cache_index_enabled() -> bool:
+    return util.parse_boolean_env_var("WEAVE_TRACE_CACHE_INDEX")
+
+
+def trace_cache_max_bytes() -> int:
+    max_bytes = util.parse_number_env_var("WEAVE_TRACE_CACHE_MAX_BYTES")
+    if max_bytes is None:
+        return 10 * 1024 * 1024 * 1024
+    return int(max_bytes)
+
+
+def trace_cache_max_age_sec() -> typing.Optional[typing.Union[int, float]]:
+    return util.parse_number_env_var("WEAVE_TRACE_CACHE_MAX_AGE_SEC")
+
+
+def trace_cache_compaction_interval_sec() -> float:
+    interval = util.parse_number_env_var("WEAVE_TRACE_CACHE_COMPACTION_INTERVAL_SEC")
+    if interval is None:
+        return 300
+    return interval
+
+
+# Concurrent executions of the same pure op run wait this long for the first
+# one to finish before running the op themselves. 0 disables waiting.
+def single_flight_timeout_sec() -> float:
+    timeout = util.parse_number_env_var("WEAVE_SINGLE_FLIGHT_TIMEOUT_SEC")
+    if timeout is None:
+        return 300
+    return timeout
+
+
+# Number of worker processes for ops selected by op_policy.PROCESS_OP_NAMES.
+# 0 (the default) runs them in the server process, like any other op.
+def process_pool_workers() -> int:
+    return int(util.parse_number_env_var("WEAVE_PROCESS_POOL_WORKERS") or 0)
+
+
+# Max time to wait for an op running in the process pool.
+def process_pool_timeout_sec() -> float:
+    timeout = util.parse_number_env_var("WEAVE_PROCESS_POOL_TIMEOUT_SEC")
+    if timeout is None:
+        return 600
+    return timeout
+
+
+# Max number of concurrent downloads made by the io service, in total and to
+# any one host. 0 means no limit.
+def http_max_inflight_downloads() -> int:
+    limit = util.parse_number_env_var("WEAVE_HTTP_MAX_INFLIGHT_DOWNLOADS")
+    if limit is None:
+        return 50
+    return int(limit)
+
+
+def http_max_inflight_downloads_per_host() -> int:
+    return int(
+        util.parse_number_env_var("WEAVE_HTTP_MAX_INFLIGHT_DOWNLOADS_PER_HOST") or 0
+    )
+
+
+# Run the io service in its own process instead of a thread.
+def io_service_process() -> bool:
+    return util.parse_boolean_env_var("WEAVE_IO_SERVICE_PROCESS")
+
+
+# In process mode, io service responses of at least this many bytes are passed
+# through shared memory instead of the process queue. Sizes are of raw bytes,
+# arrow table nbytes, or a manifest's approximate size. 0 disables.
+def io_service_shared_memory_min_bytes() -> int:
+    min_bytes = util.parse_number_env_var("WEAVE_IO_SERVICE_SHARED_MEMORY_MIN_BYTES")
+    if min_bytes is None:
+        return 64 * 1024
+    return int(min_bytes)
+
+
+# Bounds for the process-wide cache of parsed artifact manifests.
+def manifest_cache_max_entries() -> int:
+    max_entries = util.parse_number_env_var("WEAVE_MANIFEST_CACHE_MAX_ENTRIES")
+    if max_entries is None:
+        return 10000
+    return int(max_entries)
+
+
+def manifest_cache_max_bytes() -> int:
+    max_bytes = util.parse_number_env_var("WEAVE_MANIFEST_CACHE_MAX_BYTES")
+    if max_bytes is None:
+        return 512 * 1024 * 1024
+    return int(max_bytes)
+
+
+# Decoded W&B tables are cached as arrow files next to the downloaded table
+# file unless this is set.
+def table_arrow_cache_enabled() -> bool:
+    return not util.parse_boolean_env_var("WEAVE_DISABLE_TABLE_ARROW_CACHE")
+
+
+# Processed run history3 tables are cached as arrow files on local disk if
+# this is set. The cache is bounded by total size and by how long ago entries
+# were last used.
+def history3_cache_enabled() -> bool:
+    return util.parse_boolean_env_var("WEAVE_HISTORY3_CACHE")
+
+
+def history3_cache_max_bytes() -> int:
+    max_bytes = util.parse_number_env_var("WEAVE_HISTORY3_CACHE_MAX_BYTES")
+    if max_bytes is None:
+        return 1024 * 1024 * 1024
+    return int(max_bytes)
+
+
+def history3_cache_max_age_sec() -> float:
+    max_age = util.parse_number_env_var("WEAVE_HISTORY3_CACHE_MAX_AGE_SEC")
+    if max_age is None:
+        return 24 * 60 * 60
+    return max_age
+
+
+# The compiled plan cache reuses compiled graphs across execute requests. It is
+# disabled unless a max number of entries is set. Entries expire after the ttl,
+# because compiling can depend on data that changes.
+def compiled_plan_cache_max_entries() -> int:
+    return int(util.parse_number_env_var("WEAVE_COMPILED_PLAN_CACHE_MAX_ENTRIES") or 0)
+
+
+def compiled_plan_cache_max_bytes() -> int:
+    max_bytes = util.parse_number_env_var("WEAVE_COMPILED_PLAN_CACHE_MAX_BYTES")
+    if max_bytes is None:
+        return 256 * 1024 * 1024
+    return int(max_bytes)
+
+
+def compiled_plan_cache_ttl_sec() -> float:
+    ttl = util.parse_number_env_var("WEAVE_COMPILED_PLAN_CACHE_TTL_SEC")
+    if ttl is None:
+        return 60
+    return ttl
+
+
+# Max number of dispatch results (op name and input types to op) kept in the
+# process-wide dispatch index.
+def dispatch_cache_max_entries() -> int:
+    max_entries = util.parse_number_env_var("WEAVE_DISPATCH_CACHE_MAX_ENTRIES")
+    if max_entries is None:
+        return 10000
+    return int(max_entries)
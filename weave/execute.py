@@ -1,4 +1,8 @@
+import collections
 import dataclasses
+import datetime
+from concurrent import futures
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import contextlib
 import contextvars
@@ -25,6 +29,7 @@ from . import value_or_error
 # Planner/Compiler
 from . import compile
 from . import forward_graph
+from . import serialize
 from . import graph
 from . import graph_debug
 from .language_features.tagging import tag_store
@@ -38,11 +43,14 @@ from .language_features.tagging import process_opdef_resolve_fn
 from .language_features.tagging import opdef_util
 
 # Trace / cache
+from . import cache
 from . import op_policy
 from . import trace_local
 from . import ref_base
 from . import object_context
 from . import memo
+from . import single_flight
+from . import filesystem
 
 # Language Features
 from . import language_nullability
@@ -50,6 +58,7 @@ from . import language_nullability
 from . import parallelism
 
 TRACE_LOCAL = trace_local.TraceLocal()
+RUN_SINGLE_FLIGHT = single_flight.SingleFlight()
 
 # Set this to true when debugging for costly, but detailed storyline of execution
 PRINT_DEBUG = False
@@ -247,10 +256,175 @@ def execute_nodes(nodes, no_cache=False) -> value_or_error.ValueOrErrors[typing.
 
 
 def execute_forward(fg: forward_graph.ForwardGraph, no_cache=False) -> ExecuteStats:
+    if (
+        environment.execute_scheduler() == environment.ExecuteScheduler.READY
+        and parallelism.get_parallel_budget() > 1
+    ):
+        return _execute_forward_ready(fg, no_cache=no_cache)
+    return _execute_forward_waves(fg, no_cache=no_cache)
+
+
+def _execute_forward_node_with_tags(
+    fg: forward_graph.ForwardGraph,
+    forward_node: forward_graph.ForwardNode,
+    op_def: op_def.OpDef,
+    no_cache=False,
+) -> "NodeExecutionReport":
+    tracer = engine_trace.tracer()
+    span = None
+    if isinstance(forward_node.node, graph.OutputNode):
+        span = tracer.trace("op.%s" % graph.op_full_name(forward_node.node.from_op))
+    try:
+        with tag_store.set_curr_node(
+            id(forward_node.node),
+            [
+                id(input_node)
+                for input_node in forward_node.node.from_op.inputs.values()
+            ],
+        ):
+            # Lambdas and async functions do not use object_context (object caching
+            # and mutational transactions).
+            if op_def.is_async or (
+                any(
+                    isinstance(input_node.type, types.Function)
+                    for input_node in forward_node.node.from_op.inputs.values()
+                )
+                and not op_def.mutation
+            ):
+                report = execute_forward_node(fg, forward_node, no_cache=no_cache)
+            else:
+                with object_context.object_context():
+                    report = execute_forward_node(fg, forward_node, no_cache=no_cache)
+
+    except Exception as e:
+        logging.info(
+            "Exception during execution of: %s\n%s"
+            % (
+                graph_debug.node_expr_str_full(forward_node.node),
+                traceback.format_exc(),
+            )
+        )
+        if value_or_error.DEBUG:
+            raise
+        forward_node.set_result(forward_graph.ErrorResult(e))
+        report = {"cache_used": False, "already_executed": False}
+    finally:
+        if span is not None:
+            span.finish()
+    return report
+
+
+def _is_ready_to_run(
+    fg: forward_graph.ForwardGraph, forward_node: forward_graph.ForwardNode
+) -> bool:
+    for param_node in forward_node.node.from_op.inputs.values():
+        if not fg.has_result(param_node):
+            return False
+    return True
+
+
+def _execute_forward_ready(
+    fg: forward_graph.ForwardGraph, no_cache=False
+) -> ExecuteStats:
+    """Dependency driven scheduler.
+
+    Instead of executing the graph in level-synchronous waves, each forward node
+    is submitted to a thread pool as soon as all of its inputs have results. The
+    calling thread owns all scheduling state, workers only execute nodes. The
+    total number of worker threads is bounded by the parallel budget, and each
+    worker gets a budget of 1 so nested execution does not fan out further.
+
+    As in the wave scheduler, only ops that op_policy allows to run in
+    parallel go to the pool. Other ops run one at a time on the calling
+    thread.
+    """
+    stats = ExecuteStats()
+    parallel_budget = parallelism.get_parallel_budget()
+    enter_thread_contexts = parallelism.thread_context_propagator(
+        parallelism.get_remaining_budget_per_thread(parallel_budget)
+    )
+    tag_store_mem_map = tag_store._OBJ_TAGS_MEM_MAP.get()
+    tag_store_curr_node_id = tag_store._OBJ_TAGS_CURR_NODE_ID.get()
+
+    def do_one(
+        forward_node: forward_graph.ForwardNode,
+    ) -> typing.Tuple[forward_graph.ForwardNode, NodeExecutionReport, float]:
+        start_time = time.time()
+        with enter_thread_contexts():
+            with tag_store.with_tag_store_state(
+                tag_store_curr_node_id, tag_store_mem_map
+            ):
+                op_def = registry_mem.memory_registry.get_op(
+                    forward_node.node.from_op.name
+                )
+                report = _execute_forward_node_with_tags(
+                    fg, forward_node, op_def, no_cache=no_cache
+                )
+        return forward_node, report, time.time() - start_time
+
+    def do_one_inline(
+        forward_node: forward_graph.ForwardNode,
+    ) -> typing.Tuple[forward_graph.ForwardNode, NodeExecutionReport, float]:
+        start_time = time.time()
+        op_def = registry_mem.memory_registry.get_op(forward_node.node.from_op.name)
+        report = _execute_forward_node_with_tags(
+            fg, forward_node, op_def, no_cache=no_cache
+        )
+        return forward_node, report, time.time() - start_time
+
+    scheduled: set[forward_graph.ForwardNode] = set()
+    in_flight: set[futures.Future] = set()
+    run_inline: collections.deque[forward_graph.ForwardNode] = collections.deque()
+
+    def schedule(forward_node: forward_graph.ForwardNode) -> None:
+        scheduled.add(forward_node)
+        if op_policy.should_run_in_parallel(
+            graph.op_full_name(forward_node.node.from_op)
+        ):
+            in_flight.add(executor.submit(do_one, forward_node))
+        else:
+            run_inline.append(forward_node)
+
+    def finish(
+        forward_node: forward_graph.ForwardNode,
+        report: NodeExecutionReport,
+        duration: float,
+    ) -> None:
+        stats.add_node(
+            forward_node.node,
+            duration,
+            report["cache_used"],
+            report.get("already_executed") or False,
+        )
+        for downstream_forward_node in forward_node.input_to:
+            if downstream_forward_node in scheduled:
+                continue
+            if _is_ready_to_run(fg, downstream_forward_node):
+                schedule(downstream_forward_node)
+
+    with ThreadPoolExecutor(max_workers=parallel_budget) as executor:
+        for forward_node in fg.roots:
+            schedule(forward_node)
+        while in_flight or run_inline:
+            if run_inline:
+                finish(*do_one_inline(run_inline.popleft()))
+                # Pick up parallel nodes that finished meanwhile, so their
+                # downstream nodes are scheduled promptly.
+                done, _ = futures.wait(in_flight, timeout=0)
+            else:
+                done, _ = futures.wait(in_flight, return_when=futures.FIRST_COMPLETED)
+            for future in done:
+                in_flight.remove(future)
+                finish(*future.result())
+    return stats
+
+
+def _execute_forward_waves(
+    fg: forward_graph.ForwardGraph, no_cache=False
+) -> ExecuteStats:
     to_run = fg.roots
 
     stats = ExecuteStats()
-    tracer = engine_trace.tracer()
     while len(to_run):
         running_now = list(to_run)
         to_run = {}
@@ -316,52 +490,9 @@ def execute_forward(fg: forward_graph.ForwardGraph, no_cache=False) -> ExecuteSt
                 # Sequential in process case
                 for forward_node in group:
                     start_time = time.time()
-                    span = None
-                    if isinstance(forward_node.node, graph.OutputNode):
-                        span = tracer.trace(
-                            "op.%s" % graph.op_full_name(forward_node.node.from_op)
-                        )
-                    try:
-                        with tag_store.set_curr_node(
-                            id(forward_node.node),
-                            [
-                                id(input_node)
-                                for input_node in forward_node.node.from_op.inputs.values()
-                            ],
-                        ):
-                            # Lambdas and async functions do not use object_context (object caching
-                            # and mutational transactions).
-                            if op_def.is_async or (
-                                any(
-                                    isinstance(input_node.type, types.Function)
-                                    for input_node in forward_node.node.from_op.inputs.values()
-                                )
-                                and not op_def.mutation
-                            ):
-                                report = execute_forward_node(
-                                    fg, forward_node, no_cache=no_cache
-                                )
-                            else:
-                                with object_context.object_context():
-                                    report = execute_forward_node(
-                                        fg, forward_node, no_cache=no_cache
-                                    )
-
-                    except Exception as e:
-                        logging.info(
-                            "Exception during execution of: %s\n%s"
-                            % (
-                                graph_debug.node_expr_str_full(forward_node.node),
-                                traceback.format_exc(),
-                            )
-                        )
-                        if value_or_error.DEBUG:
-                            raise
-                        forward_node.set_result(forward_graph.ErrorResult(e))
-                        report = {"cache_used": False, "already_executed": False}
-                    finally:
-                        if span is not None:
-                            span.finish()
+                    report = _execute_forward_node_with_tags(
+                        fg, forward_node, op_def, no_cache=no_cache
+                    )
                     stats.add_node(
                         forward_node.node,
                         time.time() - start_time,
@@ -370,11 +501,7 @@ def execute_forward(fg: forward_graph.ForwardGraph, no_cache=False) -> ExecuteSt
                     )
         for forward_node in running_now:
             for downstream_forward_node in forward_node.input_to:
-                ready_to_run = True
-                for param_node in downstream_forward_node.node.from_op.inputs.values():
-                    if not fg.has_result(param_node):
-                        ready_to_run = False
-                if ready_to_run:
+                if _is_ready_to_run(fg, downstream_forward_node):
                     to_run[downstream_forward_node] = True
     return stats
 
@@ -407,6 +534,9 @@ def execute_sync_op(
     op_def: op_def.OpDef,
     inputs: Mapping[str, typing.Any],
 ):
+    output_ref = parallelism.run_op_in_process(op_def, inputs)
+    if output_ref is not None:
+        return output_ref
     return op_def.resolve_fn(**inputs)
 
 
@@ -467,6 +597,12 @@ def execute_forward_node(
 
     op_def = registry_mem.memory_registry.get_op(node.from_op.name)
 
+    # The shared result cache is in memory, so it is only bypassed when the
+    # caller explicitly asks for no caching, not by the minimal cache mode.
+    shared_result_cache = None
+    if not no_cache and isinstance(node, graph.OutputNode):
+        shared_result_cache = forward_graph.get_shared_result_cache()
+
     cache_mode = environment.cache_mode()
     if cache_mode == environment.CacheMode.MINIMAL:
         no_cache = True
@@ -485,126 +621,276 @@ def execute_forward_node(
 
     tracer = engine_trace.tracer()
 
-    with tracer.trace("execute-read-cache"):
-        input_nodes = node.from_op.inputs
+    # The flight, if we lead one, is entered on this stack
+    flight_stack = contextlib.ExitStack()
+    with flight_stack:
+        with tracer.trace("execute-read-cache"):
+            shared_result_key = None
+            if shared_result_cache is not None and _should_share_result(op_def, node):
+                shared_result_key = _shared_result_key(node)
+            if shared_result_key is not None:
+                shared_result = shared_result_cache.get(shared_result_key)  # type: ignore
+                if shared_result is not shared_result_cache.NOT_FOUND:  # type: ignore
+                    forward_node.set_result(shared_result)
+                    return {"cache_used": True, "already_executed": False}
 
-        input_refs: dict[str, ref_base.Ref] = {}
-        for input_name, input_node in input_nodes.items():
-            input_refs[input_name] = fg.get_result(input_node)
-            if isinstance(input_refs[input_name], forward_graph.ErrorResult):
-                forward_node.set_result(input_refs[input_name])
-                return {"cache_used": False, "already_executed": False}
-
-        run_key = None
-        if use_cache or op_def.is_async:
-            # Compute the run ID, which is deterministic if the op is pure
-            run_key = trace_local.make_run_key(op_def, input_refs)
-
-        if run_key and op_def.pure:
-            run = TRACE_LOCAL.get_run_val(run_key)
-            if run is not None and run != None:  # stupid box none makes us check !=
-                # Watch out, we handle loading async runs in different ways.
-                if op_def.is_async:
-                    forward_node.set_result(TRACE_LOCAL.get_run(run_key))
+            input_nodes = node.from_op.inputs
+
+            input_refs: dict[str, ref_base.Ref] = {}
+            for input_name, input_node in input_nodes.items():
+                input_refs[input_name] = fg.get_result(input_node)
+                if isinstance(input_refs[input_name], forward_graph.ErrorResult):
+                    forward_node.set_result(input_refs[input_name])
+                    return {"cache_used": False, "already_executed": False}
+
+            run_key = None
+            if use_cache or op_def.is_async:
+                # Compute the run ID, which is deterministic if the op is pure
+                run_key = trace_local.make_run_key(op_def, input_refs)
+
+            # Concurrent requests for the same run wait for the first one to
+            # finish, and use its result.
+            flight: typing.Optional[single_flight.Flight] = None
+            if run_key and op_def.pure:
+                if _set_result_from_run_cache(
+                    forward_node, op_def, run_key, input_refs
+                ):
                     return {"cache_used": True, "already_executed": False}
-                else:
-                    if run.output is not None:
-                        output_ref = run.output
-                        # We must deref here to restore tags
-                        output = output_ref.get()
-                        logging.debug("Cache hit, returning")
-
-                        # Flowed tags are not cacheable(!),
-                        # because they may contain graph dependent information,
-                        # as in the case of gql tags that contain results for downstream
-                        # nodes. So we fix that up here, by flowing tags and overriding
-                        # the cached tags.
-                        # Note, this only works for outer tags, not tags that are inside
-                        # values. For those, we don't have a solution yet.
-                        if opdef_util.should_flow_tags(op_def):
-                            arg0_ref = next(iter(input_refs.values()))
-                            arg0 = ref_base.deref(arg0_ref)
-
-                            output = output_ref.get()
-
-                            process_opdef_resolve_fn.flow_tags(arg0, output)
-
-                        forward_node.set_result(output_ref)
-
-                        return {"cache_used": True, "already_executed": False}
-                # otherwise, the run's output was not saveable, so we need
-                # to recompute it.
-        inputs = {
-            input_name: _tag_safe_deref(input)
-            for input_name, input in input_refs.items()
-        }
+                timeout = environment.single_flight_timeout_sec()
+                if timeout > 0:
+                    flight, is_leader = RUN_SINGLE_FLIGHT.join(_run_flight_key(run_key))
+                    if is_leader:
+                        # Land the flight however we leave, so waiters never
+                        # block on a leader that is gone.
+                        flight_stack.enter_context(flight)
+                    else:
+                        if _set_result_from_flight(
+                            forward_node, op_def, run_key, input_refs, flight, timeout
+                        ):
+                            return {"cache_used": True, "already_executed": False}
+                        flight = None
+            inputs = {
+                input_name: _tag_safe_deref(input)
+                for input_name, input in input_refs.items()
+            }
 
-    if op_def.is_async and run_key:
-        with tracer.trace("execute-async"):
-            input_refs = {}
-            for input_name, input in inputs.items():
-                ref = ref_base.get_ref(input)
-                if ref is None:
-                    ref = TRACE_LOCAL.save_object(input)
-                input_refs[input_name] = ref
-            run = TRACE_LOCAL.new_run(run_key, inputs=input_refs)  # type: ignore
-            execute_async_op(op_def, input_refs, run_key)
-            forward_node.set_result(run)
-    else:
-        result: typing.Any
-        with tracer.trace("execute-sync"):
-            # TODO: This logic should all move into resolve_fn of op_def...
-            if language_nullability.should_force_none_result(inputs, op_def):
-                if isinstance(op_def.concrete_output_type, types.TypeType):
-                    result = types.NoneType()
+        if op_def.is_async and run_key:
+            with tracer.trace("execute-async"):
+                input_refs = {}
+                for input_name, input in inputs.items():
+                    ref = ref_base.get_ref(input)
+                    if ref is None:
+                        ref = TRACE_LOCAL.save_object(input)
+                    input_refs[input_name] = ref
+                run = TRACE_LOCAL.new_run(run_key, inputs=input_refs)  # type: ignore
+                execute_async_op(op_def, input_refs, run_key)
+                forward_node.set_result(run)
+                if flight is not None:
+                    flight.set_result(run)
+        else:
+            result: typing.Any
+            with tracer.trace("execute-sync"):
+                # TODO: This logic should all move into resolve_fn of op_def...
+                if language_nullability.should_force_none_result(inputs, op_def):
+                    if isinstance(op_def.concrete_output_type, types.TypeType):
+                        result = types.NoneType()
+                    else:
+                        result = None
+                    # Still need to flow tags
+                    if opdef_util.should_flow_tags(op_def):
+                        result = process_opdef_resolve_fn.flow_tags(
+                            next(iter(inputs.values())), box.box(result)
+                        )
                 else:
-                    result = None
-                # Still need to flow tags
-                if opdef_util.should_flow_tags(op_def):
-                    result = process_opdef_resolve_fn.flow_tags(
-                        next(iter(inputs.values())), box.box(result)
-                    )
-            else:
-                result = execute_sync_op(op_def, inputs)
-                if USE_EXECUTION_TIME_NODE_EXPANSION:
-                    if _should_expand_result(op_def, result):
-                        result = _expand_node_result(result, forward_node, fg)
-
-        with tracer.trace("execute-write-cache"):
-            ref = ref_base.get_ref(result)
-
-            if ref is not None:
-                logging.debug("Op resulted in ref")
-                # If the op produced an object which has a ref (as in the case of get())
-                # the result is the ref. This enables memoization after impure ops. E.g.
-                # if get('x:latest') produces version x:1, we use x:1 for our make_run_key
-                # calculation
-
-                # Add tags from the result to the ref
-                if tag_store.is_tagged(result):
-                    tag_store.add_tags(ref, tag_store.get_tags(result))
-                result = ref
-            else:
-                if use_cache and run_key and not box.is_none(result):
-                    result = TRACE_LOCAL.save_run_output(op_def, run_key, result)
-
-            forward_node.set_result(result)
-
-            # Don't save run ops as runs themselves.
-            # TODO: This actually should work correctly, but mutation tracing
-            #    does not really work yet. (mutated objects set their run output
-            #    as the original ref rather than the new ref, which causes problems)
-            if (
-                use_cache
-                and run_key is not None
-                and not is_run_op(node.from_op)
-                and not box.is_none(result)
-            ):
-                logging.debug("Saving run")
-                TRACE_LOCAL.new_run(run_key, inputs=input_refs, output=result)
+                    result = execute_sync_op(op_def, inputs)
+                    if USE_EXECUTION_TIME_NODE_EXPANSION:
+                        if _should_expand_result(op_def, result):
+                            result = _expand_node_result(result, forward_node, fg)
+
+            with tracer.trace("execute-write-cache"):
+                ref = ref_base.get_ref(result)
+
+                if ref is not None:
+                    logging.debug("Op resulted in ref")
+                    # If the op produced an object which has a ref (as in the case of get())
+                    # the result is the ref. This enables memoization after impure ops. E.g.
+                    # if get('x:latest') produces version x:1, we use x:1 for our make_run_key
+                    # calculation
+
+                    # Add tags from the result to the ref
+                    if tag_store.is_tagged(result):
+                        tag_store.add_tags(ref, tag_store.get_tags(result))
+                    result = ref
+                else:
+                    if use_cache and run_key and not box.is_none(result):
+                        result = TRACE_LOCAL.save_run_output(op_def, run_key, result)
+
+                forward_node.set_result(result)
+                if flight is not None:
+                    flight.set_result(result)
+
+                if shared_result_key is not None and not tag_store.is_tagged(result):
+                    _share_result(shared_result_cache, shared_result_key, node, result)  # type: ignore
+
+                # Don't save run ops as runs themselves.
+                # TODO: This actually should work correctly, but mutation tracing
+                #    does not really work yet. (mutated objects set their run output
+                #    as the original ref rather than the new ref, which causes problems)
+                if (
+                    use_cache
+                    and run_key is not None
+                    and not is_run_op(node.from_op)
+                    and not box.is_none(result)
+                ):
+                    logging.debug("Saving run")
+                    TRACE_LOCAL.new_run(run_key, inputs=input_refs, output=result)
     return {"cache_used": False, "already_executed": False}
 
 
+def _set_result_from_run_cache(
+    forward_node: forward_graph.ForwardNode,
+    op_def: op_def.OpDef,
+    run_key: trace_local.RunKey,
+    input_refs: Mapping[str, typing.Any],
+) -> bool:
+    run = TRACE_LOCAL.get_run_val(run_key)
+    if run is not None and run != None:  # stupid box none makes us check !=
+        # Watch out, we handle loading async runs in different ways.
+        if op_def.is_async:
+            forward_node.set_result(TRACE_LOCAL.get_run(run_key))
+            return True
+        else:
+            if run.output is not None:
+                _set_result_from_output_ref(
+                    forward_node, op_def, run.output, input_refs
+                )
+                return True
+        # otherwise, the run's output was not saveable, so we need
+        # to recompute it.
+    return False
+
+
+def _set_result_from_output_ref(
+    forward_node: forward_graph.ForwardNode,
+    op_def: op_def.OpDef,
+    output_ref: ref_base.Ref,
+    input_refs: Mapping[str, typing.Any],
+) -> None:
+    # We must deref here to restore tags
+    output = output_ref.get()
+    logging.debug("Cache hit, returning")
+
+    # Flowed tags are not cacheable(!),
+    # because they may contain graph dependent information,
+    # as in the case of gql tags that contain results for downstream
+    # nodes. So we fix that up here, by flowing tags and overriding
+    # the cached tags.
+    # Note, this only works for outer tags, not tags that are inside
+    # values. For those, we don't have a solution yet.
+    if opdef_util.should_flow_tags(op_def):
+        arg0_ref = next(iter(input_refs.values()))
+        arg0 = ref_base.deref(arg0_ref)
+
+        output = output_ref.get()
+
+        process_opdef_resolve_fn.flow_tags(arg0, output)
+
+    forward_node.set_result(output_ref)
+
+
+def _set_result_from_flight(
+    forward_node: forward_graph.ForwardNode,
+    op_def: op_def.OpDef,
+    run_key: trace_local.RunKey,
+    input_refs: Mapping[str, typing.Any],
+    flight: single_flight.Flight,
+    timeout: float,
+) -> bool:
+    result = flight.wait(timeout)
+    if result is single_flight.Flight.NO_RESULT:
+        return False
+    if op_def.is_async:
+        # Async runs are saved before the leader finishes
+        return _set_result_from_run_cache(forward_node, op_def, run_key, input_refs)
+    if not isinstance(result, ref_base.Ref):
+        return False
+    # The leader's ref holds the leader's deserialized value and tags, so
+    # load our own copy, as if we had hit the run cache.
+    try:
+        output_ref = ref_base.Ref.from_str(result.uri)
+    except NotImplementedError:
+        return False
+    _set_result_from_output_ref(forward_node, op_def, output_ref, input_refs)
+    return True
+
+
+def _run_flight_key(run_key: trace_local.RunKey) -> typing.Hashable:
+    # Runs are cached per user, so flights must be too.
+    return (filesystem.get_filesystem_dir(), run_key.op_simple_name, run_key.id)
+
+
+def _type_dict_is_shareable(type_dict: typing.Any) -> bool:
+    if isinstance(type_dict, str):
+        return type_dict not in ("any", "unknown")
+    elif isinstance(type_dict, dict):
+        # Tags live in the per-request tag store, so tagged values can't be
+        # shared across requests.
+        if type_dict.get("type") == "tagged":
+            return False
+        return all(_type_dict_is_shareable(v) for v in type_dict.values())
+    elif isinstance(type_dict, list):
+        return all(_type_dict_is_shareable(v) for v in type_dict)
+    return True
+
+
+def _should_share_result(op_def: op_def.OpDef, node: graph.OutputNode) -> bool:
+    if op_def.is_async or op_def.mutation or is_run_op(node.from_op):
+        return False
+    return _type_dict_is_shareable(node.type.to_dict())
+
+
+def _shared_result_key(node: graph.OutputNode) -> typing.Optional[str]:
+    # node_id is a structural hash of op name, input hashes and const values.
+    # The shared result cache adds the user cache key.
+    try:
+        return serialize.node_id(node)
+    except Exception:
+        logging.debug("Could not compute shared result key", exc_info=True)
+        return None
+
+
+@memo.memo
+def _depends_on_impure_op(node: graph.Node) -> bool:
+    if isinstance(node, graph.OutputNode):
+        if not registry_mem.memory_registry.get_op(node.from_op.name).pure:
+            return True
+        return any(
+            _depends_on_impure_op(input_node)
+            for input_node in node.from_op.inputs.values()
+        )
+    elif isinstance(node, graph.ConstNode) and isinstance(node.val, graph.Node):
+        # Lambda bodies
+        return _depends_on_impure_op(node.val)
+    return False
+
+
+def _share_result(
+    shared_result_cache: cache.LruSizeBoundedCache[str, typing.Any],
+    shared_result_key: str,
+    node: graph.OutputNode,
+    result: typing.Any,
+) -> None:
+    ttl = None
+    if _depends_on_impure_op(node):
+        ttl_sec = environment.shared_result_cache_impure_ttl_sec()
+        if ttl_sec <= 0:
+            return
+        ttl = datetime.timedelta(seconds=ttl_sec)
+    shared_result_cache.set(
+        shared_result_key, result, forward_graph.approx_size_bytes(result), ttl=ttl
+    )
+
+
 def _should_expand_result(op_def: op_def.OpDef, result: typing.Any) -> bool:
     return op_def.returns_expansion_node
 
@@ -1,8 +1,11 @@
 import contextlib
 import contextvars
 import collections
+import sys
 import typing
 
+from . import cache
+from . import environment
 from . import graph
 from . import errors
 
@@ -80,6 +83,60 @@ def get_node_result_store() -> NodeResultStore:
     return store
 
 
+# Unlike NodeResultStore, which only lives for one top-level execute call,
+# the shared result cache lives for the whole process. It is keyed by a
+# structural hash of the compiled node, so identical subgraphs sent in
+# different requests can reuse each other's results.
+_shared_result_cache: typing.Optional[cache.LruSizeBoundedCache[str, typing.Any]] = None
+
+
+def get_shared_result_cache() -> typing.Optional[
+    cache.LruSizeBoundedCache[str, typing.Any]
+]:
+    global _shared_result_cache
+    max_entries = environment.shared_result_cache_max_entries()
+    if max_entries <= 0:
+        return None
+    if _shared_result_cache is None:
+        _shared_result_cache = cache.LruSizeBoundedCache(
+            max_entries,
+            environment.shared_result_cache_max_bytes(),
+            stats_name="weave.shared_result_cache",
+        )
+    return _shared_result_cache
+
+
+# Only look at this many items of a container when estimating its size.
+APPROX_SIZE_SAMPLE_SIZE = 100
+
+
+def approx_size_bytes(val: typing.Any) -> int:
+    """Cheap estimate of the memory held by a result."""
+    # Look attributes up on the class or instance dict, so we don't trigger
+    # __getattr__ on objects that dispatch attribute access.
+    if hasattr(type(val), "nbytes"):
+        # numpy arrays, pyarrow arrays and tables
+        return val.nbytes
+    arrow_data = getattr(val, "__dict__", {}).get("_arrow_data")
+    if arrow_data is not None:
+        # ArrowWeaveList
+        return arrow_data.nbytes
+    if isinstance(val, dict):
+        sample: list = []
+        for item in val.values():
+            if len(sample) >= APPROX_SIZE_SAMPLE_SIZE:
+                break
+            sample.append(item)
+    elif isinstance(val, (list, tuple)):
+        sample = list(val[:APPROX_SIZE_SAMPLE_SIZE])
+    else:
+        return sys.getsizeof(val)
+    if not sample:
+        return sys.getsizeof(val)
+    sample_bytes = sum(approx_size_bytes(item) for item in sample)
+    return sys.getsizeof(val) + sample_bytes * len(val) // len(sample)
+
+
 class ForwardNode:
     node: graph.OutputNode[ExecutableNode]
     input_to: dict["ForwardNode", typing.Literal[True]]
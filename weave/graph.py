@@ -372,6 +372,33 @@ def map_nodes_full(
     return results
 
 
+class _MappedOrDone(dict):
+    # An already_mapped dict for _map_nodes where done nodes map to themselves.
+    def __init__(self, done: set[Node]) -> None:
+        super().__init__()
+        self._done = done
+
+    def __contains__(self, node: object) -> bool:
+        return dict.__contains__(self, node) or node in self._done
+
+    def __getitem__(self, node: Node) -> Node:
+        if dict.__contains__(self, node):
+            return dict.__getitem__(self, node)
+        if node in self._done:
+            return node
+        raise KeyError(node)
+
+
+def map_new_nodes_full(
+    node: Node,
+    map_fn: typing.Callable[[Node], typing.Optional[Node]],
+    done: set[Node],
+) -> Node:
+    """Map the dag represented by node, including sub-lambdas, without visiting
+    the nodes in done (or their inputs)."""
+    return _map_nodes(node, map_fn, _MappedOrDone(done), True)
+
+
 def all_nodes_full(leaf_nodes: list[Node]) -> list[Node]:
     result: list[Node] = []
     map_nodes_full(leaf_nodes, lambda n: result.append(n))
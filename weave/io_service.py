@@ -12,6 +12,7 @@ import queue
 import uuid
 import asyncio
 import dataclasses
+import json
 import typing
 import contextlib
 import aioprocessing
@@ -19,11 +20,15 @@ import multiprocessing
 import logging
 import traceback
 import threading
+from multiprocessing import resource_tracker, shared_memory
+
+import pyarrow as pa
 
 
 from . import artifact_wandb
 from . import errors
 from . import engine_trace
+from . import environment
 from . import filesystem
 from . import weave_http
 from . import wandb_api
@@ -143,6 +148,104 @@ class ServerResponse:
         }
 
 
+# SharedMemoryValue is a response value that was too large to send through the
+# process queue. Only values whose size is known without serializing them are
+# sent this way: bytes-like values, arrow tables, and artifact manifests, which
+# are sent as their raw JSON. The server process copies the value into a
+# shared memory segment and only puts this small descriptor on the queue. The
+# user process loads the value and frees the segment.
+@dataclasses.dataclass
+class SharedMemoryValue:
+    name: str
+    size: int
+    kind: str
+
+    @classmethod
+    def _create(
+        cls, size: int, kind: str, write: Callable[[memoryview], None]
+    ) -> "SharedMemoryValue":
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            write(shm.buf[:size])
+        except:
+            shm.close()
+            shm.unlink()
+            raise
+        shm.close()
+        # The user process unlinks the segment once it has loaded the value,
+        # so the server process's resource tracker must not clean it up.
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore
+        return cls(shm.name, size, kind)
+
+    @classmethod
+    def from_bytes(cls, data: typing.Any, kind: str = "bytes") -> "SharedMemoryValue":
+        view = memoryview(data).cast("B")
+
+        def write(buf: memoryview) -> None:
+            buf[:] = view
+
+        return cls._create(view.nbytes, kind, write)
+
+    @classmethod
+    def from_manifest(
+        cls, manifest: artifact_wandb.WandbArtifactManifest
+    ) -> "SharedMemoryValue":
+        return cls.from_bytes(
+            json.dumps(manifest._manifest_json).encode(), kind="manifest"
+        )
+
+    @classmethod
+    def from_arrow(cls, table: pa.Table) -> "SharedMemoryValue":
+        sink = pa.MockOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        size = sink.size()
+
+        def write(buf: memoryview) -> None:
+            with pa.ipc.new_stream(
+                pa.FixedSizeBufferWriter(pa.py_buffer(buf)), table.schema
+            ) as writer:
+                writer.write_table(table)
+
+        return cls._create(size, "arrow", write)
+
+    def load(self) -> typing.Any:
+        shm = shared_memory.SharedMemory(name=self.name)
+        try:
+            # copy out before the segment is unlinked
+            data = bytes(shm.buf[: self.size])
+        finally:
+            shm.close()
+            shm.unlink()
+        if self.kind == "arrow":
+            return pa.ipc.open_stream(data).read_all()
+        if self.kind == "manifest":
+            return artifact_wandb.WandbArtifactManifest(json.loads(data))
+        return data
+
+
+def encode_process_response_value(value: typing.Any, min_bytes: int) -> typing.Any:
+    # Everything else is passed through as is and pickled by the queue.
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        if memoryview(value).nbytes >= min_bytes:
+            statsd.increment("weave.io_service.shared_memory_response")
+            return SharedMemoryValue.from_bytes(value)
+    elif isinstance(value, pa.Table):
+        if value.nbytes >= min_bytes:
+            statsd.increment("weave.io_service.shared_memory_response")
+            return SharedMemoryValue.from_arrow(value)
+    return value
+
+
+def decode_process_response_value(value: typing.Any) -> typing.Any:
+    if isinstance(value, SharedMemoryValue):
+        return value.load()
+    if isinstance(value, list):
+        # batched handlers
+        return [decode_process_response_value(item) for item in value]
+    return value
+
+
 class ShutDown:
     def __eq__(self, other: Any) -> bool:
         return isinstance(other, ShutDown)
@@ -165,6 +268,12 @@ class Server:
         process: bool = False,
     ) -> None:
         self.handlers: Dict[str, HandlerFunction] = {}
+        self.process = process
+
+        # In process mode, bytes and arrow responses at least this large are
+        # passed through shared memory instead of being pickled through the
+        # queue. 0 disables.
+        self.shared_memory_min_bytes = environment.io_service_shared_memory_min_bytes()
 
         self.request_handler: typing.Union[threading.Thread, aioprocessing.AioProcess]
         self.request_queue: async_queue.Queue[ServerRequest]
@@ -194,10 +303,15 @@ class Server:
 
         # Register handlers
         self.register_handler_fn("ensure_manifest", self.handle_ensure_manifest)
+        self.register_handler_fn("ensure_manifests", self.handle_ensure_manifests)
         self.register_handler_fn(
             "ensure_file_downloaded", self.handle_ensure_file_downloaded
         )
+        self.register_handler_fn(
+            "ensure_files_downloaded", self.handle_ensure_files_downloaded
+        )
         self.register_handler_fn("ensure_file", self.handle_ensure_file)
+        self.register_handler_fn("ensure_files", self.handle_ensure_files)
         self.register_handler_fn("direct_url", self.handle_direct_url)
         self.register_handler_fn("sleep", self.handle_sleep)
 
@@ -276,6 +390,9 @@ class Server:
                 self._internal_response_queue.task_done()
                 self._internal_response_queue.join()
                 break
+            # load here rather than in the client so shared memory segments
+            # are always freed, even if the client has gone away
+            resp.value = decode_process_response_value(resp.value)
             client_response_queue = self.client_response_queues[resp.client_id]
             # this is non-blocking b/c resp is already in memory
             client_response_queue.put(resp)
@@ -292,6 +409,10 @@ class Server:
             else:
                 try:
                     val = await handler(*req.args)
+                    if self.process and self.shared_memory_min_bytes:
+                        val = encode_process_response_value(
+                            val, self.shared_memory_min_bytes
+                        )
                 except Exception as e:
                     logging.error(
                         "WBArtifactManager request error: %s\n",
@@ -379,9 +500,20 @@ class Server:
 
     async def handle_ensure_manifest(
         self, artifact_uri: str
-    ) -> typing.Optional[artifact_wandb.WandbArtifactManifest]:
+    ) -> typing.Union[None, artifact_wandb.WandbArtifactManifest, SharedMemoryValue]:
         uri = artifact_wandb.WeaveWBArtifactURI.parse(artifact_uri)
-        return await self.wandb_file_manager.manifest(uri)
+        manifest = await self.wandb_file_manager.manifest(uri)
+        # Large manifests are sent to the user process as raw JSON through
+        # shared memory, rather than pickled through the queue.
+        if (
+            manifest is not None
+            and self.process
+            and self.shared_memory_min_bytes
+            and manifest.approx_size_bytes() >= self.shared_memory_min_bytes
+        ):
+            statsd.increment("weave.io_service.shared_memory_response")
+            return SharedMemoryValue.from_manifest(manifest)
+        return manifest
 
     async def handle_ensure_file(self, artifact_uri: str) -> typing.Optional[str]:
         uri = artifact_wandb.WeaveWBArtifactURI.parse(artifact_uri)
@@ -396,6 +528,32 @@ class Server:
         uri = artifact_wandb.WeaveWBArtifactURI.parse(artifact_uri)
         return await self.wandb_file_manager.direct_url(uri)
 
+    # Batched handlers run their items concurrently, bounded by the http
+    # connection limits. One failed item fails the whole batch.
+
+    async def handle_ensure_manifests(
+        self, artifact_uris: list[str]
+    ) -> list[
+        typing.Union[None, artifact_wandb.WandbArtifactManifest, SharedMemoryValue]
+    ]:
+        return await asyncio.gather(
+            *(self.handle_ensure_manifest(uri) for uri in artifact_uris)
+        )
+
+    async def handle_ensure_files(
+        self, artifact_uris: list[str]
+    ) -> list[typing.Optional[str]]:
+        return await asyncio.gather(
+            *(self.handle_ensure_file(uri) for uri in artifact_uris)
+        )
+
+    async def handle_ensure_files_downloaded(
+        self, download_urls: list[str]
+    ) -> list[typing.Optional[str]]:
+        return await asyncio.gather(
+            *(self.handle_ensure_file_downloaded(url) for url in download_urls)
+        )
+
     async def handle_sleep(self, seconds: float) -> float:
         # used for testing to simulate long running processes
         await asyncio.sleep(seconds)
@@ -410,7 +568,7 @@ def get_server() -> Server:
     global SERVER
     with SERVER_START_LOCK:
         if SERVER is None:
-            SERVER = Server(process=False)
+            SERVER = Server(process=environment.io_service_process())
             SERVER.start()
         return SERVER
 
@@ -515,6 +673,23 @@ class AsyncConnection:
         res = await self.request("ensure_file_downloaded", download_url)
         return res
 
+    async def manifests(
+        self, artifact_uris: typing.Sequence[artifact_wandb.WeaveWBArtifactURI]
+    ) -> list[typing.Optional[artifact_wandb.WandbArtifactManifest]]:
+        return await self.request(
+            "ensure_manifests", [str(uri) for uri in artifact_uris]
+        )
+
+    async def ensure_files(
+        self, artifact_uris: typing.Sequence[artifact_wandb.WeaveWBArtifactURI]
+    ) -> list[typing.Optional[str]]:
+        return await self.request("ensure_files", [str(uri) for uri in artifact_uris])
+
+    async def ensure_files_downloaded(
+        self, download_urls: typing.Sequence[str]
+    ) -> list[typing.Optional[str]]:
+        return await self.request("ensure_files_downloaded", list(download_urls))
+
     async def direct_url(
         self, artifact_uri: artifact_wandb.WeaveWBArtifactURI
     ) -> typing.Optional[str]:
@@ -601,6 +776,21 @@ class SyncClient:
     def ensure_file_downloaded(self, download_url: str) -> typing.Optional[str]:
         return self.request("ensure_file_downloaded", download_url)
 
+    def manifests(
+        self, artifact_uris: typing.Sequence[artifact_wandb.WeaveWBArtifactURI]
+    ) -> list[typing.Optional[artifact_wandb.WandbArtifactManifest]]:
+        return self.request("ensure_manifests", [str(uri) for uri in artifact_uris])
+
+    def ensure_files(
+        self, artifact_uris: typing.Sequence[artifact_wandb.WeaveWBArtifactURI]
+    ) -> list[typing.Optional[str]]:
+        return self.request("ensure_files", [str(uri) for uri in artifact_uris])
+
+    def ensure_files_downloaded(
+        self, download_urls: typing.Sequence[str]
+    ) -> list[typing.Optional[str]]:
+        return self.request("ensure_files_downloaded", list(download_urls))
+
     def direct_url(
         self, artifact_uri: artifact_wandb.WeaveWBArtifactURI
     ) -> typing.Optional[str]:
@@ -632,6 +822,21 @@ class ServerlessClient:
     def ensure_file_downloaded(self, download_url: str) -> typing.Optional[str]:
         return self.wandb_file_manager.ensure_file_downloaded(download_url)
 
+    def manifests(
+        self, artifact_uris: typing.Sequence[artifact_wandb.WeaveWBArtifactURI]
+    ) -> list[typing.Optional[artifact_wandb.WandbArtifactManifest]]:
+        return [self.manifest(uri) for uri in artifact_uris]
+
+    def ensure_files(
+        self, artifact_uris: typing.Sequence[artifact_wandb.WeaveWBArtifactURI]
+    ) -> list[typing.Optional[str]]:
+        return [self.ensure_file(uri) for uri in artifact_uris]
+
+    def ensure_files_downloaded(
+        self, download_urls: typing.Sequence[str]
+    ) -> list[typing.Optional[str]]:
+        return [self.ensure_file_downloaded(url) for url in download_urls]
+
     def direct_url(
         self, artifact_uri: artifact_wandb.WeaveWBArtifactURI
     ) -> typing.Optional[str]:
@@ -129,9 +129,21 @@ class ObjectContext:
         art.save(branch=target_branch)  # type: ignore
 
     def finish_mutations(self) -> None:
+        from . import compile_cache
+        from . import forward_graph
+
         for target_uri in self.objects.keys():
             self.finish_mutation(target_uri)
 
+        # A mutation can change what any node evaluates to, so don't let
+        # stale shared results outlive it.
+        shared_result_cache = forward_graph.get_shared_result_cache()
+        if self.objects and shared_result_cache is not None:
+            shared_result_cache.clear()
+        # Compiled graphs can have types refined from the old objects.
+        if self.objects:
+            compile_cache.clear()
+
 
 _object_context: contextvars.ContextVar[
     typing.Optional[ObjectContext]
@@ -45,12 +45,25 @@ CACHE_OP_NAMES = [
 PARALLEL_OP_NAMES = CACHE_AND_PARALLEL_OP_NAMES
 
 
+# CPU bound ops that run in a pool of worker processes, when
+# WEAVE_PROCESS_POOL_WORKERS is set. Their inputs and outputs must be
+# saveable as local artifacts.
+PROCESS_OP_NAMES = [
+    "op-umap_project",
+    "op-hdbscan_cluster",
+]
+
+
 def should_run_in_parallel(op_name: str) -> bool:
     if op_name.startswith("mapped_"):
         op_name = op_name[len("mapped_") :]
     return op_name in PARALLEL_OP_NAMES
 
 
+def should_run_in_process(op_name: str) -> bool:
+    return op_name in PROCESS_OP_NAMES
+
+
 def should_cache(op_name: str) -> bool:
     if op_name.startswith("mapped_"):
         return False
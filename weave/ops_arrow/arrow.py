@@ -122,6 +122,40 @@ def arrow_as_array(obj) -> pa.Array:
     return obj
 
 
+class _HashWriter:
+    """Minimal writable file object that feeds everything written into a hash."""
+
+    def __init__(self, hash: typing.Any) -> None:
+        self._hash = hash
+        self.closed = False
+
+    def write(self, data: typing.Any) -> int:
+        self._hash.update(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+
+def update_hash_with_arrow_array(hash: typing.Any, arr: pa.Array) -> None:
+    """Feed the contents of arr into hash.
+
+    The array is streamed through the Arrow IPC writer buffer by buffer, so
+    slices and dictionaries are handled correctly and no copy of the whole
+    array is materialized.
+    """
+    batch = pa.RecordBatch.from_arrays([arr], ["_"])
+    sink = pa.PythonFile(_HashWriter(hash), mode="w")
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+
+
 def offsets_starting_at_zero(arr: pa.ListArray) -> pa.IntegerArray:
     """
     We often have code to operate on the elements of a list array. That code
@@ -195,6 +195,26 @@ def arrow_dict_(**d):
     return ArrowWeaveList(table, types.TypedDict(res.prop_types), res.artifact)
 
 
+def _embedding_matrix(arr: pa.Array) -> np.ndarray:
+    # Lists of the same length without nulls are read as a view of the list
+    # values, instead of converting each row to a numpy array and stacking.
+    if (
+        isinstance(arr, (pa.ListArray, pa.LargeListArray, pa.FixedSizeListArray))
+        and len(arr) > 0
+        and arr.null_count == 0
+    ):
+        values = arr.flatten()
+        if isinstance(arr, pa.FixedSizeListArray):
+            same_lengths = True
+        else:
+            lengths = np.diff(arr.offsets.to_numpy())
+            same_lengths = bool((lengths == lengths[0]).all())
+        numeric = pa.types.is_integer(values.type) or pa.types.is_floating(values.type)
+        if same_lengths and numeric and values.null_count == 0:
+            return values.to_numpy(zero_copy_only=False).reshape(len(arr), -1)
+    return np.stack(arr.to_numpy(False), axis=0)
+
+
 @arrow_op(
     name="ArrowWeaveList-2DProjection",
     input_type={
@@ -234,9 +254,7 @@ def awl_2d_projection(
     else:
         if inputCardinality == "single":
             path = _dict_utils.split_escaped_string(inputColumnNames[0])
-            np_array_of_embeddings = np.stack(
-                _awl_pick(data, path).to_numpy(False), axis=0
-            )
+            np_array_of_embeddings = _embedding_matrix(_awl_pick(data, path))
         else:
             column_data = [
                 _awl_pick(data, _dict_utils.split_escaped_string(c))
@@ -350,9 +368,7 @@ def awl_projection_2d(
     else:
         if inputCardinality == "single":
             path = _dict_utils.split_escaped_string(inputColumnNames[0])
-            np_array_of_embeddings = np.stack(
-                _awl_pick(data, path).to_numpy(False), axis=0
-            )
+            np_array_of_embeddings = _embedding_matrix(_awl_pick(data, path))
         else:
             column_data = [
                 _awl_pick(data, _dict_utils.split_escaped_string(c))
@@ -29,6 +29,7 @@ from .arrow import (
     pretty_print_arrow_type,
     arrow_zip,
     arrow_as_array,
+    update_hash_with_arrow_array,
 )
 from .. import debug_types
 
@@ -524,6 +525,28 @@ class ArrowWeaveList(typing.Generic[ArrowWeaveListObjectTypeVar]):
 
         self._validate()
 
+    def _weave_fingerprint(self) -> typing.Optional[str]:
+        # Used by trace_local to make run keys without serializing the data.
+        # Hashing the buffers is O(size) so the result is memoized. We key
+        # the memo on the arrow data in case it is swapped out.
+        memo = getattr(self, "_fingerprint_memo", None)
+        if memo is not None and memo[0] is self._arrow_data:
+            return memo[1]
+        from .. import trace_local
+
+        hash = trace_local.new_fingerprint_hash()
+        if self._artifact is not None:
+            # Refs inside the data are relative to the artifact
+            try:
+                artifact_uri = self._artifact.uri  # type: ignore
+            except (AttributeError, NotImplementedError):
+                return None
+            hash.update(artifact_uri.encode())
+        update_hash_with_arrow_array(hash, self._arrow_data)
+        fingerprint = "awl:" + hash.hexdigest()
+        self._fingerprint_memo = (self._arrow_data, fingerprint)
+        return fingerprint
+
     def _validate(self) -> None:
         if self._invalid_reason is None:
             self._validate_weave_type()
@@ -499,6 +499,53 @@ def index(
     return self._index(index)
 
 
+def _lookup_position(self: ArrowWeaveList, id: typing.Any) -> typing.Optional[int]:
+    # column unwraps tagged rows, and we drop tags on the ids themselves
+    ids = arrow_as_array(self.column("id")._arrow_data_asarray_no_tags())
+    try:
+        position = pc.index(ids, pa.scalar(id, ids.type)).as_py()
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        # id can't be compared to the id column in arrow, like when the
+        # column is a union of strings and ints.
+        try:
+            position = ids.to_pylist().index(id)
+        except ValueError:
+            position = -1
+    if position < 0:
+        return None
+    return position
+
+
+@op(
+    name="ArrowWeaveListTypedDict-lookup",
+    input_type={
+        "self": ArrowWeaveListType(types.TypedDict({"id": primitive_list.ID_TYPE})),
+        "id": primitive_list.ID_TYPE,
+    },
+    output_type=lambda input_types: primitive_list.getitem_output_type(
+        {"arr": input_types["self"], "id": input_types["id"]},
+        list_type=ArrowWeaveListType,
+    ),
+)
+def typeddict_lookup(self, id):
+    return self._index(_lookup_position(self, id))
+
+
+@op(
+    name="ArrowWeaveListObject-lookup",
+    input_type={
+        "self": ArrowWeaveListType(types.ObjectType(id=primitive_list.ID_TYPE)),
+        "id": primitive_list.ID_TYPE,
+    },
+    output_type=lambda input_types: primitive_list.getitem_output_type(
+        {"arr": input_types["self"], "id": input_types["id"]},
+        list_type=ArrowWeaveListType,
+    ),
+)
+def object_lookup(self, id):
+    return self._index(_lookup_position(self, id))
+
+
 @op(name="ArrowWeaveList-offset", output_type=lambda input_types: input_types["self"])
 def offset(self: ArrowWeaveList, offset: int):
     return ArrowWeaveList(
@@ -868,6 +915,246 @@ def sample(self, n):
     )
 
 
+_MS_PER_TIMESTAMP_UNIT = {"s": 1e3, "ms": 1.0, "us": 1e-3, "ns": 1e-6}
+
+
+def _fn_values_as_float(self: ArrowWeaveList, fn) -> np.ndarray:
+    return values_as_float(
+        _apply_fn_node_with_tag_pushdown(self, fn)._arrow_data_asarray_no_tags()
+    )
+
+
+def values_as_float(arr: pa.Array) -> np.ndarray:
+    """The values of a numeric or temporal array as floats, with nulls as nan."""
+    if pa.types.is_timestamp(arr.type):
+        # Timestamps are in milliseconds. Scale the raw values rather than
+        # casting to ms, which fails for finer units with sub-ms parts.
+        values = pc.cast(arr.view(pa.int64()), pa.float64())
+        return (
+            values.to_numpy(zero_copy_only=False)
+            * _MS_PER_TIMESTAMP_UNIT[arr.type.unit]
+        )
+    elif pa.types.is_temporal(arr.type):
+        arr = arr.view(pa.int32() if arr.type.bit_width == 32 else pa.int64())
+    return pc.cast(arr, pa.float64()).to_numpy(zero_copy_only=False)
+
+
+def _downsample_points(
+    self: ArrowWeaveList, x_fn, y_fn
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """x and y of the rows where both are set, in x order, and their positions."""
+    return _sorted_points(
+        _fn_values_as_float(self, x_fn), _fn_values_as_float(self, y_fn)
+    )
+
+
+def _sorted_points(
+    x: np.ndarray, y: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    positions = np.flatnonzero(~(np.isnan(x) | np.isnan(y)))
+    positions = positions[np.argsort(x[positions], kind="stable")]
+    return x[positions], y[positions], positions
+
+
+def _x_buckets(x: np.ndarray, buckets: int) -> np.ndarray:
+    """The bucket of each (sorted) x, for buckets of equal width in x."""
+    width = (x[-1] - x[0]) / buckets
+    if width == 0:
+        return np.zeros(len(x), dtype=np.int64)
+    return np.minimum(((x - x[0]) / width).astype(np.int64), buckets - 1)
+
+
+def _lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-triangle-three-buckets: picks n_out points that keep the shape
+    of the line through (x, y)."""
+    n = len(x)
+    if n_out >= n:
+        return np.arange(n)
+    if n_out < 3:
+        return np.array([0, n - 1][:n_out], dtype=np.int64)
+    # The first and last points are kept, the rest are split into n_out - 2
+    # buckets, and we pick the point in each bucket which makes the largest
+    # triangle with the previous pick and the mean of the next bucket.
+    edges = np.append(
+        (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype(int) + 1, n
+    )
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_x = x[end : edges[i + 2]].mean()
+        next_y = y[end : edges[i + 2]].mean()
+        areas = np.abs(
+            (x[a] - next_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (next_y - y[a])
+        )
+        selected[i + 1] = a = start + int(np.argmax(areas))
+    selected[-1] = n - 1
+    return selected
+
+
+def _min_max(x: np.ndarray, y: np.ndarray, buckets: int) -> np.ndarray:
+    """The points with the smallest and largest y in each of buckets of equal
+    width in (sorted) x, and the first and last points."""
+    if len(x) == 0:
+        return np.array([], dtype=np.int64)
+    bucket = _x_buckets(x, buckets)
+    by_bucket_and_y = np.lexsort((y, bucket))
+    sorted_buckets = bucket[by_bucket_and_y]
+    starts = np.flatnonzero(np.diff(sorted_buckets, prepend=-1))
+    ends = np.append(starts[1:], len(x)) - 1
+    return np.unique(
+        np.concatenate(
+            [by_bucket_and_y[starts], by_bucket_and_y[ends], [0, len(x) - 1]]
+        )
+    )
+
+
+DOWNSAMPLE_METHODS = {"lttb": _lttb, "minMax": _min_max}
+
+
+def downsample_positions(
+    x: np.ndarray, y: np.ndarray, method: str, n: int
+) -> np.ndarray:
+    """Positions of the points picked by a downsample method, in x order.
+
+    This is what the downsample ops select, given the x and y of every row.
+    """
+    x, y, positions = _sorted_points(x, y)
+    return positions[DOWNSAMPLE_METHODS[method](x, y, n)]
+
+
+def _downsample_x_fn_type(input_types):
+    return types.Function(
+        {"row": input_types["self"].object_type, "index": types.Int()},
+        types.optional(types.union(types.Number(), types.Timestamp())),
+    )
+
+
+def _downsample_y_fn_type(input_types):
+    return types.Function(
+        {"row": input_types["self"].object_type, "index": types.Int()},
+        types.optional(types.Number()),
+    )
+
+
+@op(
+    name="ArrowWeaveList-downsampleLTTB",
+    input_type={
+        "self": ArrowWeaveListType(),
+        "xFn": _downsample_x_fn_type,
+        "yFn": _downsample_y_fn_type,
+        "n": types.Int(),
+    },
+    output_type=lambda input_types: input_types["self"],
+)
+def downsample_lttb(self, xFn, yFn, n):
+    """Downsample to n rows with largest-triangle-three-buckets, in x order.
+
+    Rows where x or y is None are dropped.
+    """
+    if n < 0:
+        raise ValueError("n must be non-negative")
+    positions = downsample_positions(
+        _fn_values_as_float(self, xFn), _fn_values_as_float(self, yFn), "lttb", n
+    )
+    return ArrowWeaveList(
+        pc.take(self._arrow_data, pa.array(positions)),
+        self.object_type,
+        self._artifact,
+    )
+
+
+@op(
+    name="ArrowWeaveList-downsampleMinMax",
+    input_type={
+        "self": ArrowWeaveListType(),
+        "xFn": _downsample_x_fn_type,
+        "yFn": _downsample_y_fn_type,
+        "buckets": types.Int(),
+    },
+    output_type=lambda input_types: input_types["self"],
+)
+def downsample_min_max(self, xFn, yFn, buckets):
+    """Split x into buckets of equal width, and keep the rows with the
+    smallest and largest y in each, and the first and last rows, in x order.
+
+    Rows where x or y is None are dropped.
+    """
+    if buckets <= 0:
+        raise ValueError("buckets must be positive")
+    positions = downsample_positions(
+        _fn_values_as_float(self, xFn),
+        _fn_values_as_float(self, yFn),
+        "minMax",
+        buckets,
+    )
+    return ArrowWeaveList(
+        pc.take(self._arrow_data, pa.array(positions, pa.int64())),
+        self.object_type,
+        self._artifact,
+    )
+
+
+BUCKET_AGGREGATE_TYPE = types.TypedDict(
+    {
+        "xMin": types.Float(),
+        "xMax": types.Float(),
+        "count": types.Int(),
+        "min": types.Float(),
+        "max": types.Float(),
+        "mean": types.Float(),
+    }
+)
+
+
+@op(
+    name="ArrowWeaveList-bucketAggregate",
+    input_type={
+        "self": ArrowWeaveListType(),
+        "xFn": _downsample_x_fn_type,
+        "yFn": _downsample_y_fn_type,
+        "buckets": types.Int(),
+    },
+    output_type=ArrowWeaveListType(BUCKET_AGGREGATE_TYPE),
+)
+def bucket_aggregate(self, xFn, yFn, buckets):
+    """Split x into buckets of equal width, and aggregate y in each.
+
+    Returns a row per non-empty bucket, in x order, with the bucket's smallest
+    and largest x, and the count, min, max and mean of y. Rows where x or y is
+    None are dropped. Timestamps are returned as milliseconds since the epoch.
+    """
+    if buckets <= 0:
+        raise ValueError("buckets must be positive")
+    x, y, _ = _downsample_points(self, xFn, yFn)
+    if len(x) == 0:
+        starts = ends = np.array([], dtype=np.int64)
+        mins = maxs = sums = np.array([], dtype=np.float64)
+    else:
+        starts = np.flatnonzero(np.diff(_x_buckets(x, buckets), prepend=-1))
+        ends = np.append(starts[1:], len(x))
+        mins = np.minimum.reduceat(y, starts)
+        maxs = np.maximum.reduceat(y, starts)
+        sums = np.add.reduceat(y, starts)
+    counts = ends - starts
+    return ArrowWeaveList(
+        pa.StructArray.from_arrays(
+            [
+                pa.array(x[starts], pa.float64()),
+                pa.array(x[ends - 1], pa.float64()),
+                pa.array(counts, pa.int64()),
+                pa.array(mins, pa.float64()),
+                pa.array(maxs, pa.float64()),
+                pa.array(sums / np.maximum(counts, 1), pa.float64()),
+            ],
+            names=list(BUCKET_AGGREGATE_TYPE.property_types.keys()),
+        ),
+        BUCKET_AGGREGATE_TYPE,
+        self._artifact,
+    )
+
+
 def flatten_return_object_type(object_type):
     if types.is_list_like(object_type):
         object_type = object_type.object_type
@@ -0,0 +1,256 @@
+# Materialized run-history3 tables, cached on local disk.
+#
+# history3 reads every parquet file of a run, converts it and the live set
+# (history rows that haven't been written to parquet yet), concats and sorts
+# them on every request. While a run is logging, only the live set changes,
+# and only by appending rows. So we cache the flattened, sorted history table
+# as an Arrow IPC file per run and column set, along with the parquet files it
+# was built from and the live rows it includes. A repeat request with the same
+# parquet files only converts the live rows that were logged since.
+#
+# Live rows logged since the table was written are appended as delta files
+# next to it, rather than rewriting the whole table, until there are
+# MAX_DELTAS of them. The cache is opt-in (see
+# environment.history3_cache_enabled), and entries are evicted when they
+# haven't been used for a while or the cache gets too big.
+
+import dataclasses
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import typing
+import urllib.parse
+
+import pyarrow as pa
+
+from ... import environment
+from ... import filesystem
+from ... import weave_types as types
+from .. import wb_domain_types as wdt
+
+# Bump the version when history3 processing changes.
+HISTORY3_CACHE_VERSION = 1
+
+CACHE_DIR = "history3_cache"
+
+# The number of delta files a cached table can have before it is rewritten.
+MAX_DELTAS = 16
+
+_DELTA_SUFFIX_RE = re.compile(r"\.delta(\d+)$")
+
+
+@dataclasses.dataclass
+class CachedHistory:
+    # Flattened history rows, sorted by _step
+    table: pa.Table
+    # Identifies the parquet files the table was built from
+    parquet_key: str
+    # The number of live rows in the table, and the largest _step among them
+    live_count: int
+    live_step: typing.Optional[int]
+    # The largest _step in the table
+    max_step: typing.Optional[int]
+    # The number of delta files appended to the cached table
+    delta_count: int = 0
+
+
+def cache_path(
+    run: wdt.Run,
+    columns: typing.Optional[list[str]],
+    flattened_object_type: types.TypedDict,
+) -> typing.Optional[str]:
+    if not environment.history3_cache_enabled():
+        return None
+    project = run.gql["project"]
+    key = hashlib.sha256(
+        json.dumps(
+            [
+                sorted(columns) if columns is not None else None,
+                flattened_object_type.to_dict(),
+            ],
+            sort_keys=True,
+        ).encode()
+    ).hexdigest()
+    return f"{CACHE_DIR}/{project['entity']['name']}/{project['name']}/{run.gql['name']}/{key}.v{HISTORY3_CACHE_VERSION}.arrow"
+
+
+def parquet_key(parquet_urls: list[str]) -> str:
+    # Parquet urls are signed, so we ignore the query string.
+    paths = sorted(
+        urllib.parse.urlsplit(url)._replace(query="").geturl() for url in parquet_urls
+    )
+    return hashlib.sha256(json.dumps(paths).encode()).hexdigest()
+
+
+def live_steps(live_data: list[dict]) -> typing.Optional[list[int]]:
+    """The _step of each live row, or None if a row has no integer _step."""
+    steps = []
+    for row in live_data:
+        step = row.get("_step")
+        if not isinstance(step, int) or isinstance(step, bool):
+            return None
+        steps.append(step)
+    return steps
+
+
+def _delta_path(path: str, i: int) -> str:
+    return f"{path}.delta{i}"
+
+
+def _read_table(local_path: str) -> pa.Table:
+    return pa.ipc.open_file(pa.memory_map(local_path)).read_all()
+
+
+def _read_metadata(table: pa.Table) -> dict:
+    return json.loads(table.schema.metadata[b"weave_history3_cache"])
+
+
+def _with_metadata(table: pa.Table, cached: CachedHistory) -> pa.Table:
+    metadata = {
+        "parquet_key": cached.parquet_key,
+        "live_count": cached.live_count,
+        "live_step": cached.live_step,
+        "max_step": cached.max_step,
+    }
+    return table.replace_schema_metadata({"weave_history3_cache": json.dumps(metadata)})
+
+
+def _write_table(path: str, table: pa.Table) -> None:
+    fs = filesystem.get_filesystem()
+    with fs.open_write(path) as f:
+        with pa.ipc.new_file(f, table.schema) as writer:
+            writer.write_table(table)
+
+
+def read(path: str, parquet_key: str) -> typing.Optional[CachedHistory]:
+    fs = filesystem.get_filesystem()
+    try:
+        if (
+            time.time() - fs.stat(path).st_mtime
+            > environment.history3_cache_max_age_sec()
+        ):
+            return None
+        table = _read_table(fs.path(path))
+    except FileNotFoundError:
+        return None
+    except pa.ArrowInvalid:
+        logging.warning("Ignoring invalid history3 cache file %s", path)
+        return None
+    metadata = _read_metadata(table)
+    if metadata["parquet_key"] != parquet_key:
+        return None
+    tables = [table.replace_schema_metadata(None)]
+    # Each delta holds the rows appended to the table, and the cache metadata
+    # as of when it was written.
+    while True:
+        delta_path = _delta_path(path, len(tables))
+        try:
+            delta = _read_table(fs.path(delta_path))
+        except FileNotFoundError:
+            break
+        except pa.ArrowInvalid:
+            logging.warning("Ignoring invalid history3 cache file %s", delta_path)
+            break
+        delta_metadata = _read_metadata(delta)
+        delta = delta.replace_schema_metadata(None)
+        if not delta.schema.equals(tables[0].schema):
+            break
+        metadata = delta_metadata
+        tables.append(delta)
+    # Mark the entry as used, for eviction
+    fs.touch(path)
+    return CachedHistory(
+        pa.concat_tables(tables),
+        metadata["parquet_key"],
+        metadata["live_count"],
+        metadata["live_step"],
+        metadata["max_step"],
+        len(tables) - 1,
+    )
+
+
+def write(path: str, cached: CachedHistory) -> None:
+    """Write the whole cached table, replacing any deltas."""
+    _remove_deltas(path)
+    _write_table(path, _with_metadata(cached.table, cached))
+    evict()
+
+
+def append(path: str, cached: CachedHistory, rows: pa.Table) -> None:
+    """Append rows to the table cached at path.
+
+    cached is the cached history with the rows appended. The rows must sort
+    after the rows already cached, and have the same schema.
+    """
+    _write_table(_delta_path(path, cached.delta_count), _with_metadata(rows, cached))
+
+
+def _removal_order(local_path: str) -> int:
+    # Files of an entry are removed last delta first, and the table last, so
+    # removing them never leaves a gap in a table's deltas, which would let a
+    # later delta be read after a rewritten one.
+    match = _DELTA_SUFFIX_RE.search(local_path)
+    if match is None:
+        return 0
+    return -int(match.group(1))
+
+
+def _remove_deltas(path: str) -> None:
+    local_path = filesystem.get_filesystem().path(path)
+    dirname, basename = os.path.split(local_path)
+    try:
+        names = os.listdir(dirname)
+    except FileNotFoundError:
+        return
+    delta_paths = [
+        os.path.join(dirname, name)
+        for name in names
+        if name.startswith(basename)
+        and _DELTA_SUFFIX_RE.fullmatch(name[len(basename) :])
+    ]
+    for delta_path in sorted(delta_paths, key=_removal_order):
+        try:
+            os.remove(delta_path)
+        except FileNotFoundError:
+            pass
+
+
+def evict() -> None:
+    """Remove cache entries that haven't been used for longer than the max
+    age, and then the least recently used entries, until the cache is no
+    bigger than the max size."""
+    root = filesystem.get_filesystem().path(CACHE_DIR)
+    now = time.time()
+    max_age = environment.history3_cache_max_age_sec()
+    # Cached tables and their deltas are evicted together.
+    entries: dict[str, list[typing.Tuple[str, os.stat_result]]] = {}
+    for dirpath, _, names in os.walk(root):
+        for name in names:
+            local_path = os.path.join(dirpath, name)
+            try:
+                stat = os.stat(local_path)
+            except FileNotFoundError:
+                continue
+            if ".tmp-" in name and now - stat.st_mtime <= max_age:
+                # Still being written
+                continue
+            entry = _DELTA_SUFFIX_RE.sub("", local_path)
+            entries.setdefault(entry, []).append((local_path, stat))
+
+    def last_used(files: list[typing.Tuple[str, os.stat_result]]) -> float:
+        return max(stat.st_mtime for _, stat in files)
+
+    total_bytes = sum(stat.st_size for files in entries.values() for _, stat in files)
+    max_bytes = environment.history3_cache_max_bytes()
+    for entry, files in sorted(entries.items(), key=lambda e: last_used(e[1])):
+        if now - last_used(files) <= max_age and total_bytes <= max_bytes:
+            break
+        for local_path, stat in sorted(files, key=lambda f: _removal_order(f[0])):
+            try:
+                os.remove(local_path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= stat.st_size
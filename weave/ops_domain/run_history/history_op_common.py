@@ -1,3 +1,4 @@
+import dataclasses
 import json
 import typing
 
@@ -9,6 +10,8 @@ from ... import weave_types as types
 from .. import wb_domain_types as wdt
 from ...ops_primitives import make_list
 from ...ops_arrow.list_ops import concat
+from ...ops_arrow.list_ops import downsample_positions
+from ...ops_arrow.list_ops import values_as_float
 from ...ops_arrow import ArrowWeaveList
 from ... import util
 from ... import errors
@@ -332,11 +335,156 @@ def history_keys(run: wdt.Run) -> list[str]:
     return list(object_type.property_types.keys())
 
 
+# (min _step, max _step, row count) of a parquet row group, or of a live row
+StepStats = typing.Tuple[float, float, int]
+
+
+@dataclasses.dataclass(frozen=True)
+class StepWindow:
+    """The history rows with min_step <= _step <= max_step, in _step order.
+
+    If row_limit is set, only the first row_limit of those rows. If sample_method
+    is set, only the rows that the ArrowWeaveList downsample op of that method
+    picks, with x row["_step"], y row[sample_y] and n sample_n.
+    """
+
+    min_step: typing.Optional[float] = None
+    max_step: typing.Optional[float] = None
+    row_limit: typing.Optional[int] = None
+    sample_method: typing.Optional[str] = None
+    sample_y: typing.Optional[str] = None
+    sample_n: typing.Optional[int] = None
+
+    def is_bounded(self) -> bool:
+        return (
+            self.min_step is not None
+            or self.max_step is not None
+            or self.row_limit is not None
+        )
+
+    def overlaps(self, lo: float, hi: float) -> bool:
+        return (self.min_step is None or hi >= self.min_step) and (
+            self.max_step is None or lo <= self.max_step
+        )
+
+    def contains(self, lo: float, hi: float) -> bool:
+        return (self.min_step is None or lo >= self.min_step) and (
+            self.max_step is None or hi <= self.max_step
+        )
+
+    def bounded_by(self, step_stats: list[StepStats]) -> "StepWindow":
+        """Turn row_limit into a max_step, given the steps of all rows.
+
+        Sets max_step to the smallest step such that groups entirely within
+        the window, and entirely below max_step, hold row_limit rows.
+        """
+        if self.row_limit is None:
+            return self
+        total = 0
+        for lo, hi, count in sorted(
+            (s for s in step_stats if self.contains(s[0], s[1])),
+            key=lambda s: s[1],
+        ):
+            total += count
+            if total >= self.row_limit:
+                return dataclasses.replace(
+                    self,
+                    max_step=hi if self.max_step is None else min(hi, self.max_step),
+                )
+        return self
+
+    def filter_table(self, table: pa.Table) -> pa.Table:
+        if (
+            self.min_step is None and self.max_step is None
+        ) or "_step" not in table.column_names:
+            return table
+        steps = table["_step"]
+        mask = None
+        if self.min_step is not None:
+            mask = pa.compute.greater_equal(steps, self.min_step)
+        if self.max_step is not None:
+            upper = pa.compute.less_equal(steps, self.max_step)
+            mask = upper if mask is None else pa.compute.and_(mask, upper)
+        return table.filter(pa.compute.fill_null(mask, False))
+
+    def filter_live_data(self, live_data: list[dict]) -> list[dict]:
+        if self.min_step is None and self.max_step is None:
+            return live_data
+        return [
+            row
+            for row in live_data
+            if _is_step(row.get("_step")) and self.overlaps(row["_step"], row["_step"])
+        ]
+
+    def apply(self, sorted_table: pa.Table) -> pa.Table:
+        """Select the window from a table sorted by _step."""
+        table = self.filter_table(sorted_table)
+        if self.row_limit is not None:
+            table = table.slice(0, self.row_limit)
+        if self.sample_method is not None:
+            table = self._sample(table)
+        return table
+
+    def _sample(self, table: pa.Table) -> pa.Table:
+        if (
+            self.sample_n is None
+            or "_step" not in table.column_names
+            or self.sample_y not in table.column_names
+        ):
+            return table
+        y = table[self.sample_y].combine_chunks()
+        if not (pa.types.is_integer(y.type) or pa.types.is_floating(y.type)):
+            # The downsample op will pick the rows from the full table.
+            return table
+        positions = downsample_positions(
+            values_as_float(table["_step"].combine_chunks()),
+            values_as_float(y),
+            self.sample_method,
+            self.sample_n,
+        )
+        return table.take(pa.array(positions, pa.int64()))
+
+
+def _is_step(step: typing.Any) -> bool:
+    return isinstance(step, (int, float)) and not isinstance(step, bool)
+
+
+def live_data_step_stats(live_data: list[dict]) -> list[StepStats]:
+    return [
+        (row["_step"], row["_step"], 1)
+        for row in live_data
+        if _is_step(row.get("_step"))
+    ]
+
+
+def parquet_step_stats(meta: pq.FileMetaData) -> list[typing.Optional[StepStats]]:
+    """_step statistics of each row group, or None where they are missing."""
+    names = meta.schema.to_arrow_schema().names
+    if "_step" not in names:
+        return [None] * meta.num_row_groups
+    step_col = names.index("_step")
+    stats: list[typing.Optional[StepStats]] = []
+    for i in range(meta.num_row_groups):
+        row_group = meta.row_group(i)
+        col_stats = row_group.column(step_col).statistics
+        if (
+            col_stats is None
+            or not col_stats.has_min_max
+            or not _is_step(col_stats.min)
+            or not _is_step(col_stats.max)
+        ):
+            stats.append(None)
+        else:
+            stats.append((col_stats.min, col_stats.max, row_group.num_rows))
+    return stats
+
+
 def awl_from_local_parquet_path(
     path: str,
     object_type: typing.Optional[types.TypedDict],
     columns: list[str] = [],
     artifact: typing.Optional[artifact_base.Artifact] = None,
+    step_window: typing.Optional[StepWindow] = None,
 ) -> ArrowWeaveList:
     with tracer.trace("pq.read_metadata") as span:
         span.set_tag("path", path)
@@ -345,7 +493,21 @@ def awl_from_local_parquet_path(
     columns_to_read = [c for c in columns if c in file_schema.to_arrow_schema().names]
     with tracer.trace("pq.read_table") as span:
         span.set_tag("path", path)
-        table = pq.read_table(path, columns=columns_to_read)
+        if step_window is None:
+            table = pq.read_table(path, columns=columns_to_read)
+        else:
+            # Only read the row groups that may have steps in the window.
+            row_groups = [
+                i
+                for i, stats in enumerate(parquet_step_stats(meta))
+                if stats is None or step_window.overlaps(stats[0], stats[1])
+            ]
+            span.set_tag("row_groups", len(row_groups))
+            table = step_window.filter_table(
+                pq.ParquetFile(path, metadata=meta).read_row_groups(
+                    row_groups, columns=columns_to_read
+                )
+            )
 
     # convert table to ArrowWeaveList
     with tracer.trace("make_awl") as span:
@@ -363,7 +525,7 @@ def process_history_awl_tables(tables: list[ArrowWeaveList]):
         # empty table
         return None
 
-    return sort_history_pa_table(parquet_history)
+    return sort_history_pa_table(parquet_history, [len(t) for t in tables])
 
 
 def concat_awls(awls: list[ArrowWeaveList]):
@@ -378,7 +540,7 @@ def awl_to_pa_table(awl: ArrowWeaveList):
     return pa.Table.from_batches([rb])
 
 
-def sort_history_pa_table(table: pa.Table):
+def _sort_by_step(table: pa.Table) -> pa.Table:
     with tracer.trace("pq.sort"):
         table_sorted_indices = pa.compute.bottom_k_unstable(
             table, sort_keys=["_step"], k=len(table)
@@ -388,12 +550,93 @@ def sort_history_pa_table(table: pa.Table):
         return table.take(table_sorted_indices)
 
 
+def _is_sorted(steps: pa.ChunkedArray) -> bool:
+    if len(steps) < 2:
+        return True
+    return pa.compute.all(
+        pa.compute.greater_equal(steps.slice(1), steps.slice(0, len(steps) - 1))
+    ).as_py()
+
+
+@dataclasses.dataclass
+class _Segment:
+    offset: int
+    length: int
+    min_step: typing.Any
+    max_step: typing.Any
+    is_sorted: bool
+
+
+def sort_history_pa_table(
+    table: pa.Table, segment_lengths: typing.Optional[list[int]] = None
+):
+    """Sort a history table by _step.
+
+    The table may be a concatenation of segments (parquet files and the live
+    set), given by segment_lengths. These are usually each sorted, and cover
+    disjoint step ranges. Sorted segments that don't overlap another segment
+    are stitched together in step order, and only overlapping segments are
+    sorted.
+    """
+    if segment_lengths is None:
+        segment_lengths = [len(table)]
+    steps = table["_step"]
+    if steps.null_count > 0 or sum(segment_lengths) != len(table):
+        return _sort_by_step(table)
+
+    with tracer.trace("pq.segments"):
+        segments = []
+        offset = 0
+        for length in segment_lengths:
+            if length > 0:
+                segment_steps = steps.slice(offset, length)
+                min_max = pa.compute.min_max(segment_steps).as_py()
+                segments.append(
+                    _Segment(
+                        offset,
+                        length,
+                        min_max["min"],
+                        min_max["max"],
+                        _is_sorted(segment_steps),
+                    )
+                )
+            offset += length
+
+    # Group segments with overlapping step ranges
+    segments.sort(key=lambda s: s.min_step)
+    clusters: list[list[_Segment]] = []
+    for segment in segments:
+        if clusters and segment.min_step < max(s.max_step for s in clusters[-1]):
+            clusters[-1].append(segment)
+        else:
+            clusters.append([segment])
+
+    if all(len(c) == 1 and c[0].is_sorted for c in clusters) and all(
+        a[0].offset < b[0].offset for a, b in zip(clusters, clusters[1:])
+    ):
+        # Already in order
+        return table
+
+    pieces = []
+    for cluster in clusters:
+        if len(cluster) == 1 and cluster[0].is_sorted:
+            pieces.append(table.slice(cluster[0].offset, cluster[0].length))
+        else:
+            pieces.append(
+                _sort_by_step(
+                    pa.concat_tables(table.slice(s.offset, s.length) for s in cluster)
+                )
+            )
+    with tracer.trace("pq.stitch"):
+        return pa.concat_tables(pieces)
+
+
 def read_history_parquet(run: wdt.Run, columns=None):
     io = io_service.get_sync_client()
     object_type = refine_history_type(run, columns=columns)
     tables = []
-    for url in run.gql["sampledParquetHistory"]["parquetUrls"]:
-        local_path = io.ensure_file_downloaded(url)
+    urls = run.gql["sampledParquetHistory"]["parquetUrls"]
+    for local_path in io.ensure_files_downloaded(urls):
         if local_path is not None:
             path = io.fs.path(local_path)
             awl = awl_from_local_parquet_path(path, object_type, columns=columns)
@@ -401,6 +644,25 @@ def read_history_parquet(run: wdt.Run, columns=None):
     return process_history_awl_tables(tables)
 
 
+def prefetch_history_parquet(runs: typing.Sequence[typing.Any]) -> None:
+    """Download the parquet history files of many runs concurrently.
+
+    Runs without sampledParquetHistory in their gql are skipped.
+    """
+    urls = []
+    for run in runs:
+        if not isinstance(run, wdt.Run):
+            continue
+        parquet_history = run.gql.get("sampledParquetHistory")
+        if isinstance(parquet_history, dict):
+            urls.extend(parquet_history.get("parquetUrls") or [])
+    if not urls:
+        return
+    with tracer.trace("prefetch_history_parquet") as span:
+        span.set_tag("num_files", len(urls))
+        io_service.get_sync_client().ensure_files_downloaded(urls)
+
+
 def mock_history_rows(
     run: wdt.Run, use_arrow: bool = True
 ) -> typing.Union[ArrowWeaveList, list]:
@@ -3,6 +3,7 @@ import json
 import logging
 import typing
 import pyarrow as pa
+from pyarrow import parquet as pq
 
 
 from .context import get_error_on_non_vectorized_history_transform
@@ -18,7 +19,9 @@ from ... import engine_trace
 from ... import errors
 from ...wandb_interface import wandb_stream_table
 from . import history_op_common
+from . import history_cache
 from ... import artifact_base, io_service
+from ... import parallelism
 from .. import wbmedia
 from ...ops_arrow.list_ import (
     PathItemType,
@@ -73,6 +76,54 @@ def history3_with_columns(run: wdt.Run, history_cols: list[str]):
     )
 
 
+@op(
+    render_info={"type": "function"},
+    plugins=wb_gql_op_plugin(lambda inputs, inner: "historyKeys"),
+    hidden=True,
+)
+def refine_history3_with_columns_step_window_type(
+    run: wdt.Run,
+    history_cols: list[str],
+    min_step: typing.Optional[float],
+    max_step: typing.Optional[float],
+    row_limit: typing.Optional[int],
+    sample_method: typing.Optional[str],
+    sample_y: typing.Optional[str],
+    sample_n: typing.Optional[int],
+) -> types.Type:
+    return refine_history3_with_columns_type.resolve_fn(run, history_cols)
+
+
+# history3_with_columns, limited to a _step window. The compiler pushes _step
+# filters and limits down into this op, so we can skip reading parquet row
+# groups outside of the window. It also pushes down downsampling over _step,
+# so we only unflatten and return the sampled rows.
+@op(
+    name="run-history3_with_columns_step_window",
+    refine_output_type=refine_history3_with_columns_step_window_type,
+    plugins=wb_gql_op_plugin(history_op_common.make_run_history_gql_field),
+    output_type=ArrowWeaveListType(types.TypedDict({})),
+    hidden=True,
+)
+def history3_with_columns_step_window(
+    run: wdt.Run,
+    history_cols: list[str],
+    min_step: typing.Optional[float],
+    max_step: typing.Optional[float],
+    row_limit: typing.Optional[int],
+    sample_method: typing.Optional[str],
+    sample_y: typing.Optional[str],
+    sample_n: typing.Optional[int],
+):
+    return _get_history3(
+        run,
+        history_op_common.get_full_columns_prefixed(run, history_cols),
+        history_op_common.StepWindow(
+            min_step, max_step, row_limit, sample_method, sample_y, sample_n
+        ),
+    )
+
+
 @op(
     name="run-history3",
     refine_output_type=refine_history3_type,
@@ -93,7 +144,11 @@ class PathTree:
     data: typing.Optional[typing.Any] = None
 
 
-def _get_history3(run: wdt.Run, columns=None):
+def _get_history3(
+    run: wdt.Run,
+    columns=None,
+    step_window: typing.Optional[history_op_common.StepWindow] = None,
+):
     # 1. Get the flattened Weave-Type given HistoryKeys
     # 2. Read in the live set
     # 3. Raw-load each parquet file
@@ -121,9 +176,117 @@ def _get_history3(run: wdt.Run, columns=None):
     # 2. Read in the live set
     raw_live_data = _get_live_data_from_run(run, columns=columns)
 
+    run_path = wb_util.RunPath(
+        run.gql["project"]["entity"]["name"],
+        run.gql["project"]["name"],
+        run.gql["name"],
+    )
+
+    # Try to only process the live rows logged since the cached history. We
+    # don't cache columns processed in memory, since they may refer to the
+    # artifact, or windowed reads.
+    cache_path = None
+    steps = history_cache.live_steps(raw_live_data)
+    if (
+        (step_window is None or not step_window.is_bounded())
+        and steps is not None
+        and not any(
+            _column_type_requires_in_memory_transformation(t)
+            for t in flattened_object_type.property_types.values()
+        )
+    ):
+        cache_path = history_cache.cache_path(run, columns, flattened_object_type)
+    parquet_key = history_cache.parquet_key(
+        run.gql["sampledParquetHistory"]["parquetUrls"]
+    )
+    sorted_table = None
+    if cache_path is not None:
+        with tracer.trace("history3:read_cache"):
+            cached = history_cache.read(cache_path, parquet_key)
+        if cached is not None:
+            sorted_table = _extend_cached_history(
+                cache_path,
+                cached,
+                raw_live_data,
+                typing.cast(list[int], steps),
+                flattened_object_type,
+                run_path,
+                artifact,
+            )
+
+    if sorted_table is None:
+        sorted_table = _build_history_table(
+            run,
+            columns,
+            flattened_object_type,
+            raw_live_data,
+            run_path,
+            artifact,
+            step_window,
+        )
+        if sorted_table is None:
+            return convert.to_arrow([], types.List(final_type), artifact=artifact)
+        if cache_path is not None:
+            with tracer.trace("history3:write_cache"):
+                history_cache.write(
+                    cache_path,
+                    history_cache.CachedHistory(
+                        sorted_table,
+                        parquet_key,
+                        len(raw_live_data),
+                        max(typing.cast(list[int], steps), default=None),
+                        _max_step(sorted_table),
+                    ),
+                )
+
+    if step_window is not None:
+        sorted_table = step_window.apply(sorted_table)
+
+    # 6. Finally, unflatten the columns
+    final_array = _unflatten_pa_table(sorted_table)
+
+    # 7. Optionally: verify the AWL
+    reason = weave_arrow_type_check(final_type, final_array)
+
+    if reason != None:
+        raise errors.WeaveWBHistoryTranslationError(
+            f"Failed to effectively convert column of Gorilla Parquet History to expected history type: {reason}"
+        )
+    return ArrowWeaveList(
+        final_array,
+        final_type,
+        artifact=artifact,
+    )
+
+
+def _build_history_table(
+    run: wdt.Run,
+    columns: typing.Optional[list[str]],
+    flattened_object_type: types.TypedDict,
+    raw_live_data: list[dict],
+    run_path: wb_util.RunPath,
+    artifact: artifact_mem.MemArtifact,
+    step_window: typing.Optional[history_op_common.StepWindow] = None,
+) -> typing.Optional[pa.Table]:
+    parquet_paths = _download_parquet_files(run)
+
+    if step_window is not None:
+        if step_window.row_limit is not None:
+            step_stats = history_op_common.live_data_step_stats(raw_live_data)
+            for path in parquet_paths:
+                step_stats.extend(
+                    stats
+                    for stats in history_op_common.parquet_step_stats(
+                        pq.read_metadata(path)
+                    )
+                    if stats is not None
+                )
+            step_window = step_window.bounded_by(step_stats)
+        raw_live_data = step_window.filter_live_data(raw_live_data)
+
     # 3.a: Raw-load each parquet file
     raw_history_awl_tables = _read_raw_history_awl_tables(
-        run, columns=columns, artifact=artifact
+        parquet_paths, columns=columns, artifact=artifact, step_window=step_window
     )
 
     # 3.b: Collapse unions
@@ -136,11 +299,6 @@ def _get_history3(run: wdt.Run, columns=None):
         history_op_common.awl_to_pa_table(awl) for awl in union_collapsed_awl_tables
     ]
 
-    run_path = wb_util.RunPath(
-        run.gql["project"]["entity"]["name"],
-        run.gql["project"]["name"],
-        run.gql["name"],
-    )
     (
         live_columns,
         live_columns_already_mapped,
@@ -158,40 +316,122 @@ def _get_history3(run: wdt.Run, columns=None):
     )
 
     # 5.a Now we concat the converted liveset and parquet files
-    concatted_awl = history_op_common.concat_awls(
-        [
-            live_data_awl,
-            *{
-                ArrowWeaveList(
-                    table, object_type=flattened_object_type, artifact=artifact
-                )
-                for table in processed_history_pa_tables
-            },
-        ]
-    )
+    awls = [
+        live_data_awl,
+        *(
+            ArrowWeaveList(table, object_type=flattened_object_type, artifact=artifact)
+            for table in processed_history_pa_tables
+        ),
+    ]
+    concatted_awl = history_op_common.concat_awls(awls)
 
     if len(concatted_awl) == 0:
-        return convert.to_arrow([], types.List(final_type), artifact=artifact)
+        return None
 
-    sorted_table = history_op_common.sort_history_pa_table(
-        history_op_common.awl_to_pa_table(concatted_awl)
+    return history_op_common.sort_history_pa_table(
+        history_op_common.awl_to_pa_table(concatted_awl),
+        [len(awl) for awl in awls],
     )
 
-    # 6. Finally, unflatten the columns
-    final_array = _unflatten_pa_table(sorted_table)
 
-    # 7. Optionally: verify the AWL
-    reason = weave_arrow_type_check(final_type, final_array)
+def _extend_cached_history(
+    cache_path: str,
+    cached: history_cache.CachedHistory,
+    raw_live_data: list[dict],
+    steps: list[int],
+    flattened_object_type: types.TypedDict,
+    run_path: wb_util.RunPath,
+    artifact: artifact_mem.MemArtifact,
+) -> typing.Optional[pa.Table]:
+    # Returns the cached history with the live rows logged since it was cached,
+    # or None if the live set changed in some other way.
+    new_rows_and_steps = [
+        (row, step)
+        for row, step in zip(raw_live_data, steps)
+        if cached.live_step is None or step > cached.live_step
+    ]
+    new_rows = [row for row, _ in new_rows_and_steps]
+    if len(raw_live_data) - len(new_rows) != cached.live_count:
+        return None
+    if len(new_rows) == 0:
+        return cached.table
+
+    live_columns, live_columns_already_mapped, _ = _process_all_columns(
+        flattened_object_type, new_rows, [], run_path, artifact
+    )
+    new_rows_table = history_op_common.sort_history_pa_table(
+        history_op_common.awl_to_pa_table(
+            _construct_live_data_awl(
+                live_columns,
+                live_columns_already_mapped,
+                flattened_object_type,
+                len(new_rows),
+                artifact,
+            )
+        )
+    )
+    new_max_step = _max_step(new_rows_table)
+    # New live rows are usually logged after everything in the cached table,
+    # with the same arrow types. Then they're appended to the cache as a
+    # delta, instead of rewriting the whole table.
+    if (
+        cached.delta_count < history_cache.MAX_DELTAS
+        and cached.max_step is not None
+        and min(step for _, step in new_rows_and_steps) > cached.max_step
+        and new_rows_table.schema.equals(cached.table.schema)
+    ):
+        concatted_table = pa.concat_tables([cached.table, new_rows_table])
+        with tracer.trace("history3:append_cache"):
+            history_cache.append(
+                cache_path,
+                history_cache.CachedHistory(
+                    concatted_table,
+                    cached.parquet_key,
+                    len(raw_live_data),
+                    max(steps),
+                    new_max_step,
+                    cached.delta_count + 1,
+                ),
+                new_rows_table,
+            )
+        return concatted_table
 
-    if reason != None:
-        raise errors.WeaveWBHistoryTranslationError(
-            f"Failed to effectively convert column of Gorilla Parquet History to expected history type: {reason}"
+    concatted_table = history_op_common.awl_to_pa_table(
+        history_op_common.concat_awls(
+            [
+                ArrowWeaveList(
+                    cached.table, object_type=flattened_object_type, artifact=artifact
+                ),
+                ArrowWeaveList(
+                    new_rows_table,
+                    object_type=flattened_object_type,
+                    artifact=artifact,
+                ),
+            ]
         )
-    return ArrowWeaveList(
-        final_array,
-        final_type,
-        artifact=artifact,
     )
+    concatted_table = history_op_common.sort_history_pa_table(
+        concatted_table, [len(cached.table), len(new_rows_table)]
+    )
+
+    with tracer.trace("history3:write_cache"):
+        history_cache.write(
+            cache_path,
+            history_cache.CachedHistory(
+                concatted_table,
+                cached.parquet_key,
+                len(raw_live_data),
+                max(steps),
+                _max_step(concatted_table),
+            ),
+        )
+    return concatted_table
+
+
+def _max_step(table: pa.Table) -> typing.Optional[int]:
+    if "_step" not in table.column_names:
+        return None
+    return pa.compute.max(table["_step"]).as_py()
 
 
 def _construct_live_data_awl(
@@ -545,24 +785,32 @@ def _process_history_column_in_memory(
     return pa.chunked_array([awl._arrow_data])
 
 
+def _download_parquet_files(run: wdt.Run) -> list[str]:
+    io = io_service.get_sync_client()
+    urls = run.gql["sampledParquetHistory"]["parquetUrls"]
+    return [
+        io.fs.path(local_path)
+        for local_path in io.ensure_files_downloaded(urls)
+        if local_path is not None
+    ]
+
+
 # Copy from common - need to merge back
 def _read_raw_history_awl_tables(
-    run: wdt.Run,
+    parquet_paths: list[str],
     columns=None,
     artifact: typing.Optional[artifact_base.Artifact] = None,
+    step_window: typing.Optional[history_op_common.StepWindow] = None,
 ) -> list[ArrowWeaveList]:
-    io = io_service.get_sync_client()
-    tables = []
-    for url in run.gql["sampledParquetHistory"]["parquetUrls"]:
-        local_path = io.ensure_file_downloaded(url)
-        if local_path is not None:
-            path = io.fs.path(local_path)
-            awl = history_op_common.awl_from_local_parquet_path(
-                path, None, columns=columns, artifact=artifact
-            )
-            awl.map_column(_parse_bytes_mapper)
-            tables.append(awl)
-    return tables
+    def read_one(path: str) -> ArrowWeaveList:
+        awl = history_op_common.awl_from_local_parquet_path(
+            path, None, columns=columns, artifact=artifact, step_window=step_window
+        )
+        awl.map_column(_parse_bytes_mapper)
+        return awl
+
+    # pyarrow releases the GIL while decoding, so read files in parallel.
+    return list(parallelism.do_in_parallel(read_one, parquet_paths))
 
     # return history_op_common.process_history_awl_tables(tables)
 
@@ -3,7 +3,13 @@ import json
 import datetime
 import logging
 import typing
-import asyncio
+
+import pyarrow as pa
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 
 from ..api import op, weave_class
@@ -17,7 +23,10 @@ from .. import weave_internal
 from .. import engine_trace
 from . import wbmedia
 from .. import timestamp as weave_timestamp
+from .. import environment
+from .. import filesystem
 from .. import io_service
+from .. import parallelism
 from .. import util
 from ..ops_domain import trace_tree
 
@@ -293,8 +302,11 @@ def _in_place_join_in_linked_tables(
                             column_type["params"]["col_name"], row[column_name]
                         )
 
-            # update the object type
-            object_type.property_types[column_name] = peer_object_type
+            # update the object type. Types may be interned and shared, so
+            # make a new one rather than modifying it in place.
+            object_type = types.TypedDict(
+                {**object_type.property_types, column_name: peer_object_type}
+            )
 
     return rows, object_type
 
@@ -619,28 +631,100 @@ class _TableLikeAWLFromFileResult:
     data: dict
 
 
+def _loads_table_json(raw: bytes) -> typing.Any:
+    if orjson is not None:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # orjson rejects some things W&B writes to tables, like NaN and
+            # big ints. Fall back to the standard library.
+            pass
+    return json.loads(raw)
+
+
 def _get_table_data_from_file(file: artifact_fs.FilesystemArtifactFile) -> dict:
     tracer = engine_trace.tracer()
     if file is None or isinstance(file, artifact_fs.FilesystemArtifactDir):
         raise errors.WeaveInternalError("File is None or a directory")
-    with file.open() as f:
+    with file.open("rb") as f:
         with tracer.trace("get_table:jsonload"):
-            data = json.load(f)
+            data = _loads_table_json(f.read())
     return data
 
 
+# Decoded tables are cached as Arrow IPC files next to the downloaded table
+# file, so repeat loads memory map the result instead of decoding the json
+# again. Bump the version when decoding changes.
+TABLE_ARROW_CACHE_VERSION = 1
+
+
+def _table_arrow_cache_path(
+    file: artifact_fs.FilesystemArtifactFile,
+) -> typing.Optional[str]:
+    if not environment.table_arrow_cache_enabled():
+        return None
+    artifact = file.artifact
+    if not isinstance(artifact, artifact_wandb.WandbArtifact):
+        return None
+    uri = artifact._read_artifact_uri
+    if uri is None or uri.version is None:
+        return None
+    return f"wandb_file_manager/{uri.entity_name}/{uri.project_name}/{uri.name}/table-arrow-{uri.version}/{file.path}.v{TABLE_ARROW_CACHE_VERSION}.arrow"
+
+
+def _read_table_arrow_cache(
+    path: str, file: artifact_fs.FilesystemArtifactFile
+) -> typing.Optional[ops_arrow.ArrowWeaveList]:
+    fs = filesystem.get_filesystem()
+    try:
+        table = pa.ipc.open_file(pa.memory_map(fs.path(path))).read_all()
+    except FileNotFoundError:
+        return None
+    except pa.ArrowInvalid:
+        logging.warning("Ignoring invalid table arrow cache file %s", path)
+        return None
+    object_type = types.TypeRegistry.type_from_dict(
+        json.loads(table.schema.metadata[b"weave_type"])
+    )
+    arr = table["arr"]
+    return ops_arrow.ArrowWeaveList(
+        arr.chunk(0) if arr.num_chunks == 1 else arr, object_type, file.artifact
+    )
+
+
+def _write_table_arrow_cache(path: str, awl: ops_arrow.ArrowWeaveList) -> None:
+    table = pa.table({"arr": awl._arrow_data}).replace_schema_metadata(
+        {"weave_type": json.dumps(awl.object_type.to_dict())}
+    )
+    fs = filesystem.get_filesystem()
+    with fs.open_write(path) as f:
+        with pa.ipc.new_file(f, table.schema) as writer:
+            writer.write_table(table)
+
+
 def _get_table_like_awl_from_file(
     file: typing.Union[
         artifact_fs.FilesystemArtifactFile, artifact_fs.FilesystemArtifactDir, None
     ],
     num_parts: int = 1,
 ) -> _TableLikeAWLFromFileResult:
+    tracer = engine_trace.tracer()
     if file is None or isinstance(file, artifact_fs.FilesystemArtifactDir):
         raise errors.WeaveInternalError("File is None or a directory")
+    cache_path = _table_arrow_cache_path(file)
+    is_partitioned = file.path.endswith(".partitioned-table.json")
+    if cache_path is not None:
+        with tracer.trace("get_table:read_arrow_cache"):
+            awl = _read_table_arrow_cache(cache_path, file)
+        if awl is not None:
+            # Partitioned table data is small and used by PartitionedTable,
+            # other callers only need the awl.
+            data = _get_table_data_from_file(file) if is_partitioned else {}
+            return _TableLikeAWLFromFileResult(awl, data)
     data = _get_table_data_from_file(file)
     if file.path.endswith(".joined-table.json"):
         awl = _get_joined_table_awl_from_file(data, file)
-    elif file.path.endswith(".partitioned-table.json"):
+    elif is_partitioned:
         awl = _get_partitioned_table_awl_from_file(data, file)
     elif file.path.endswith(".table.json"):
         awl = _get_table_awl_from_file(data, file, num_parts)
@@ -648,6 +732,14 @@ def _get_table_like_awl_from_file(
         raise errors.WeaveInternalError(
             f"Unknown table file format for path: {file.path}"
         )
+    if cache_path is not None:
+        with tracer.trace("get_table:write_arrow_cache"):
+            try:
+                _write_table_arrow_cache(cache_path, awl)
+            except (pa.ArrowException, OSError, errors.WeaveSerializeError):
+                logging.warning(
+                    "Failed to write table arrow cache %s", cache_path, exc_info=True
+                )
     return _TableLikeAWLFromFileResult(awl, data)
 
 
@@ -704,46 +796,56 @@ def _get_partitioned_table_awl_from_file(
         # We do this because we currently only have a synchronous pattern
         # available for resolving artifact-backed files.
         # TODO: Remove pre-download once artifact-backed files can be resolved asynchronously
-        asyncio.run(ensure_files(part_dir.files))
-
-        num_parts = len(part_dir.files)
-        rrows: list[list] = []
-        object_types: list[types.Type] = []
-        for file in part_dir.files.values():
-            data = _get_table_data_from_file(file)
-            rows, object_type = _get_rows_and_object_type_awl_from_file(
-                data, file, num_parts
+        ensure_files(part_dir.files)
+
+        part_files = list(part_dir.files.values())
+        num_parts = len(part_files)
+
+        def get_part_rows_and_object_type(
+            part_file: artifact_fs.FilesystemArtifactFile,
+        ) -> typing.Tuple[list, types.Type]:
+            part_data = _get_table_data_from_file(part_file)
+            return _get_rows_and_object_type_awl_from_file(
+                part_data, part_file, num_parts
             )
-            rrows.append(rows)
-            object_types.append(object_type)
-        object_type = types.union(*object_types)
 
-        for rows, file in zip(rrows, part_dir.files.values()):
-            all_aws.append(
-                _get_table_awl_from_rows_object_type(rows, object_type, file)
+        parts = list(
+            parallelism.do_in_parallel(get_part_rows_and_object_type, part_files)
+        )
+        object_type = types.union(*(part_type for _, part_type in parts))
+
+        def get_part_awl(
+            part: typing.Tuple[list, artifact_fs.FilesystemArtifactFile]
+        ) -> ops_arrow.ArrowWeaveList:
+            rows, part_file = part
+            return _get_table_awl_from_rows_object_type(rows, object_type, part_file)
+
+        all_aws = list(
+            parallelism.do_in_parallel(
+                get_part_awl,
+                [(rows, part_file) for (rows, _), part_file in zip(parts, part_files)],
             )
+        )
     arrow_weave_list = ops_arrow.ops.concat.raw_resolve_fn(all_aws)
     return arrow_weave_list
 
 
 # Download files in a `FilesystemArtifactDir` in parallel.
 # This only downloads files that are `WandbArtifact`s and have a resolved `_read_artifact_uri`.
-async def ensure_files(files: dict[str, artifact_fs.FilesystemArtifactFile]):
-    client = io_service.get_async_client()
-
-    loop = asyncio.get_running_loop()
-
-    tasks = set()
-    async with client.connect() as conn:
-        for file in files.values():
-            if (
-                isinstance(file.artifact, artifact_wandb.WandbArtifact)
-                and file.artifact._read_artifact_uri
-            ):
-                uri = file.artifact._read_artifact_uri.with_path(file.path)
-                task = loop.create_task(conn.ensure_file(uri))
-                tasks.add(task)
-        await asyncio.wait(tasks)
+# This is only a prefetch: a file that fails to download here is fetched again,
+# and its error raised, when it's read.
+def ensure_files(files: dict[str, artifact_fs.FilesystemArtifactFile]):
+    uris = [
+        file.artifact._read_artifact_uri.with_path(file.path)
+        for file in files.values()
+        if isinstance(file.artifact, artifact_wandb.WandbArtifact)
+        and file.artifact._read_artifact_uri
+    ]
+    if uris:
+        try:
+            io_service.get_sync_client().ensure_files(uris)
+        except Exception:
+            logging.warning("Failed to prefetch table files", exc_info=True)
 
 
 def _get_joined_table_awl_from_file(
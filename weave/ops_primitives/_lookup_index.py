@@ -0,0 +1,109 @@
+"""Id -> position indexes for the list lookup ops.
+
+listobject-lookup and listtypedict-lookup find the row with a given id.
+TraceLocal.get_run looks up runs in table-cached run lists this way for every
+cached node, so scanning the list on each call made lookups O(n) per node.
+Instead, a list is indexed the first time it's looked up in, and later
+lookups in the same list object are dict lookups.
+
+Lists can't hold attributes or be weakly referenced, so indexes are kept in
+a small LRU keyed by id(list). Entries hold a reference to their list, so the
+key stays valid; the LRU is kept small since it keeps its lists alive.
+Weave's list mutations (like append) return new lists, except for the lookup
+setters, which tell us about the rows they replace. An index is rebuilt if
+its list's length changed, or if a hit finds a row with another id. Misses
+are trusted otherwise, so looking up a missing id stays O(1).
+"""
+
+import collections
+import threading
+import typing
+
+MAX_INDEXES = 16
+
+GetId = typing.Callable[[typing.Any], typing.Any]
+
+
+class _Index:
+    def __init__(self, arr: list, get_id: GetId) -> None:
+        self.arr = arr
+        self.length = len(arr)
+        self.positions: dict[typing.Any, int] = {}
+        for i, row in enumerate(arr):
+            self.positions.setdefault(get_id(row), i)
+
+
+_lock = threading.Lock()
+_indexes: collections.OrderedDict[
+    typing.Tuple[int, GetId], _Index
+] = collections.OrderedDict()
+
+
+def _get_index(
+    arr: list, get_id: GetId, rebuild: bool = False
+) -> typing.Tuple[_Index, bool]:
+    """arr's index, and whether it was just built."""
+    key = (id(arr), get_id)
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+    if rebuild or index is None or index.arr is not arr or index.length != len(arr):
+        index = _Index(arr, get_id)
+        with _lock:
+            _indexes[key] = index
+            _indexes.move_to_end(key)
+            while len(_indexes) > MAX_INDEXES:
+                _indexes.popitem(last=False)
+        return index, True
+    return index, False
+
+
+def _scan(arr: typing.Iterable, id: typing.Any, get_id: GetId) -> typing.Optional[int]:
+    for i, row in enumerate(arr):
+        if get_id(row) == id:
+            return i
+    return None
+
+
+def position(arr: typing.Any, id: typing.Any, get_id: GetId) -> typing.Optional[int]:
+    """Position of the first row in arr whose id is id, or None."""
+    if not isinstance(arr, list):
+        return _scan(arr, id, get_id)
+    try:
+        index, built = _get_index(arr, get_id)
+        i = index.positions.get(id)
+        if not built and i is not None and get_id(arr[i]) != id:
+            # The row was replaced without going through a lookup setter.
+            index, _ = _get_index(arr, get_id, rebuild=True)
+            i = index.positions.get(id)
+    except TypeError:
+        # Unhashable ids
+        return _scan(arr, id, get_id)
+    return i
+
+
+def lookup(arr: typing.Any, id: typing.Any, get_id: GetId) -> typing.Any:
+    """The first row in arr whose id is id, or None."""
+    if not isinstance(arr, list):
+        for row in arr:
+            if get_id(row) == id:
+                return row
+        return None
+    i = position(arr, id, get_id)
+    if i is None:
+        return None
+    return arr[i]
+
+
+def row_replaced(arr: typing.Any, i: int, old_id: typing.Any, get_id: GetId) -> None:
+    """Update arr's index after arr[i], which had id old_id, was replaced."""
+    if get_id(arr[i]) == old_id:
+        return
+    with _lock:
+        _indexes.pop((id(arr), get_id), None)
+
+
+def clear() -> None:
+    with _lock:
+        _indexes.clear()
@@ -5,6 +5,7 @@ import itertools
 import typing
 
 from . import projection_utils
+from . import _lookup_index
 
 from ._dict_utils import tag_aware_dict_val_for_escaped_key
 from .. import box
@@ -41,6 +42,27 @@ def general_picker(obj, key):
     return [row.get(key) for row in obj]
 
 
+def group_rows(arr, group_keys):
+    """Group the rows of arr by their key in group_keys, in order of first
+    appearance. Each group is a list tagged with its groupKey."""
+    result = {}
+    # Start a new tagging context since we don't want the tags messing
+    # with the groupby keys
+    with tag_store.new_tagging_context():
+        for row, group_key_items in zip(arr, group_keys):
+            group_key_s = json.dumps(storage.to_python(group_key_items))
+            # logging.error("groupby group_key_s: %s", group_key_s)
+            if group_key_s not in result:
+                result[group_key_s] = (group_key_items, [])
+            result[group_key_s][1].append(row)
+    grs = []
+    for group_result in result.values():
+        item = box.box(group_result[1])
+        tag_store.add_tags(item, {"groupKey": group_result[0]})
+        grs.append(item)
+    return grs
+
+
 @weave_class(weave_type=types.List)
 class List:
     @op(name="count", input_type={"arr": types.List(types.Any())})
@@ -196,22 +218,7 @@ class List:
     )
     def groupby(arr, groupByFn):
         call_results = execute_fast.fast_map_fn(arr, groupByFn)
-        result = {}
-        # Start a new tagging context since we don't want the tags messing
-        # with the groupby keys
-        with tag_store.new_tagging_context():
-            for row, group_key_items in zip(arr, call_results):
-                group_key_s = json.dumps(storage.to_python(group_key_items))
-                # logging.error("groupby group_key_s: %s", group_key_s)
-                if group_key_s not in result:
-                    result[group_key_s] = (group_key_items, [])
-                result[group_key_s][1].append(row)
-        grs = []
-        for group_result in result.values():
-            item = box.box(group_result[1])
-            tag_store.add_tags(item, {"groupKey": group_result[0]})
-            grs.append(item)
-        return grs
+        return group_rows(arr, call_results)
 
     @op(
         name="offset",
@@ -762,27 +769,7 @@ def join_all(arrs, joinFn, outer: bool):
     return results
 
 
-@op(
-    name="table-2DProjection",
-    input_type={
-        "table": types.List(types.optional(types.TypedDict({}))),
-        "projectionAlgorithm": types.String(),
-        "inputCardinality": types.String(),
-        "inputColumnNames": types.List(types.String()),
-        "algorithmOptions": types.TypedDict({}),
-    },
-    output_type=lambda input_types: types.List(
-        types.TypedDict(
-            {
-                "projection": types.TypedDict(
-                    {"x": types.Number(), "y": types.Number()}
-                ),
-                "source": input_types["table"].object_type,
-            }
-        )
-    ),
-)
-def list_2Dprojection(
+def _list_2D_projection(
     table,
     projectionAlgorithm,
     inputCardinality,
@@ -808,9 +795,7 @@ def list_2Dprojection(
                 )
         np_array_of_embeddings = np.array(embeddings)
         np_projection = projection_utils.perform_2D_projection_with_timeout(
-            np_array_of_embeddings,
-            projectionAlgorithm,
-            algorithmOptions,
+            np_array_of_embeddings, projectionAlgorithm, algorithmOptions
         )
         projection = np_projection.tolist()
     return [
@@ -825,6 +810,38 @@ def list_2Dprojection(
     ]
 
 
+@op(
+    name="table-2DProjection",
+    input_type={
+        "table": types.List(types.optional(types.TypedDict({}))),
+        "projectionAlgorithm": types.String(),
+        "inputCardinality": types.String(),
+        "inputColumnNames": types.List(types.String()),
+        "algorithmOptions": types.TypedDict({}),
+    },
+    output_type=lambda input_types: types.List(
+        types.TypedDict(
+            {
+                "projection": types.TypedDict(
+                    {"x": types.Number(), "y": types.Number()}
+                ),
+                "source": input_types["table"].object_type,
+            }
+        )
+    ),
+)
+def list_2Dprojection(
+    table,
+    projectionAlgorithm,
+    inputCardinality,
+    inputColumnNames,
+    algorithmOptions,
+):
+    return _list_2D_projection(
+        table, projectionAlgorithm, inputCardinality, inputColumnNames, algorithmOptions
+    )
+
+
 @op(
     name="table-projection2D",
     input_type={
@@ -852,38 +869,9 @@ def list_projection2D(
     inputColumnNames,
     algorithmOptions,
 ):
-    inputColumnNames = list(set(inputColumnNames))
-    if len(inputColumnNames) == 0 or len(table) < 2:
-        projection = [[0, 0] for row in table]
-    else:
-        embeddings = []
-        for row in table:
-            if inputCardinality == "single":
-                embeddings.append(
-                    tag_aware_dict_val_for_escaped_key(row, inputColumnNames[0])
-                )
-            else:
-                embeddings.append(
-                    [
-                        tag_aware_dict_val_for_escaped_key(row, c)
-                        for c in inputColumnNames
-                    ]
-                )
-        np_array_of_embeddings = np.array(embeddings)
-        np_projection = projection_utils.perform_2D_projection_with_timeout(
-            np_array_of_embeddings, projectionAlgorithm, algorithmOptions
-        )
-        projection = np_projection.tolist()
-    return [
-        {
-            "projection": {
-                "x": p[0],
-                "y": p[1],
-            },
-            "source": row,
-        }
-        for p, row in zip(projection, table)
-    ]
+    return _list_2D_projection(
+        table, projectionAlgorithm, inputCardinality, inputColumnNames, algorithmOptions
+    )
 
 
 @op(
@@ -926,13 +914,16 @@ def sample(arr: list[typing.Any], n: int):
 ID_TYPE = types.UnionType(types.String(), types.Int())
 
 
+def _typeddict_row_id(row):
+    return row.get("id")
+
+
 def _typeddict_lookup_setter(arr, id, v):
-    for i, row in enumerate(arr):
-        if row.get("id") == id:
-            break
-    else:
+    i = _lookup_index.position(arr, id, _typeddict_row_id)
+    if i is None:
         return arr
     arr[i] = v
+    _lookup_index.row_replaced(arr, i, id, _typeddict_row_id)
     return arr
 
 
@@ -946,19 +937,19 @@ def _typeddict_lookup_setter(arr, id, v):
     output_type=getitem_output_type,
 )
 def typedict_lookup(arr, id):
-    for row in arr:
-        if row.get("id") == id:
-            return row
-    return None
+    return _lookup_index.lookup(arr, id, _typeddict_row_id)
+
+
+def _object_row_id(row):
+    return row.id
 
 
 def _object_lookup_setter(arr, id, v):
-    for i, row in enumerate(arr):
-        if row.id == id:
-            break
-    else:
+    i = _lookup_index.position(arr, id, _object_row_id)
+    if i is None:
         return arr
     arr[i] = v
+    _lookup_index.row_replaced(arr, i, id, _object_row_id)
     return arr
 
 
@@ -972,10 +963,7 @@ def _object_lookup_setter(arr, id, v):
     output_type=getitem_output_type,
 )
 def object_lookup(arr, id):
-    for row in arr:
-        if row.id == id:
-            return row
-    return None
+    return _lookup_index.lookup(arr, id, _object_row_id)
 
 
 def _cross_product_output_type(input_types):
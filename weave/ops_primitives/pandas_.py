@@ -1,6 +1,8 @@
 import dataclasses
 import json
 import math
+import operator
+import typing
 import pandas
 import numpy as np
 import pyarrow as pa
@@ -18,73 +20,219 @@ from .. import file_base
 from ..language_features.tagging import tag_store, tagged_value_type
 
 
-# Hack hack hack
-# TODO: we can do this with Weave instead of writing a giant switch statement
-#   (opNumberGreater can operate on Dataframe)
-def filter_fn_to_pandas_filter(df, filter_fn_node):
-    if isinstance(filter_fn_node, graph.ConstNode):
-        return filter_fn_node.val
-    elif isinstance(filter_fn_node, graph.OutputNode):
-        op_name = graph.op_full_name(filter_fn_node.from_op)
-        if op_name == "number-greater":
-            return filter_fn_to_pandas_filter(
-                df, filter_fn_node.from_op.inputs["lhs"]
-            ) > filter_fn_to_pandas_filter(df, filter_fn_node.from_op.inputs["rhs"])
-        elif op_name == "pick":
-            return filter_fn_to_pandas_filter(df, filter_fn_node.from_op.inputs["obj"])[
-                filter_fn_to_pandas_filter(df, filter_fn_node.from_op.inputs["key"])
-            ]
-        elif op_name == "typedDict-pick":
-            return filter_fn_to_pandas_filter(
-                df, filter_fn_node.from_op.inputs["self"]
-            )[filter_fn_to_pandas_filter(df, filter_fn_node.from_op.inputs["key"])]
-        raise Exception("unhandled op name", op_name)
-    elif isinstance(filter_fn_node, graph.VarNode):
-        if filter_fn_node.name == "row":
-            return df
-        raise Exception("unhandled var name")
-
-
-def groupby_fn_to_pandas_filter(df, filter_fn_node):
-    if isinstance(filter_fn_node, graph.ConstNode):
-        return filter_fn_node.val
-    elif isinstance(filter_fn_node, graph.OutputNode):
-        op_name = graph.op_full_name(filter_fn_node.from_op)
-        if op_name == "number-greater":
-            return groupby_fn_to_pandas_filter(
-                df, filter_fn_node.from_op.inputs["lhs"]
-            ) > groupby_fn_to_pandas_filter(df, filter_fn_node.from_op.inputs["rhs"])
-        elif op_name == "pick":
-            return groupby_fn_to_pandas_filter(
-                df, filter_fn_node.from_op.inputs["obj"]
-            )[groupby_fn_to_pandas_filter(df, filter_fn_node.from_op.inputs["key"])]
-        elif op_name == "typedDict-pick":
-            return groupby_fn_to_pandas_filter(
-                df, filter_fn_node.from_op.inputs["self"]
-            )[groupby_fn_to_pandas_filter(df, filter_fn_node.from_op.inputs["key"])]
-        elif op_name == "dict":
-            # Return as list... though we'll need to keep track of that
-            # we did this and remap the result keys.
-            # TODO
-            return list(
-                groupby_fn_to_pandas_filter(df, n)
-                for n in filter_fn_node.from_op.inputs.values()
-            )
-        raise Exception("unhandled op name", op_name)
-    elif isinstance(filter_fn_node, graph.VarNode):
-        if filter_fn_node.name == "row":
-            return df
-        raise Exception("unhandled var name")
+class _NotVectorizable(Exception):
+    pass
+
+
+class _Row:
+    # The row variable of a function, compiled against a DataFrame.
+    def __init__(self, df):
+        self.df = df
+
 
+def _is_vector(val):
+    return isinstance(val, pandas.Series)
 
-def numpy_val_to_python(val):
-    if isinstance(val, numpy.integer):
-        return int(val)
-    elif isinstance(val, float):
-        if math.isnan(val):
-            return "nan"
-        return float(val)
-    return val
+
+def _pd_equal(lhs, rhs):
+    # Like python, None is equal to None, but pandas compares missing values
+    # as not equal.
+    result = lhs == rhs
+    if _is_vector(lhs) or _is_vector(rhs):
+        result = result | (pandas.isna(lhs) & pandas.isna(rhs))
+    return result
+
+
+def _pd_not_equal(lhs, rhs):
+    return _pd_not(_pd_equal(lhs, rhs))
+
+
+def _pd_and(lhs, rhs):
+    if _is_vector(lhs) or _is_vector(rhs):
+        return lhs & rhs
+    return lhs and rhs
+
+
+def _pd_or(lhs, rhs):
+    if _is_vector(lhs) or _is_vector(rhs):
+        return lhs | rhs
+    return lhs or rhs
+
+
+def _pd_not(val):
+    if _is_vector(val):
+        return ~val.astype(bool)
+    return not val
+
+
+def _pd_coalesce(lhs, rhs):
+    if _is_vector(lhs):
+        return lhs.where(lhs.notna(), rhs)
+    elif lhs is None:
+        return rhs
+    return lhs
+
+
+def _pd_div(lhs, rhs):
+    # Like number-div, dividing by zero is inf.
+    if not _is_vector(rhs):
+        if not rhs:
+            return lhs * 0 + math.inf
+        return lhs / rhs
+    zero = rhs.isna() | (rhs == 0)
+    return (lhs / rhs.where(~zero, 1)).where(~zero, math.inf)
+
+
+def _pd_mod(lhs, rhs):
+    # Like number-modulo, modulo zero is 0.
+    if not _is_vector(rhs):
+        if not rhs:
+            return lhs * 0
+        return lhs % rhs
+    zero = rhs.isna() | (rhs == 0)
+    return (lhs % rhs.where(~zero, 1)).where(~zero, 0)
+
+
+def _str_method(name, scalar_name=None, **kwargs):
+    # Calls the pandas string accessor method name on vectors, or the python
+    # str method scalar_name (defaults to name) on scalars.
+    def method(val, *arg_vals):
+        if any(_is_vector(v) for v in arg_vals):
+            raise _NotVectorizable("string-%s of column" % name)
+        if _is_vector(val):
+            if val.dtype != np.dtype("object"):
+                raise _NotVectorizable("string-%s of %s" % (name, val.dtype))
+            return getattr(val.str, name)(*arg_vals, **kwargs)
+        return getattr(val, scalar_name or name)(*arg_vals)
+
+    return method
+
+
+def _str_len(val):
+    if _is_vector(val):
+        return val.str.len()
+    return len(val)
+
+
+# Ops that can be executed as pandas operations on whole columns, by op name.
+# Each is called with the op's compiled inputs, which are Series or python
+# scalars, in order. Ops whose results would differ from the python
+# implementation are left out.
+_PANDAS_OPS: dict[str, typing.Callable[..., typing.Any]] = {
+    "number-add": operator.add,
+    "number-sub": operator.sub,
+    "number-mult": operator.mul,
+    "number-div": _pd_div,
+    "number-modulo": _pd_mod,
+    "number-negate": operator.neg,
+    "number-abs": abs,
+    "number-equal": _pd_equal,
+    "number-notEqual": _pd_not_equal,
+    "number-less": operator.lt,
+    "number-greater": operator.gt,
+    "number-lessEqual": operator.le,
+    "number-greaterEqual": operator.ge,
+    "string-equal": _pd_equal,
+    "string-notEqual": _pd_not_equal,
+    "string-add": operator.add,
+    "string-len": _str_len,
+    "string-lower": _str_method("lower"),
+    "string-upper": _str_method("upper"),
+    "string-contains": _str_method("contains", "__contains__", regex=False),
+    "string-startsWith": _str_method("startswith"),
+    "string-endsWith": _str_method("endswith"),
+    "boolean-equal": _pd_equal,
+    "boolean-notEqual": _pd_not_equal,
+    "and": _pd_and,
+    "or": _pd_or,
+    "boolean-not": _pd_not,
+    "none-coalesce": _pd_coalesce,
+}
+
+
+def _node_to_pandas(df, node: graph.Node):
+    if isinstance(node, graph.ConstNode):
+        if node.val is not None and not isinstance(node.val, (bool, int, float, str)):
+            raise _NotVectorizable("const of type %s" % type(node.val))
+        return node.val
+    elif isinstance(node, graph.VarNode):
+        if node.name == "row":
+            return _Row(df)
+        raise _NotVectorizable("var %s" % node.name)
+    elif isinstance(node, graph.OutputNode):
+        op_name = graph.op_full_name(node.from_op)
+        inputs = list(node.from_op.inputs.values())
+        if op_name in ("pick", "typedDict-pick"):
+            obj = _node_to_pandas(df, inputs[0])
+            key = inputs[1]
+            if (
+                not isinstance(obj, _Row)
+                or not isinstance(key, graph.ConstNode)
+                or key.val not in obj.df.columns
+            ):
+                raise _NotVectorizable("pick")
+            return obj.df[key.val]
+        pandas_op = _PANDAS_OPS.get(op_name)
+        if pandas_op is None:
+            raise _NotVectorizable("op %s" % op_name)
+        compiled_inputs = [_node_to_pandas(df, n) for n in inputs]
+        if any(isinstance(i, _Row) for i in compiled_inputs):
+            raise _NotVectorizable("op %s of row" % op_name)
+        if any(i is None for i in compiled_inputs) and pandas_op not in (
+            _pd_equal,
+            _pd_not_equal,
+            _pd_coalesce,
+        ):
+            raise _NotVectorizable("op %s of None" % op_name)
+        return pandas_op(*compiled_inputs)
+    raise _NotVectorizable("node %s" % node)
+
+
+def fn_to_pandas(df, fn_node: graph.Node) -> pandas.Series:
+    """Compile the body of a weave function of row to a pandas operation, and
+    return its result for every row of df.
+
+    Raises _NotVectorizable if the function can't be executed on whole columns.
+    """
+    result = _node_to_pandas(df, fn_node)
+    if isinstance(result, _Row):
+        raise _NotVectorizable("row")
+    if not _is_vector(result):
+        return pandas.Series([result] * len(df), index=df.index, dtype=object)
+    return result
+
+
+def _picked_column(node: graph.Node):
+    # The column name, if node picks a column of the row.
+    if not isinstance(node, graph.OutputNode) or graph.op_full_name(
+        node.from_op
+    ) not in ("pick", "typedDict-pick"):
+        return None
+    obj, key = list(node.from_op.inputs.values())
+    if isinstance(obj, graph.VarNode) and isinstance(key, graph.ConstNode):
+        return key.val
+    return None
+
+
+def _group_key_columns(df, group_by_fn: graph.Node):
+    # Returns the group key names (None for a single key), the key Series, and
+    # the columns that are group keys. Like pandas, those are left out of the
+    # grouped rows.
+    if isinstance(group_by_fn, graph.OutputNode) and group_by_fn.from_op.name == "dict":
+        key_names = list(group_by_fn.from_op.inputs.keys())
+        key_fns = list(group_by_fn.from_op.inputs.values())
+    else:
+        key_names = None
+        key_fns = [group_by_fn]
+    key_columns = [fn_to_pandas(df, n) for n in key_fns]
+    picked_columns = [_picked_column(n) for n in key_fns]
+    return key_names, key_columns, [c for c in picked_columns if c is not None]
+
+
+def _series_to_python(series: pandas.Series) -> list:
+    # tolist converts numpy scalars to python values, and we use None for
+    # missing values like weave does.
+    return series.astype(object).where(series.notna(), None).tolist()
 
 
 @dataclasses.dataclass(frozen=True)
@@ -185,6 +333,16 @@ def index_output_type(input_types):
         return self_type.object_type
 
 
+def mapped_pick_output_type(input_types):
+    if not isinstance(input_types["key"], types.Const):
+        return types.List(types.UnknownType())
+    key = input_types["key"].val
+    prop_type = input_types["self"].object_type.property_types.get(key)
+    if prop_type is None:
+        return types.Invalid()
+    return types.List(prop_type)
+
+
 @weave_class(weave_type=DataFrameTableType)
 class DataFrameTable:
     _df: pandas.DataFrame
@@ -228,9 +386,19 @@ class DataFrameTable:
     def __getitem__(self, index: int):
         return self._index(index)
 
-    # @op(output_type=mapped_pick_output_type)
-    # def pick(self, key: str):
-    #     return self._df[key]
+    def _to_list_table(self):
+        # The row path, for functions we can't execute on whole columns.
+        df = self._df.astype(object).where(self._df.notna(), None)
+        return df.to_dict("records")
+
+    def _with_df(self, df):
+        return DataFrameTable(df.reset_index(drop=True), self.object_type)
+
+    @op(output_type=mapped_pick_output_type)
+    def pick(self, key: str):
+        if key not in self._df.columns:
+            return list_.general_picker(self._to_list_table(), key)
+        return _series_to_python(self._df[key])
 
     @op(
         input_type={
@@ -241,7 +409,16 @@ class DataFrameTable:
         output_type=lambda input_types: input_types["self"],
     )
     def filter(self, filterFn):
-        return DataFrameTable(self._df[filter_fn_to_pandas_filter(self._df, filterFn)])
+        try:
+            mask = fn_to_pandas(self._df, filterFn)
+        except _NotVectorizable:
+            mask = pandas.Series(
+                list_.List.map.resolve_fn(self._to_list_table(), filterFn),
+                index=self._df.index,
+                dtype=object,
+            )
+        mask = mask.where(mask.notna(), False).astype(bool)
+        return self._with_df(self._df[mask])
 
     @op(
         input_type={
@@ -252,10 +429,46 @@ class DataFrameTable:
         output_type=lambda input_types: types.List(input_types["self"].object_type),
     )
     def map(self, map_fn):
-        self_list = []
-        for i in range(self._count()):
-            self_list.append(self._index(i))
-        return list_.List.map.resolve_fn(self_list, map_fn)
+        try:
+            return _series_to_python(fn_to_pandas(self._df, map_fn))
+        except _NotVectorizable:
+            return list_.List.map.resolve_fn(self._to_list_table(), map_fn)
+
+    @op(
+        input_type={
+            "compFn": lambda input_types: types.Function(
+                {"row": input_types["self"].object_type}, types.List(types.Any())
+            ),
+            "columnDirs": types.List(types.String()),
+        },
+        output_type=lambda input_types: input_types["self"],
+    )
+    def sort(self, compFn, columnDirs):
+        try:
+            if not (
+                isinstance(compFn, graph.OutputNode) and compFn.from_op.name == "list"
+            ):
+                raise _NotVectorizable("sort function %s" % compFn)
+            keys = [fn_to_pandas(self._df, n) for n in compFn.from_op.inputs.values()]
+        except _NotVectorizable:
+            rows = self._to_list_table()
+            positions_by_id = {id(row): i for i, row in enumerate(rows)}
+            sorted_rows = list_.List.sort.resolve_fn(rows, compFn, columnDirs)
+            positions = [positions_by_id[id(row)] for row in sorted_rows]
+            return self._with_df(self._df.iloc[positions])
+        # Stable sort by each key, from the last to the first, like the list
+        # sort. None sorts first ascending and last descending.
+        positions = np.arange(len(self._df))
+        for key, column_dir in reversed(list(zip(keys, columnDirs))):
+            desc = column_dir == "desc"
+            key = key.iloc[positions].reset_index(drop=True)
+            order = key.sort_values(
+                ascending=not desc,
+                kind="mergesort",
+                na_position="last" if desc else "first",
+            ).index
+            positions = positions[order.to_numpy()]
+        return self._with_df(self._df.iloc[positions])
 
     @op(
         input_type={
@@ -275,34 +488,65 @@ class DataFrameTable:
         ),
     )
     def groupby(self, group_by_fn):
-        group_keys = None
-        if group_by_fn.from_op.name == "dict":
-            group_keys = list(group_by_fn.from_op.inputs.keys())
-        pandas_gb = groupby_fn_to_pandas_filter(self._df, group_by_fn)
-        grouped = self._df.groupby(pandas_gb)
-        df = grouped.agg(list)
+        try:
+            key_names, key_columns, key_column_names = _group_key_columns(
+                self._df, group_by_fn
+            )
+        except _NotVectorizable:
+            return list_.List.groupby.resolve_fn(self._to_list_table(), group_by_fn)
+        rows = self._with_df(self._df.drop(columns=key_column_names))._to_list_table()
+        grouped = self._df.groupby(key_columns, sort=True, dropna=False)
+        group_ids = grouped.ngroup().to_numpy()
+        key_values = [_series_to_python(c) for c in key_columns]
+        positions_by_group: list[list[int]] = [[] for _ in range(grouped.ngroups)]
+        for position, group_id in enumerate(group_ids):
+            positions_by_group[group_id].append(position)
         result = []
-        for i in range(len(df)):
-            row = df.iloc[i]
-            row_result = []
-            for row_val in zip(*row.values):
-                row_result.append(dict(zip(df.keys(), row_val)))
-            group_key_vals = row.name
-            if isinstance(group_key_vals, tuple):
-                group_key_vals = [numpy_val_to_python(v) for v in group_key_vals]
-            else:
-                group_key_vals = numpy_val_to_python(group_key_vals)
-            if group_keys is None:
-                group_key = group_key_vals
+        for positions in positions_by_group:
+            first = positions[0]
+            if key_names is None:
+                group_key = key_values[0][first]
             else:
-                if not isinstance(group_key_vals, tuple):
-                    group_key_vals = (group_key_vals,)
-                group_key = dict(zip(group_keys, group_key_vals))
-            item = box.box(row_result)
+                group_key = {
+                    name: values[first] for name, values in zip(key_names, key_values)
+                }
+            item = box.box([rows[i] for i in positions])
             tag_store.add_tags(item, {"groupKey": group_key})
             result.append(item)
         return result
 
+    @op(output_type=lambda input_types: input_types["self"])
+    def offset(self, offset: int):
+        return self._with_df(self._df.iloc[int(offset) :])
+
+    @op(output_type=lambda input_types: input_types["self"])
+    def limit(self, limit: int):
+        return self._with_df(self._df.iloc[: int(limit)])
+
+    @op(
+        name="dataframeTable-toArrow",
+        output_type=lambda input_types: _arrow_weave_list_type(
+            input_types["self"].object_type
+        ),
+    )
+    def to_arrow(self):
+        from ..ops_arrow.list_ import ArrowWeaveList
+
+        # Numeric columns are converted without copying, and all of the
+        # ArrowWeaveList ops are vectorized.
+        return ArrowWeaveList(pa.Table.from_pandas(self._df, preserve_index=False))
+
+
+def _arrow_weave_list_type(object_type):
+    from ..ops_arrow import ArrowWeaveListType
+
+    if isinstance(object_type, types.TypedDict):
+        # Arrow columns are nullable
+        object_type = types.TypedDict(
+            {k: types.optional(t) for k, t in object_type.property_types.items()}
+        )
+    return ArrowWeaveListType(object_type)
+
 
 DataFrameTableType.instance_classes = DataFrameTable
 DataFrameTableType.instance_class = DataFrameTable
@@ -1,8 +1,13 @@
+import collections
+import hashlib
+import json
 import threading
 import multiprocessing
+import types
 
 import queue
 import numpy as np
+from .. import cache
 from .. import errors
 from .. import environment
 from .. import context_state
@@ -17,7 +22,17 @@ umap_lib = {}
 
 DEFAULT_TIMEOUT_SEC = environment.projection_timeout_sec()
 
-ResultQueueItemType = typing.Union[Exception, np.ndarray]
+
+class FittedProjection(typing.NamedTuple):
+    projection: np.ndarray
+    # The fitted model, for algorithms that can project new rows. None for
+    # t-SNE, which can't, and for models too big to cache.
+    model: typing.Any
+    # Approximate size of model in bytes
+    model_nbytes: int = 0
+
+
+ResultQueueItemType = typing.Union[Exception, FittedProjection, np.ndarray]
 
 
 def _get_umap():
@@ -33,86 +48,400 @@ def _get_umap():
     return umap_lib["lib"]
 
 
-def perform_2D_projection(
+def fit_2D_projection(
     np_array_of_embeddings: np.ndarray,
     projectionAlgorithm: str,
     algorithmOptions: dict,
-) -> np.ndarray:
+) -> FittedProjection:
     if len(np_array_of_embeddings.shape) != 2:
         raise errors.WeaveInternalError(
             f"The input to the 2D projection must be a 2D array of embeddings, found {np_array_of_embeddings.shape}"
         )
     if projectionAlgorithm == "pca":
-        projection = perform_2D_projection_pca(
+        fitted = fit_2D_projection_pca(
             np_array_of_embeddings, algorithmOptions.get("pca", {})
         )
     elif projectionAlgorithm == "tsne":
-        projection = perform_2D_projection_tsne(
-            np_array_of_embeddings, algorithmOptions.get("tsne", {})
+        fitted = FittedProjection(
+            perform_2D_projection_tsne(
+                np_array_of_embeddings, algorithmOptions.get("tsne", {})
+            ),
+            None,
         )
     elif projectionAlgorithm == "umap":
-        projection = perform_2D_projection_umap(
+        fitted = fit_2D_projection_umap(
             np_array_of_embeddings, algorithmOptions.get("umap", {})
         )
     else:
         raise Exception("Unknown projection algorithm: " + projectionAlgorithm)
-    return projection
+    if fitted.model is not None:
+        fitted = fitted._replace(model_nbytes=_model_nbytes(fitted.model))
+    return fitted
+
+
+def _model_nbytes(model: typing.Any) -> int:
+    """Approximate size of a fitted model in bytes.
+
+    Sums the arrays the model holds on to, which for UMAP includes its
+    training data, kNN graph and index, and nearest neighbor search trees.
+    """
+    seen: set[int] = set()
+
+    def nbytes(obj: typing.Any, depth: int) -> int:
+        if depth > 8 or id(obj) in seen:
+            return 0
+        seen.add(id(obj))
+        if isinstance(obj, np.ndarray):
+            return obj.nbytes
+        if isinstance(
+            obj, (type, types.ModuleType, types.FunctionType, types.MethodType)
+        ):
+            return 0
+        try:
+            if isinstance(obj, dict):
+                items = list(dict.values(obj))
+            elif isinstance(obj, (list, tuple)):
+                items = list(obj)
+            elif isinstance(getattr(obj, "__dict__", None), dict):
+                items = list(obj.__dict__.values())
+            else:
+                return 0
+        except Exception:
+            # Objects (like compiled functions) that don't behave like
+            # containers hold no arrays we can count.
+            return 0
+        return sum(nbytes(item, depth + 1) for item in items)
+
+    return nbytes(model, 0)
+
+
+def _max_cached_model_bytes() -> int:
+    if environment.projection_cache_max_entries() <= 0:
+        return 0
+    return environment.projection_cache_max_bytes()
+
+
+def _without_uncacheable_model(
+    fitted: FittedProjection, max_model_bytes: int
+) -> FittedProjection:
+    if fitted.model is not None and fitted.model_nbytes > max_model_bytes:
+        return FittedProjection(fitted.projection, None)
+    return fitted
+
+
+def perform_2D_projection(
+    np_array_of_embeddings: np.ndarray,
+    projectionAlgorithm: str,
+    algorithmOptions: dict,
+) -> np.ndarray:
+    return fit_2D_projection(
+        np_array_of_embeddings, projectionAlgorithm, algorithmOptions
+    ).projection
 
 
 def perform_2D_projection_async(
     np_array_of_embeddings: np.ndarray,
     projectionAlgorithm: str,
     algorithmOptions: dict,
+    max_model_bytes: int,
     result_queue: queue.Queue[ResultQueueItemType],
 ):
     try:
-        projection = perform_2D_projection(
+        fitted = fit_2D_projection(
             np_array_of_embeddings, projectionAlgorithm, algorithmOptions
         )
-        result_queue.put(projection)
+        # Only send the model back if it will be cached, so big models aren't
+        # pickled through the queue for nothing.
+        result_queue.put(_without_uncacheable_model(fitted, max_model_bytes))
     except Exception as e:
         result_queue.put(e)
 
 
+def transform_2D_projection_async(
+    projectionAlgorithm: str,
+    model: typing.Any,
+    rows: np.ndarray,
+    result_queue: queue.Queue[ResultQueueItemType],
+):
+    try:
+        result_queue.put(_transform(projectionAlgorithm, model, rows))
+    except Exception as e:
+        result_queue.put(e)
+
+
+def _run_with_timeout(
+    target: typing.Callable,
+    args: tuple,
+    timeout: typing.Union[int, float],
+) -> typing.Any:
+    """Run target(*args, result_queue) in another process, and return what it
+    puts on the queue, or None if it takes longer than timeout."""
+    result_queue: queue.Queue[ResultQueueItemType] = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=target,
+        args=(*args, result_queue),
+        name="projection",
+    )
+    process.start()
+
+    try:
+        result = result_queue.get(timeout=timeout)
+    except queue.Empty:
+        process.kill()
+        logging.warning(
+            f"Projection timed out after {timeout} seconds, killing process {process.pid}, returning empty projection",
+        )
+
+        return None
+    if isinstance(result, Exception):
+        raise result
+
+    return result
+
+
 def perform_2D_projection_with_timeout(
     np_array_of_embeddings: np.ndarray,
     projectionAlgorithm: str,
     algorithmOptions: dict,
     timeout: typing.Optional[typing.Union[int, float]] = DEFAULT_TIMEOUT_SEC,
 ) -> np.ndarray:
+    projection = cached_2D_projection(
+        np_array_of_embeddings, projectionAlgorithm, algorithmOptions, timeout
+    )
+    if projection is not None:
+        return projection
+
+    fitted = fit_2D_projection_with_timeout(
+        np_array_of_embeddings, projectionAlgorithm, algorithmOptions, timeout
+    )
+    if fitted is None:
+        return np.zeros((len(np_array_of_embeddings), 2))
+    cache_2D_projection(
+        np_array_of_embeddings, projectionAlgorithm, algorithmOptions, fitted
+    )
+    return fitted.projection
+
+
+def fit_2D_projection_with_timeout(
+    np_array_of_embeddings: np.ndarray,
+    projectionAlgorithm: str,
+    algorithmOptions: dict,
+    timeout: typing.Optional[typing.Union[int, float]] = DEFAULT_TIMEOUT_SEC,
+) -> typing.Optional[FittedProjection]:
+    """Fit a projection, or return None if it takes longer than timeout."""
     if timeout is None:
-        return perform_2D_projection(
+        return fit_2D_projection(
             np_array_of_embeddings, projectionAlgorithm, algorithmOptions
         )
 
     # otherwise run it in another process and kill it if it goes over time
-
-    result_queue: queue.Queue[ResultQueueItemType] = multiprocessing.Queue()
-    target = multiprocessing.Process(
-        target=perform_2D_projection_async,
-        args=(
+    return _run_with_timeout(
+        perform_2D_projection_async,
+        (
             np_array_of_embeddings,
             projectionAlgorithm,
             algorithmOptions,
-            result_queue,
+            _max_cached_model_bytes(),
         ),
-        name="projection",
+        timeout,
     )
-    target.start()
 
-    try:
-        result = result_queue.get(timeout=timeout)
-    except queue.Empty:
-        target.kill()
-        logging.warning(
-            f"Projection timed out after {timeout} seconds, killing process {target.pid}, returning empty projection",
+
+def transform_2D_projection_with_timeout(
+    projectionAlgorithm: str,
+    model: typing.Any,
+    rows: np.ndarray,
+    timeout: typing.Optional[typing.Union[int, float]] = DEFAULT_TIMEOUT_SEC,
+) -> typing.Optional[np.ndarray]:
+    """Project rows with a fitted model, or return None if it takes longer
+    than timeout."""
+    if timeout is None:
+        return _transform(projectionAlgorithm, model, rows)
+    return _run_with_timeout(
+        transform_2D_projection_async, (projectionAlgorithm, model, rows), timeout
+    )
+
+
+# Fitted projections are cached by a fingerprint of the embeddings and the
+# algorithm options, so re-rendering a projection panel doesn't refit. When
+# rows are appended to a table we've projected, the new rows are projected
+# with the fitted model (for algorithms that support it) instead of refitting.
+
+# Algorithms whose fitted models can project new rows.
+INCREMENTAL_ALGORITHMS = {"pca", "umap"}
+
+# How many cached projections of the same algorithm and options are checked
+# for being a prefix of new embeddings.
+MAX_PREFIX_CANDIDATES = 8
+
+ProjectionCacheKey = typing.Tuple[str, str]
+
+_projection_cache: typing.Optional[
+    cache.LruSizeBoundedCache[ProjectionCacheKey, FittedProjection]
+] = None
+_projection_cache_lock = threading.Lock()
+
+# The number of rows and the embedding shape of cached projections, most
+# recently cached last, used to find projections of a prefix of the rows.
+_cached_shapes: collections.OrderedDict[
+    ProjectionCacheKey, typing.Tuple[int, typing.Tuple[int, ...]]
+] = collections.OrderedDict()
+
+
+def get_projection_cache() -> typing.Optional[
+    cache.LruSizeBoundedCache[ProjectionCacheKey, FittedProjection]
+]:
+    global _projection_cache
+    max_entries = environment.projection_cache_max_entries()
+    if max_entries <= 0:
+        return None
+    with _projection_cache_lock:
+        if _projection_cache is None:
+            _projection_cache = cache.LruSizeBoundedCache(
+                max_entries,
+                environment.projection_cache_max_bytes(),
+                stats_name="weave.projection_cache",
+            )
+    return _projection_cache
+
+
+def clear_projection_cache() -> None:
+    with _projection_cache_lock:
+        if _projection_cache is not None:
+            _projection_cache.clear()
+        _cached_shapes.clear()
+
+
+def _options_key(projectionAlgorithm: str, algorithmOptions: dict) -> str:
+    return json.dumps(
+        [projectionAlgorithm, algorithmOptions.get(projectionAlgorithm, {})],
+        sort_keys=True,
+        default=str,
+    )
+
+
+def _fingerprint(np_array_of_embeddings: np.ndarray) -> typing.Optional[str]:
+    # Only numeric arrays hold their values in their data. Object arrays hold
+    # pointers, so we don't cache their projections.
+    if np_array_of_embeddings.dtype.kind not in "biufc":
+        return None
+    h = hashlib.sha256()
+    h.update(
+        str((np_array_of_embeddings.shape, np_array_of_embeddings.dtype.str)).encode()
+    )
+    h.update(np.ascontiguousarray(np_array_of_embeddings).data)
+    return h.hexdigest()
+
+
+def _transform(projectionAlgorithm: str, model: typing.Any, rows: np.ndarray):
+    if projectionAlgorithm == "umap":
+        with umap_lock:
+            return model.transform(rows)
+    return model.transform(rows)
+
+
+def cached_2D_projection(
+    np_array_of_embeddings: np.ndarray,
+    projectionAlgorithm: str,
+    algorithmOptions: dict,
+    timeout: typing.Optional[typing.Union[int, float]] = DEFAULT_TIMEOUT_SEC,
+) -> typing.Optional[np.ndarray]:
+    """The cached projection of the embeddings, if there is one.
+
+    If the embeddings extend embeddings with a cached incremental projection,
+    the new rows are projected with its model, and the result is cached. If
+    that takes longer than timeout, an empty projection is returned, as for a
+    fit that times out.
+    """
+    projection_cache = get_projection_cache()
+    if projection_cache is None or len(np_array_of_embeddings.shape) != 2:
+        return None
+    fingerprint = _fingerprint(np_array_of_embeddings)
+    if fingerprint is None:
+        return None
+    options_key = _options_key(projectionAlgorithm, algorithmOptions)
+    fitted = projection_cache.get((options_key, fingerprint))
+    if not isinstance(fitted, cache.LruSizeBoundedCache.NotFound):
+        return fitted.projection
+    if projectionAlgorithm not in INCREMENTAL_ALGORITHMS:
+        return None
+
+    n_rows = len(np_array_of_embeddings)
+    with _projection_cache_lock:
+        candidates = [
+            (prefix_rows, key)
+            for key, (prefix_rows, shape) in reversed(_cached_shapes.items())
+            if key[0] == options_key
+            and shape == np_array_of_embeddings.shape[1:]
+            and prefix_rows < n_rows
+        ][:MAX_PREFIX_CANDIDATES]
+    for prefix_rows, key in sorted(candidates, key=lambda c: -c[0]):
+        if _fingerprint(np_array_of_embeddings[:prefix_rows]) != key[1]:
+            continue
+        prefix_fitted = projection_cache.get(key)
+        if (
+            isinstance(prefix_fitted, cache.LruSizeBoundedCache.NotFound)
+            or prefix_fitted.model is None
+        ):
+            continue
+        new_projection = transform_2D_projection_with_timeout(
+            projectionAlgorithm,
+            prefix_fitted.model,
+            np_array_of_embeddings[prefix_rows:],
+            timeout,
+        )
+        if new_projection is None:
+            return np.zeros((n_rows, 2))
+        fitted = FittedProjection(
+            np.concatenate([prefix_fitted.projection, new_projection]),
+            prefix_fitted.model,
+            prefix_fitted.model_nbytes,
         )
+        cache_2D_projection(
+            np_array_of_embeddings, projectionAlgorithm, algorithmOptions, fitted
+        )
+        return fitted.projection
+    return None
 
-        return np.zeros((len(np_array_of_embeddings), 2))
-    if isinstance(result, Exception):
-        raise result
 
-    return result
+def cache_2D_projection(
+    np_array_of_embeddings: np.ndarray,
+    projectionAlgorithm: str,
+    algorithmOptions: dict,
+    fitted: FittedProjection,
+) -> None:
+    projection_cache = get_projection_cache()
+    if projection_cache is None or len(np_array_of_embeddings.shape) != 2:
+        return
+    fingerprint = _fingerprint(np_array_of_embeddings)
+    if fingerprint is None:
+        return
+    key = (_options_key(projectionAlgorithm, algorithmOptions), fingerprint)
+    # Models too big to cache are dropped, keeping just the projection.
+    fitted = _without_uncacheable_model(fitted, projection_cache.max_bytes)
+    projection_cache.set(
+        key,
+        fitted,
+        (fitted.model_nbytes if fitted.model is not None else 0)
+        + fitted.projection.nbytes,
+    )
+    with _projection_cache_lock:
+        _cached_shapes[key] = (
+            len(np_array_of_embeddings),
+            np_array_of_embeddings.shape[1:],
+        )
+        _cached_shapes.move_to_end(key)
+        while len(_cached_shapes) > environment.projection_cache_max_entries():
+            _cached_shapes.popitem(last=False)
+
+
+def _fit_sample(np_array_of_embeddings: np.ndarray) -> typing.Optional[np.ndarray]:
+    # The rows to fit on, if there are too many to fit on all of them.
+    max_fit_rows = environment.projection_max_fit_rows()
+    if max_fit_rows <= 0 or len(np_array_of_embeddings) <= max_fit_rows:
+        return None
+    rng = np.random.default_rng(0)
+    return np.sort(rng.choice(len(np_array_of_embeddings), max_fit_rows, replace=False))
 
 
 def limit_embedding_dimensions(
@@ -124,11 +453,21 @@ def limit_embedding_dimensions(
     return np_array_of_embeddings
 
 
+def fit_2D_projection_pca(
+    np_array_of_embeddings: np.ndarray, options: dict
+) -> FittedProjection:
+    model = PCA(n_components=2)
+    sample = _fit_sample(np_array_of_embeddings)
+    if sample is None:
+        return FittedProjection(model.fit_transform(np_array_of_embeddings), model)
+    model.fit(np_array_of_embeddings[sample])
+    return FittedProjection(model.transform(np_array_of_embeddings), model)
+
+
 def perform_2D_projection_pca(
     np_array_of_embeddings: np.ndarray, options: dict
 ) -> np.ndarray:
-    model = PCA(n_components=2)
-    return model.fit_transform(np_array_of_embeddings)
+    return fit_2D_projection_pca(np_array_of_embeddings, options).projection
 
 
 def perform_2D_projection_tsne(
@@ -150,9 +489,9 @@ def perform_2D_projection_tsne(
 umap_lock = threading.Lock()
 
 
-def perform_2D_projection_umap(
+def fit_2D_projection_umap(
     np_array_of_embeddings: np.ndarray, options: dict
-) -> np.ndarray:
+) -> FittedProjection:
     model = _get_umap().UMAP(
         n_components=2,
         # Letting the library choose defaults
@@ -161,5 +500,15 @@ def perform_2D_projection_umap(
         # spread=options.get("spread", 1.0),
         init="random",
     )
+    sample = _fit_sample(np_array_of_embeddings)
     with umap_lock:
-        return model.fit_transform(np_array_of_embeddings)
+        if sample is None:
+            return FittedProjection(model.fit_transform(np_array_of_embeddings), model)
+        model.fit(np_array_of_embeddings[sample])
+        return FittedProjection(model.transform(np_array_of_embeddings), model)
+
+
+def perform_2D_projection_umap(
+    np_array_of_embeddings: np.ndarray, options: dict
+) -> np.ndarray:
+    return fit_2D_projection_umap(np_array_of_embeddings, options).projection
@@ -1,9 +1,14 @@
-import copy
 import math
 import functools
+import json
+import operator
+import typing
+
+import pyarrow as pa
 
 from ..api import op, weave_class
 from .. import decorator_type
+from .. import errors
 from .. import weave_types as types
 from . import list_
 from . import graph
@@ -12,7 +17,6 @@ from ..language_features.tagging import tagged_value_type
 
 try:
     import sqlalchemy
-    from sqlalchemy import orm
 except ImportError:
     pass
 
@@ -35,32 +39,138 @@ class SqlConnection:
         return SqlTable(self, name)
 
 
-def filter_fn_to_sql_filter(table, filter_fn_node):
-    if isinstance(filter_fn_node, graph.ConstNode):
-        return filter_fn_node.val
-    elif isinstance(filter_fn_node, graph.OutputNode):
-        op_name = graph.op_full_name(filter_fn_node.from_op)
-        if op_name == "number-greater":
-            return filter_fn_to_sql_filter(
-                table, filter_fn_node.from_op.inputs["lhs"]
-            ) > filter_fn_to_sql_filter(table, filter_fn_node.from_op.inputs["rhs"])
-        elif op_name == "pick":
-            return filter_fn_to_sql_filter(
-                table, filter_fn_node.from_op.inputs["obj"]
-            ).columns[
-                filter_fn_to_sql_filter(table, filter_fn_node.from_op.inputs["key"])
-            ]
-        elif op_name == "typedDict-pick":
-            return filter_fn_to_sql_filter(
-                table, filter_fn_node.from_op.inputs["self"]
-            ).columns[
-                filter_fn_to_sql_filter(table, filter_fn_node.from_op.inputs["key"])
-            ]
-        raise Exception("unhandled op name", op_name)
-    elif isinstance(filter_fn_node, graph.VarNode):
-        if filter_fn_node.name == "row":
-            return table
-        raise Exception("unhandled var name")
+class _NotPushable(Exception):
+    pass
+
+
+class _Row:
+    # The row variable of a function, compiled against a query's columns.
+    def __init__(self, columns):
+        self.columns = columns
+
+
+def _sql_contains(dialect_name, string, sub):
+    # LIKE is case insensitive in sqlite, so use position functions where we
+    # know them.
+    if dialect_name in ("sqlite", "mysql"):
+        return sqlalchemy.func.instr(string, sub) > 0
+    elif dialect_name == "postgresql":
+        return sqlalchemy.func.strpos(string, sub) > 0
+    return string.contains(sub, autoescape=True)
+
+
+def _sql_startswith(dialect_name, string, prefix):
+    prefix = sqlalchemy.func.coalesce(prefix, "")
+    return sqlalchemy.func.substr(string, 1, sqlalchemy.func.length(prefix)) == prefix
+
+
+def _sql_endswith(dialect_name, string, suffix):
+    suffix = sqlalchemy.func.coalesce(suffix, "")
+    start = sqlalchemy.func.length(string) - sqlalchemy.func.length(suffix) + 1
+    return sqlalchemy.and_(start > 0, sqlalchemy.func.substr(string, start) == suffix)
+
+
+def _sql_equal(lhs, rhs):
+    # Like python, None is equal to None. We don't use IS NOT DISTINCT FROM,
+    # because sqlalchemy can't render it with literal values.
+    return sqlalchemy.func.coalesce(
+        lhs == rhs, sqlalchemy.and_(lhs.is_(None), rhs.is_(None))
+    )
+
+
+def _sql_not_equal(lhs, rhs):
+    return sqlalchemy.not_(_sql_equal(lhs, rhs))
+
+
+def _binary(fn):
+    return lambda dialect_name, lhs, rhs: fn(lhs, rhs)
+
+
+def _unary(fn):
+    return lambda dialect_name, val: fn(val)
+
+
+# Ops that can be executed in the database, by op name. Each is called with
+# the dialect name and the op's compiled inputs, in order, and returns a
+# sqlalchemy expression. Ops whose results would differ from the python
+# implementation (like modulo of negative numbers) are left out.
+_SQL_OPS: dict[str, typing.Callable[..., typing.Any]] = {
+    "number-add": _binary(operator.add),
+    "number-sub": _binary(operator.sub),
+    "number-mult": _binary(operator.mul),
+    "number-div": _binary(
+        lambda lhs, rhs: sqlalchemy.cast(lhs, sqlalchemy.Float) / rhs
+    ),
+    "number-negate": _unary(operator.neg),
+    "number-abs": _unary(lambda val: sqlalchemy.func.abs(val)),
+    "number-equal": _binary(_sql_equal),
+    "number-notEqual": _binary(_sql_not_equal),
+    "number-less": _binary(operator.lt),
+    "number-greater": _binary(operator.gt),
+    "number-lessEqual": _binary(operator.le),
+    "number-greaterEqual": _binary(operator.ge),
+    "string-equal": _binary(_sql_equal),
+    "string-notEqual": _binary(_sql_not_equal),
+    "string-add": _binary(lambda lhs, rhs: lhs.concat(rhs)),
+    "string-len": _unary(lambda val: sqlalchemy.func.length(val)),
+    "string-lower": _unary(lambda val: sqlalchemy.func.lower(val)),
+    "string-upper": _unary(lambda val: sqlalchemy.func.upper(val)),
+    "string-contains": _sql_contains,
+    "string-startsWith": _sql_startswith,
+    "string-endsWith": _sql_endswith,
+    "boolean-equal": _binary(_sql_equal),
+    "boolean-notEqual": _binary(_sql_not_equal),
+    "and": _binary(lambda lhs, rhs: sqlalchemy.and_(lhs, rhs)),
+    "or": _binary(lambda lhs, rhs: sqlalchemy.or_(lhs, rhs)),
+    "boolean-not": _unary(lambda val: sqlalchemy.not_(val)),
+    "none-coalesce": _binary(lambda lhs, rhs: sqlalchemy.func.coalesce(lhs, rhs)),
+}
+
+
+def _node_to_sql(columns, node: graph.Node, dialect_name: str):
+    if isinstance(node, graph.ConstNode):
+        if node.val is None:
+            return sqlalchemy.null()
+        if not isinstance(node.val, (bool, int, float, str)):
+            raise _NotPushable("const of type %s" % type(node.val))
+        return sqlalchemy.literal(node.val)
+    elif isinstance(node, graph.VarNode):
+        if node.name == "row":
+            return _Row(columns)
+        raise _NotPushable("var %s" % node.name)
+    elif isinstance(node, graph.OutputNode):
+        op_name = graph.op_full_name(node.from_op)
+        inputs = list(node.from_op.inputs.values())
+        if op_name in ("pick", "typedDict-pick"):
+            obj = _node_to_sql(columns, inputs[0], dialect_name)
+            key = inputs[1]
+            if (
+                not isinstance(obj, _Row)
+                or not isinstance(key, graph.ConstNode)
+                or key.val not in obj.columns
+            ):
+                raise _NotPushable("pick")
+            return obj.columns[key.val]
+        sql_op = _SQL_OPS.get(op_name)
+        if sql_op is None:
+            raise _NotPushable("op %s" % op_name)
+        compiled_inputs = [_node_to_sql(columns, n, dialect_name) for n in inputs]
+        if any(isinstance(i, _Row) for i in compiled_inputs):
+            raise _NotPushable("op %s of row" % op_name)
+        return sql_op(dialect_name, *compiled_inputs)
+    raise _NotPushable("node %s" % node)
+
+
+def fn_to_sql(columns, fn_node: graph.Node, dialect_name: str):
+    """Compile the body of a weave function of row to a sqlalchemy expression.
+
+    columns is the column collection the row variable refers to. Raises
+    _NotPushable if the function can't be executed in the database.
+    """
+    result = _node_to_sql(columns, fn_node, dialect_name)
+    if isinstance(result, _Row):
+        raise _NotPushable("row")
+    return result
 
 
 def index_output_type(input_types):
@@ -93,6 +203,7 @@ class SqlTableType(types.ObjectType):
         return {
             "conn": SqlConnection.WeaveType(),
             "table_name": types.String(),
+            "query": types.optional(types.String()),
         }
 
     def __init__(self, object_type=types.TypedDict({})):
@@ -109,31 +220,103 @@ class SqlTableType(types.ObjectType):
 @weave_class(weave_type=SqlTableType)
 class SqlTable:
     PAGE_SIZE = 100
+    # Whole tables are fetched from the database in batches of this many rows.
+    FETCH_BATCH_SIZE = 10000
+    GROUP_KEY_LABEL = "__weave_group_key__"
 
-    def __init__(self, conn, table_name):
+    def __init__(self, conn, table_name, query=None):
         self.conn = conn
         self.table_name = table_name
 
+        # The filters, sorts, offsets and limits applied to the table, in
+        # order, as a json list of [step name, args]. Functions are stored as
+        # serialized nodes. The steps are compiled into a single sql query,
+        # so they are executed in the database.
+        self._steps = json.loads(query) if query else []
+
         # We always fetch results in pages of PAGE_SIZE, and store the results
         # here in _row_cache.
         self._row_cache = {}
-        self._filter_fn = None
 
     @functools.cached_property
     def table(self):
         return self.conn.meta.tables[self.table_name]
 
-    def _to_list_table(self):
-        self_list = []
-        for i in range(self._count()):
-            self_list.append(self._index(i))
-        return self_list
+    @property
+    def query(self):
+        if not self._steps:
+            return None
+        return json.dumps(self._steps)
 
-    def copy(self):
-        new_obj = self.__class__(self.conn, self.table_name)
-        new_obj._filter_fn = copy.deepcopy(self._filter_fn)
+    @property
+    def _dialect_name(self):
+        return self.conn.engine.dialect.name
+
+    @functools.cached_property
+    def _plan(self):
+        plan = _Plan(sqlalchemy.select(self.table), (), False)
+        for step_name, step_args in self._steps:
+            plan = _PLAN_STEPS[step_name](plan, self._dialect_name, *step_args)
+        return plan
+
+    @property
+    def select(self):
+        return self._plan.select
+
+    def _with_step(self, step_name, *step_args):
+        new_obj = self.__class__(
+            self.conn,
+            self.table_name,
+            json.dumps([*self._steps, [step_name, step_args]]),
+        )
+        # Compile now, so unsupported steps fail in the op that adds them.
+        new_obj._plan
         return new_obj
 
+    def copy(self):
+        return self.__class__(self.conn, self.table_name, self.query)
+
+    def _execute(self, select):
+        with self.conn.engine.connect() as connection:
+            return connection.execute(select).all()
+
+    def _to_list_table(self):
+        return [dict(row._mapping) for row in self._execute(self.select)]
+
+    def _to_arrow(self):
+        from .. import artifact_mem
+        from .. import arrow_util
+        from .. import mappers_arrow
+        from ..ops_arrow import convert
+        from ..ops_arrow.list_ import ArrowWeaveList
+
+        object_type = types.TypedDict(_columns_to_type(self.select.selected_columns))
+        if any(isinstance(t, types.Any) for t in object_type.property_types.values()):
+            return convert.to_arrow(self._to_list_table())
+
+        artifact = artifact_mem.MemArtifact()
+        mapper = mappers_arrow.map_to_arrow(object_type, artifact)
+        schema = pa.schema(list(arrow_util.arrow_type(mapper.result_type())))
+        batches = []
+        with self.conn.engine.connect() as connection:
+            result = connection.execution_options(stream_results=True).execute(
+                self.select
+            )
+            for rows in result.partitions(self.FETCH_BATCH_SIZE):
+                columns = list(zip(*rows))
+                batches.append(
+                    pa.RecordBatch.from_arrays(
+                        [
+                            pa.array(column, type=field.type)
+                            for column, field in zip(columns, schema)
+                        ],
+                        schema=schema,
+                    )
+                )
+        return ArrowWeaveList(
+            pa.Table.from_batches(batches, schema=schema), object_type, artifact
+        )
+
     def _cached_row(self, index):
         page = math.floor(index / self.PAGE_SIZE)
         page_offset = index % self.PAGE_SIZE
@@ -144,17 +327,12 @@ class SqlTable:
                 return None
         return None
 
-    @property
-    def query(self):
-        DBSession = orm.sessionmaker(bind=self.conn.engine)
-        session = DBSession()
-        query = session.query(self.table)
-        if self._filter_fn is not None:
-            query = query.filter(filter_fn_to_sql_filter(self.table, self._filter_fn))
-        return query
-
     def _count(self):
-        return self.query.count()
+        select = sqlalchemy.select(sqlalchemy.func.count()).select_from(
+            self.select.subquery()
+        )
+        with self.conn.engine.connect() as connection:
+            return connection.execute(select).scalar_one()
 
     @op()
     def count(self) -> int:
@@ -168,13 +346,9 @@ class SqlTable:
         page = math.floor(index / self.PAGE_SIZE)
         page_offset = index % self.PAGE_SIZE
 
-        query = self.query
-        results = query.offset(page * self.PAGE_SIZE).limit(SqlTable.PAGE_SIZE)
-        # print('RESULTS QUERY', results)
-        rows = []
-        for row in results.all():
-            row = {k: getattr(row, k) for k in row._fields}
-            rows.append(row)
+        select = _extend(self._plan).select
+        select = select.offset(page * self.PAGE_SIZE).limit(self.PAGE_SIZE)
+        rows = [dict(row._mapping) for row in self._execute(select)]
         self._row_cache[page] = rows
         try:
             return rows[page_offset]
@@ -187,7 +361,11 @@ class SqlTable:
 
     @op(output_type=mapped_pick_output_type)
     def pick(self, key: str):
-        return list_.general_picker(self._to_list_table(), key)
+        columns = self.select.selected_columns
+        if key not in columns:
+            return list_.general_picker(self._to_list_table(), key)
+        select = self.select.with_only_columns(columns[key])
+        return [row[0] for row in self._execute(select)]
 
     @op(
         input_type={
@@ -198,7 +376,12 @@ class SqlTable:
         output_type=lambda input_types: types.List(input_types["self"].object_type),
     )
     def map(self, map_fn):
-        return list_.List.map.resolve_fn(self._to_list_table(), map_fn)
+        try:
+            expr = fn_to_sql(self.select.selected_columns, map_fn, self._dialect_name)
+        except _NotPushable:
+            return list_.List.map.resolve_fn(self._to_list_table(), map_fn)
+        select = self.select.with_only_columns(expr, maintain_column_froms=True)
+        return [row[0] for row in self._execute(select)]
 
     @op(
         input_type={
@@ -209,9 +392,32 @@ class SqlTable:
         output_type=lambda input_types: input_types["self"],
     )
     def filter(self, filterFn):
-        new_obj = self.copy()
-        new_obj._filter_fn = filterFn
-        return new_obj
+        return self._with_step("filter", filterFn.to_json())
+
+    @op(
+        input_type={
+            "compFn": lambda input_types: types.Function(
+                {"row": input_types["self"].object_type}, types.List(types.Any())
+            ),
+            "columnDirs": types.List(types.String()),
+        },
+        output_type=lambda input_types: input_types["self"],
+    )
+    def sort(self, compFn, columnDirs):
+        if not (isinstance(compFn, graph.OutputNode) and compFn.from_op.name == "list"):
+            raise errors.WeaveInternalError(
+                "Can't execute SqlTable sort in the database: %s" % compFn
+            )
+        key_fns = [key_fn.to_json() for key_fn in compFn.from_op.inputs.values()]
+        return self._with_step("sort", key_fns, list(columnDirs))
+
+    @op(output_type=lambda input_types: input_types["self"])
+    def offset(self, offset: int):
+        return self._with_step("offset", int(offset))
+
+    @op(output_type=lambda input_types: input_types["self"])
+    def limit(self, limit: int):
+        return self._with_step("limit", int(limit))
 
     @op(
         input_type={
@@ -231,7 +437,121 @@ class SqlTable:
         ),
     )
     def groupby(self, group_by_fn):
-        return list_.List.groupby.resolve_fn(self._to_list_table(), group_by_fn)
+        try:
+            key = fn_to_sql(
+                self.select.selected_columns, group_by_fn, self._dialect_name
+            )
+        except _NotPushable:
+            return list_.List.groupby.resolve_fn(self._to_list_table(), group_by_fn)
+        select = self.select.add_columns(key.label(self.GROUP_KEY_LABEL))
+        rows = []
+        group_keys = []
+        for row in self._execute(select):
+            row_dict = dict(row._mapping)
+            group_keys.append(row_dict.pop(self.GROUP_KEY_LABEL))
+            rows.append(row_dict)
+        return list_.group_rows(rows, group_keys)
+
+    @op(
+        name="sqltable-toArrow",
+        output_type=lambda input_types: _arrow_weave_list_type(
+            input_types["self"].object_type
+        ),
+    )
+    def to_arrow(self):
+        return self._to_arrow()
+
+
+class _Plan(typing.NamedTuple):
+    select: typing.Any
+    # The query's sort keys and whether each is descending, so later sorts can
+    # keep them as tie breakers.
+    order_by: typing.Tuple[typing.Tuple[typing.Any, bool], ...]
+    # Whether the query has an offset or limit.
+    paged: bool
+
+
+def _extend(plan: _Plan) -> _Plan:
+    # Filters, sorts, offsets and limits must apply to the rows selected by an
+    # earlier offset or limit, so in that case we query from a subquery. The
+    # subquery's sort keys are selected too, so the outer query can keep its
+    # order.
+    if not plan.paged:
+        return plan
+    sort_labels = ["__weave_sort_%s" % i for i in range(len(plan.order_by))]
+    subquery = plan.select.add_columns(
+        *(key.label(label) for (key, _), label in zip(plan.order_by, sort_labels))
+    ).subquery()
+    order_by = tuple(
+        (subquery.c[label], desc)
+        for (_, desc), label in zip(plan.order_by, sort_labels)
+    )
+    select = sqlalchemy.select(
+        *(subquery.c[name] for name in plan.select.selected_columns.keys())
+    )
+    return _Plan(select.order_by(*_order_by_clauses(order_by)), order_by, False)
+
+
+def _step_fn_to_sql(plan: _Plan, fn_json: dict, dialect_name: str, step_name: str):
+    fn = graph.Node.node_from_json(fn_json)
+    try:
+        return fn_to_sql(plan.select.selected_columns, fn, dialect_name)
+    except _NotPushable as e:
+        raise errors.WeaveInternalError(
+            "Can't execute SqlTable %s in the database: %s" % (step_name, e)
+        )
+
+
+def _filter_step(plan: _Plan, dialect_name: str, fn_json: dict) -> _Plan:
+    plan = _extend(plan)
+    where = _step_fn_to_sql(plan, fn_json, dialect_name, "filter")
+    return _Plan(plan.select.where(where), plan.order_by, False)
+
+
+def _sort_step(
+    plan: _Plan, dialect_name: str, key_fn_jsons: list[dict], column_dirs: list[str]
+) -> _Plan:
+    plan = _extend(plan)
+    new_order_by = tuple(
+        (_step_fn_to_sql(plan, key_fn_json, dialect_name, "sort"), column_dir == "desc")
+        for key_fn_json, column_dir in zip(key_fn_jsons, column_dirs)
+    )
+    # Like a stable sort, earlier sort keys break ties.
+    order_by = (*new_order_by, *plan.order_by)
+    select = plan.select.order_by(None).order_by(*_order_by_clauses(order_by))
+    return _Plan(select, order_by, False)
+
+
+def _offset_step(plan: _Plan, dialect_name: str, offset: int) -> _Plan:
+    plan = _extend(plan)
+    return _Plan(plan.select.offset(offset), plan.order_by, True)
+
+
+def _limit_step(plan: _Plan, dialect_name: str, limit: int) -> _Plan:
+    plan = _extend(plan)
+    return _Plan(plan.select.limit(limit), plan.order_by, True)
+
+
+_PLAN_STEPS: dict[str, typing.Callable[..., _Plan]] = {
+    "filter": _filter_step,
+    "sort": _sort_step,
+    "offset": _offset_step,
+    "limit": _limit_step,
+}
+
+
+def _order_by_clauses(order_by):
+    # Match list sort, which puts None first
+    return [
+        key.desc().nulls_last() if desc else key.asc().nulls_first()
+        for key, desc in order_by
+    ]
+
+
+def _arrow_weave_list_type(object_type):
+    from ..ops_arrow import ArrowWeaveListType
+
+    return ArrowWeaveListType(object_type)
 
 
 SqlTableType.instance_class = SqlTable
@@ -276,16 +596,28 @@ def sqlconnection_tables(conn):
 #     return conn.table_names()
 
 
+def _column_type(column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return types.Any()
+    if python_type == bool:
+        return types.Boolean()
+    elif python_type in (int, float):
+        return types.Number()
+    elif python_type == str:
+        return types.String()
+    return types.Any()
+
+
+def _columns_to_type(columns):
+    return {
+        column_name: _column_type(column) for column_name, column in columns.items()
+    }
+
+
 def _table_to_type(table):
-    table_column_types = {}
-    for column_name, column in table.columns.items():
-        type_class = column.type.__class__.__name__
-        if type_class == "VARCHAR" or type_class == "TEXT":
-            table_column_type = types.String()
-        elif type_class == "INTEGER":
-            table_column_type = types.Number()
-        table_column_types[column_name] = table_column_type
-    return table_column_types
+    return _columns_to_type(table.columns)
 
 
 @op(
@@ -4,6 +4,7 @@ from .. import api as weave
 from .. import weave_types as types
 from .. import box
 from . import list_
+from . import _lookup_index
 from . import dict
 from . import number
 from . import runs
@@ -252,6 +253,48 @@ def test_lookup():
         l.lookup(0)
 
 
+def test_lookup_index():
+    rows = [{"id": i, "b": i} for i in range(100)] + [{"id": 5, "b": "dupe"}]
+    assert list_.typedict_lookup.resolve_fn(rows, 5) == {"id": 5, "b": 5}
+    assert list_.typedict_lookup.resolve_fn(rows, 100) == None
+
+    # Replacing a row through the setter updates the index
+    list_._typeddict_lookup_setter(rows, 5, {"id": 200, "b": 200})
+    assert list_.typedict_lookup.resolve_fn(rows, 200) == {"id": 200, "b": 200}
+    assert list_.typedict_lookup.resolve_fn(rows, 5) == {"id": 5, "b": "dupe"}
+
+    # Rows added behind the index's back are found too
+    rows.append({"id": 400, "b": 400})
+    assert list_.typedict_lookup.resolve_fn(rows, 400) == {"id": 400, "b": 400}
+
+
+def test_lookup_index_row_replaced(monkeypatch):
+    rows = [{"id": i, "b": i} for i in range(10)]
+    assert list_.typedict_lookup.resolve_fn(rows, 3) == {"id": 3, "b": 3}
+
+    builds = []
+    index_init = _lookup_index._Index.__init__
+
+    def record_index_init(self, arr, get_id):
+        builds.append(len(arr))
+        index_init(self, arr, get_id)
+
+    monkeypatch.setattr(_lookup_index._Index, "__init__", record_index_init)
+
+    # Misses don't rebuild the index
+    assert list_.typedict_lookup.resolve_fn(rows, "missing") == None
+    assert list_.typedict_lookup.resolve_fn(rows, "missing") == None
+    assert builds == []
+
+    # A row replaced behind the index's back, without changing the length, is
+    # noticed when its old id is looked up
+    rows[3] = {"id": "new", "b": "new"}
+    assert list_.typedict_lookup.resolve_fn(rows, 3) == None
+    assert builds == [10]
+    assert list_.typedict_lookup.resolve_fn(rows, "new") == {"id": "new", "b": "new"}
+    assert builds == [10]
+
+
 def test_cross_product():
     obj = weave.save({"a": ["x", "y", "z"], "b": [1, 2, 3]})
     cp = list_.cross_product(obj)
@@ -1,3 +1,7 @@
+import math
+
+import pytest
+
 from .. import api as weave
 from .. import weave_types as types
 from . import pandas_ as op_pandas
@@ -32,3 +36,55 @@ def test_dataframe_type():
             "loss": types.Float(),
         }
     )
+
+
+def test_dataframe_table_vectorized_ops():
+    df = pd.DataFrame(
+        {
+            "class": ["cat", "dog", None, "cat"],
+            "age": [10, 0, 3, 1],
+            "loss": [0.1, None, 0.3, 0.4],
+        }
+    )
+    df_table = op_pandas.DataFrameTable(df)
+    fn = weave.define_fn(
+        {"row": df_table.object_type},
+        lambda row: (row["age"] + 2) / row["age"],
+    ).val
+    assert op_pandas.fn_to_pandas(df, fn).tolist() == [1.2, math.inf, 5 / 3, 3.0]
+
+    fn = weave.define_fn(
+        {"row": df_table.object_type}, lambda row: row["class"] == None
+    ).val
+    filtered = df_table.filter.resolve_fn(df_table, fn)
+    assert filtered.pick.resolve_fn(filtered, "age") == [3]
+
+    fn = weave.define_fn(
+        {"row": df_table.object_type}, lambda row: row["class"].split("a")
+    ).val
+    with pytest.raises(op_pandas._NotVectorizable):
+        op_pandas.fn_to_pandas(df, fn)
+    assert df_table.map.resolve_fn(df_table, fn)[0] == ["c", "t"]
+
+    arrow_list = df_table.to_arrow.resolve_fn(df_table)
+    assert arrow_list.to_pylist_notags()[1] == {
+        "class": "dog",
+        "age": 0,
+        "loss": None,
+    }
+
+
+def test_dataframe_table_vectorized_string_contains():
+    df = pd.DataFrame({"name": ["Apple", "a.b", "xyz"]})
+    df_table = op_pandas.DataFrameTable(df)
+    fn = weave.define_fn(
+        {"row": df_table.object_type}, lambda row: row["name"].contains("a.")
+    ).val
+    # The substring is matched literally, not as a regex
+    assert op_pandas.fn_to_pandas(df, fn).tolist() == [False, True, False]
+
+    fn = weave.define_fn(
+        {"row": df_table.object_type}, lambda row: row["name"].contains("apple")
+    ).val
+    # and case sensitively
+    assert op_pandas.fn_to_pandas(df, fn).tolist() == [False, False, False]
@@ -1,13 +1,46 @@
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import concurrent.futures
 import contextlib
 import contextvars
-from typing import Optional, Callable, TypeVar, Iterator, Generator
+import importlib
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+from typing import (
+    Any,
+    Mapping,
+    Optional,
+    Callable,
+    TypeVar,
+    Iterator,
+    Generator,
+    ContextManager,
+)
 
+from . import artifact_local
+from . import box
 from . import context
+from . import context_state
+from . import errors
+from . import environment
 from . import execute
+from . import filesystem
 from . import forward_graph
 from . import memo
+from . import op_def
+from . import op_policy
+from . import ref_base
+from . import registry_mem
+from . import storage
+from . import trace_local
 from . import wandb_api
+from . import weave_types as types
+from .language_features.tagging import opdef_util
+from .language_features.tagging import process_opdef_resolve_fn
+from .language_features.tagging import tag_store
 
 # Must be power of 2
 MAX_PARALLELISM = 16
@@ -38,22 +71,23 @@ ItemType = TypeVar("ItemType")
 ResultType = TypeVar("ResultType")
 
 
-def do_in_parallel(
-    do_one: Callable[[ItemType], ResultType], items: list[ItemType]
-) -> Iterator[ResultType]:
-    parallel_budget = get_parallel_budget()
-
-    if parallel_budget <= 1:
-        return map(do_one, items)
+def thread_context_propagator(
+    remaining_budget_per_thread: int,
+) -> Callable[[], ContextManager[None]]:
+    """Capture the current execution contexts for use in worker threads.
 
+    Returns a context manager factory. Entering it in a worker thread restores
+    the captured memo, wandb_api, node result store and top level stats
+    contexts, and limits the thread to remaining_budget_per_thread.
+    """
     # Contexts aren't automatically propagated to threads, so we have to do so manually for every context
     memo_ctx = memo._memo_storage.get()
-    remaining_budget_per_thread = get_remaining_budget_per_thread(len(items))
     wandb_api_ctx = wandb_api.get_wandb_api_context()
     result_store = forward_graph.get_node_result_store()
     top_level_stats = execute.get_top_level_stats()
 
-    def do_one_with_memo_and_parallel_budget(x: ItemType) -> ResultType:
+    @contextlib.contextmanager
+    def enter_thread_contexts() -> Generator[None, None, None]:
         memo_token = memo._memo_storage.set(memo_ctx)
         thread_result_store = None
         thread_top_level_stats = None
@@ -65,7 +99,7 @@ def do_in_parallel(
                             result_store
                         ) as thread_result_store:
                             with execute.top_level_stats() as thread_top_level_stats:
-                                return do_one(x)
+                                yield
         finally:
             memo._memo_storage.reset(memo_token)
             if thread_result_store is not None:
@@ -73,6 +107,25 @@ def do_in_parallel(
             if top_level_stats is not None and thread_top_level_stats is not None:
                 top_level_stats.merge(thread_top_level_stats)
 
+    return enter_thread_contexts
+
+
+def do_in_parallel(
+    do_one: Callable[[ItemType], ResultType], items: list[ItemType]
+) -> Iterator[ResultType]:
+    parallel_budget = get_parallel_budget()
+
+    if parallel_budget <= 1:
+        return map(do_one, items)
+
+    enter_thread_contexts = thread_context_propagator(
+        get_remaining_budget_per_thread(len(items))
+    )
+
+    def do_one_with_memo_and_parallel_budget(x: ItemType) -> ResultType:
+        with enter_thread_contexts():
+            return do_one(x)
+
     return ThreadPoolExecutor(max_workers=parallel_budget).map(
         do_one_with_memo_and_parallel_budget, items
     )
@@ -83,3 +136,198 @@ def get_remaining_budget_per_thread(item_count: int) -> int:
     if item_count <= 0:
         return parallel_budget
     return max(parallel_budget // item_count, 1)
+
+
+# Ops selected by op_policy.should_run_in_process run in a pool of worker
+# processes, so CPU bound ops can use more than one core. Inputs and outputs
+# are passed between processes as local artifact refs (which store arrow data
+# as arrow files) rather than pickled python objects. Only primitive inputs
+# are passed by value. Saved inputs are deleted once no running op uses them.
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = threading.Lock()
+
+_PRIMITIVE_TYPES = (type(None), bool, int, float, str)
+
+_process_inputs_lock = threading.Lock()
+# Saved process input dirs, and how many submitted ops are using each.
+_process_inputs_in_use: dict[str, int] = {}
+
+
+def get_process_pool() -> Optional[ProcessPoolExecutor]:
+    global _process_pool
+    max_workers = environment.process_pool_workers()
+    if max_workers <= 0:
+        return None
+    with _process_pool_lock:
+        if _process_pool is None:
+            # Don't fork, the server process has many threads running.
+            _process_pool = ProcessPoolExecutor(
+                max_workers=max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _process_pool
+
+
+def _reset_process_pool(pool: ProcessPoolExecutor) -> None:
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is pool:
+            _process_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _process_input_name(val: Any) -> str:
+    # Name the saved input by its content, so the same input is only
+    # written once while it's in use. _value_id leaves out the type, but
+    # the input is read back as the type it was saved with, so we include
+    # that too.
+    hash = trace_local.new_fingerprint_hash()
+    hash.update(json.dumps(types.TypeRegistry.type_of(val).to_dict()).encode())
+    hash.update(trace_local._value_id(val).encode())
+    return f"process-input-{hash.hexdigest()}"
+
+
+def _acquire_process_input(val: Any) -> tuple[ref_base.Ref, str]:
+    """Save val for a worker process, and return its ref and dir.
+
+    The dir must be passed to _release_process_inputs when the op is done.
+    """
+    name = _process_input_name(val)
+    path = os.path.join(artifact_local.local_artifact_dir(), name)
+    # Count the use first, so the input isn't deleted while we save it.
+    with _process_inputs_lock:
+        _process_inputs_in_use[path] = _process_inputs_in_use.get(path, 0) + 1
+    ref = artifact_local.get_local_version_ref(name, "latest")
+    if ref is None:
+        ref = storage.save(val, name=name)
+    return ref, path
+
+
+def _release_process_inputs(paths: list[str]) -> None:
+    with _process_inputs_lock:
+        for path in paths:
+            count = _process_inputs_in_use[path] - 1
+            if count > 0:
+                _process_inputs_in_use[path] = count
+                continue
+            del _process_inputs_in_use[path]
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def _encode_process_inputs(
+    inputs: Mapping[str, Any]
+) -> Optional[tuple[dict[str, tuple[str, Any]], list[str]]]:
+    """Inputs to pass to a worker process, and the dirs of inputs we saved.
+
+    Returns None if the inputs can't be passed to a worker process.
+    """
+    encoded: dict[str, tuple[str, Any]] = {}
+    to_save = []
+    for name, val in inputs.items():
+        unboxed = box.unbox(val)
+        if type(unboxed) in _PRIMITIVE_TYPES:
+            encoded[name] = ("val", unboxed)
+            continue
+        ref = ref_base.get_ref(val)
+        if ref is None:
+            to_save.append(name)
+        elif isinstance(ref, artifact_local.LocalArtifactRef):
+            encoded[name] = ("ref", ref.uri)
+        else:
+            # Worker processes can only read from the local artifact dir
+            return None
+    # Only save inputs once we know every input can be passed.
+    saved_paths = []
+    for name in to_save:
+        ref, path = _acquire_process_input(inputs[name])
+        saved_paths.append(path)
+        encoded[name] = ("ref", ref.uri)
+    return encoded, saved_paths
+
+
+def run_op_in_process(
+    op_def: op_def.OpDef, inputs: Mapping[str, Any]
+) -> Optional[ref_base.Ref]:
+    """Run op_def in the process pool, and return a ref to its result.
+
+    Returns None if the op can't run in a worker process, in which case the
+    caller should run it in this process.
+    """
+    if not op_policy.should_run_in_process(op_def.simple_name):
+        return None
+    # Workers don't have the request's user context, which public servers
+    # require to use the filesystem.
+    if environment.is_public():
+        return None
+    pool = get_process_pool()
+    if pool is None:
+        return None
+    if op_def.is_async or op_def.mutation:
+        return None
+    op_module = getattr(op_def.raw_resolve_fn, "__module__", None)
+    if op_module is None or op_module == "__main__":
+        return None
+    encoded = _encode_process_inputs(inputs)
+    if encoded is None:
+        return None
+    encoded_inputs, saved_paths = encoded
+    try:
+        try:
+            future = pool.submit(
+                _run_op_in_worker,
+                filesystem.get_filesystem_dir(),
+                op_module,
+                op_def.name,
+                encoded_inputs,
+            )
+        except BaseException:
+            _release_process_inputs(saved_paths)
+            raise
+        # Delete saved inputs when the worker is done with them, which may
+        # be after we stop waiting.
+        future.add_done_callback(lambda _: _release_process_inputs(saved_paths))
+        output_uri = future.result(timeout=environment.process_pool_timeout_sec())
+    except BrokenProcessPool:
+        # A worker died (for example, out of memory). The pool can't be used
+        # again, so start a new one for the next op.
+        _reset_process_pool(pool)
+        raise errors.WeaveExecutionError(
+            f"Worker process running {op_def.name} exited unexpectedly"
+        )
+    except concurrent.futures.TimeoutError:
+        future.cancel()
+        raise errors.WeaveExecutionError(
+            f"{op_def.name} did not finish in the process pool in time"
+        )
+    output_ref = ref_base.Ref.from_str(output_uri)
+    if opdef_util.should_flow_tags(op_def):
+        # Flowed tags may hold graph dependent information, so flow them
+        # from our own inputs, as we do for run cache hits.
+        process_opdef_resolve_fn.flow_tags(
+            next(iter(inputs.values())), output_ref.get()
+        )
+    return output_ref
+
+
+def _run_op_in_worker(
+    filesystem_dir: str,
+    op_module: str,
+    op_name: str,
+    encoded_inputs: dict[str, tuple[str, Any]],
+) -> str:
+    # Workers don't have the request's user context, so point them directly
+    # at the requesting user's filesystem dir.
+    os.environ["WEAVE_LOCAL_ARTIFACT_DIR"] = filesystem_dir
+    with context_state.analytics_disabled():
+        with tag_store.isolated_tagging_context():
+            # Importing the module registers the op
+            importlib.import_module(op_module)
+            op = registry_mem.memory_registry.get_op(op_name)
+            inputs = {}
+            for name, (kind, val) in encoded_inputs.items():
+                if kind == "ref":
+                    val = ref_base.Ref.from_str(val).get()
+                inputs[name] = val
+            result = op.resolve_fn(**inputs)
+            return storage.save(result).uri
@@ -26,11 +26,20 @@ class Registry:
 
     _op_versions: typing.Dict[typing.Tuple[str, str], op_def.OpDef]
 
+    # Incremented whenever the set of registered ops changes, so that caches
+    # of dispatch results know when to drop their entries.
+    _version: int
+
     def __init__(self):
         self._types = {}
         self._ops = {}
         self._ops_by_common_name = {}
         self._op_versions = {}
+        self._version = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
 
     def register_op(self, op: op_def.OpDef):
         # Always save OpDefs any time they are declared
@@ -52,6 +61,7 @@ class Registry:
         self._ops_by_common_name.setdefault(op.common_name, {})[op.name] = op
         if version:
             self._op_versions[(op.name, version)] = op
+        self._version += 1
         return op
 
     def have_op(self, op_name: str) -> bool:
@@ -151,6 +161,7 @@ class Registry:
         if op.version is not None:
             self._op_versions.pop((name, old_version))
             self._op_versions[(new_name, op.version)] = op
+        self._version += 1
 
     # def register_type(self, type: weave_types.Type):
     #    self._types[type.name] = type
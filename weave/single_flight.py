@@ -0,0 +1,83 @@
+"""Deduplicate concurrent executions of the same work.
+
+The first caller to join the flight for a key becomes its leader and does the
+work. Callers that join while the leader is running wait for the leader's
+result instead of doing the work again. If the leader fails, waiters raise the
+leader's exception.
+"""
+
+import threading
+import typing
+
+from . import engine_trace
+
+statsd = engine_trace.statsd()  # type: ignore
+
+
+class Flight:
+    NO_RESULT = object()
+
+    def __init__(self, flights: "SingleFlight", key: typing.Hashable) -> None:
+        self._flights = flights
+        self._key = key
+        self.leader_thread = threading.get_ident()
+        self.done = threading.Event()
+        self._result: typing.Any = Flight.NO_RESULT
+        self._exception: typing.Optional[BaseException] = None
+
+    def set_result(self, result: typing.Any) -> None:
+        self._result = result
+
+    def __enter__(self) -> "Flight":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self._exception = exc_value
+        self._flights._land(self._key)
+        self.done.set()
+
+    def wait(self, timeout: typing.Optional[float] = None) -> typing.Any:
+        """Wait for the leader's result.
+
+        Returns NO_RESULT if the leader didn't set a result, if the wait timed
+        out, or if called from the leader's own thread (which would deadlock).
+        Raises the leader's exception if the leader failed.
+        """
+        if self.leader_thread == threading.get_ident():
+            return Flight.NO_RESULT
+        statsd.increment("weave.single_flight.wait")
+        if not self.done.wait(timeout):
+            statsd.increment("weave.single_flight.timeout")
+            return Flight.NO_RESULT
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._flights: dict[typing.Hashable, Flight] = {}
+
+    def join(self, key: typing.Hashable) -> typing.Tuple[Flight, bool]:
+        """Join the flight for key, starting it if none is running.
+
+        Returns the flight and whether the caller is its leader. The leader
+        must do the work inside `with flight:` and call flight.set_result().
+        Other callers should flight.wait() for the leader.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                return flight, False
+            flight = Flight(self, key)
+            self._flights[key] = flight
+            return flight, True
+
+    def _land(self, key: typing.Hashable) -> None:
+        with self._lock:
+            del self._flights[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._flights)
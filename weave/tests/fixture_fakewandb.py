@@ -8,7 +8,12 @@ import typing
 from weave import wandb_api
 from weave import util
 from .tag_test_util import op_add_tag
-from ..artifact_wandb import WandbArtifact, WeaveWBArtifactURI, WandbArtifactManifest
+from ..artifact_wandb import (
+    WandbArtifact,
+    WeaveWBArtifactURI,
+    WandbArtifactManifest,
+    build_manifest_dir_index,
+)
 from .. import wandb_client_api
 from unittest import mock
 import shutil
@@ -109,6 +114,11 @@ class FakeFilesystemManifest:
                 ]
         return []
 
+    def get_dir(self, cur_dir):
+        return build_manifest_dir_index(
+            self.get_paths_in_directory(cur_dir), self.get_entry_by_path
+        ).get(cur_dir)
+
 
 class FakeArtifactManifest:
     def __init__(self, artifact):
@@ -126,6 +136,11 @@ class FakeArtifactManifest:
             if entry.path.startswith(cur_dir):
                 yield entry.path
 
+    def get_dir(self, cur_dir):
+        return build_manifest_dir_index(
+            self.get_paths_in_directory(cur_dir), self.get_entry_by_path
+        ).get(cur_dir)
+
 
 class FakePath:
     def __init__(self, path):
@@ -312,6 +327,15 @@ class FakeIoServiceClient:
         _, netloc, path, _, _, _ = parse.urlparse(download_url)
         return os.path.join("wandb_file_manager", netloc, path.lstrip("/"))
 
+    def manifests(self, artifact_uris):
+        return [self.manifest(uri) for uri in artifact_uris]
+
+    def ensure_files(self, artifact_uris):
+        return [self.ensure_file(uri) for uri in artifact_uris]
+
+    def ensure_files_downloaded(self, download_urls):
+        return [self.ensure_file_downloaded(url) for url in download_urls]
+
 
 @dataclass
 class SetupResponse:
@@ -372,6 +396,7 @@ def setup():
 
     old_wandb_api_wandb_public_api = wandb_client_api.wandb_public_api
     wandb_client_api.wandb_public_api = wandb_public_api
+    wandb_client_api.clear_gql_clients()
 
     def get_sync_client():
         return fake_io_service_client
@@ -397,6 +422,7 @@ def teardown(setup_response: SetupResponse):
     setup_response.fake_api.clear_mock_handlers()
     setup_response.fake_io.cleanup()
     wandb_client_api.wandb_public_api = setup_response.old_wandb_api_wandb_public_api
+    wandb_client_api.clear_gql_clients()
     io_service.get_sync_client = setup_response.orig_io_service_client  # type: ignore
     wandb.Artifact = OriginalArtifactSymbol
 
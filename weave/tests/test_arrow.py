@@ -2,6 +2,7 @@ import datetime
 import pytest
 import itertools
 import hashlib
+import numpy as np
 import pyarrow as pa
 import string
 from PIL import Image
@@ -34,6 +35,7 @@ from ..tests import test_wb
 # If you're thinking of import vectorize here, don't! Put your
 # tests in test_arrow_vectorizer.py instead
 from .. import ops_arrow as arrow
+from ..ops_arrow import list_ops
 from ..ops_arrow.arrow_tags import (
     recursively_encode_pyarrow_strings_as_dictionaries,
 )
@@ -1869,3 +1871,79 @@ def test_to_compare_safe():
     a = arrow.to_arrow(l)
     safe = arrow.to_compare_safe(a)
     assert safe.to_pylist_notags() == ["__t_13-__list_-", "__t_13-a", "__t_9-5"]
+
+
+def test_arrow_lookup():
+    data = weave.save(arrow.to_arrow([{"id": str(i), "b": i} for i in range(10)]))
+    node = data.lookup("7")
+    assert node.from_op.name == "ArrowWeaveListTypedDict-lookup"
+    assert weave.use(node) == {"id": "7", "b": 7}
+    assert weave.use(data.lookup("x")) == None
+
+
+def test_arrow_lookup_tagged_ids():
+    rows = [
+        {"id": tag_store.add_tags(box.box(str(i)), {"a": i}), "b": i} for i in range(10)
+    ]
+    data = weave.save(arrow.to_arrow(rows))
+    assert weave.use(data.lookup("7"))["b"] == 7
+    assert weave.use(data.lookup("x")) == None
+
+
+def test_downsample_ops():
+    rows = [{"x": i, "y": float((i * 7) % 11)} for i in range(100)]
+    rows[50]["y"] = 100.0
+    rows[51]["y"] = None
+    node = weave.save(arrow.to_arrow(rows))
+
+    lttb = weave.use(
+        node.downsampleLTTB(lambda row: row["x"], lambda row: row["y"], 10)
+    )
+    lttb_rows = lttb.to_pylist_notags()
+    assert len(lttb_rows) == 10
+    assert lttb_rows[0] == rows[0] and lttb_rows[-1] == rows[-1]
+    # The spike is kept, and rows without y are dropped
+    assert rows[50] in lttb_rows
+    assert all(row["y"] is not None for row in lttb_rows)
+    assert [row["x"] for row in lttb_rows] == sorted(row["x"] for row in lttb_rows)
+
+    min_max = weave.use(
+        node.downsampleMinMax(lambda row: row["x"], lambda row: row["y"], 5)
+    ).to_pylist_notags()
+    assert len(min_max) <= 12
+    assert rows[50] in min_max
+    for bucket in range(5):
+        ys = [
+            row["y"]
+            for row in rows[bucket * 20 : (bucket + 1) * 20]
+            if row["y"] is not None
+        ]
+        bucket_ys = [
+            row["y"] for row in min_max if bucket * 20 <= row["x"] < (bucket + 1) * 20
+        ]
+        assert min(ys) in bucket_ys and max(ys) in bucket_ys
+
+    aggregates = weave.use(
+        node.bucketAggregate(lambda row: row["x"], lambda row: row["y"], 5)
+    ).to_pylist_notags()
+    assert len(aggregates) == 5
+    assert aggregates[2]["xMin"] == 40 and aggregates[2]["xMax"] == 59
+    assert aggregates[2]["count"] == 19
+    assert aggregates[2]["max"] == 100.0
+    ys = [row["y"] for row in rows[40:60] if row["y"] is not None]
+    assert aggregates[2]["mean"] == pytest.approx(sum(ys) / len(ys))
+
+
+@pytest.mark.parametrize("unit", ["s", "ms", "us", "ns"])
+def test_downsample_timestamp_x(unit):
+    per_ms = {"s": 1e-3, "ms": 1, "us": 1e3, "ns": 1e6}[unit]
+    values = [int(v * per_ms) for v in [1001.5, 2500.25, 3999.75]]
+    awl = arrow.ArrowWeaveList(
+        pa.array(values, pa.timestamp(unit)), types.Timestamp(), None
+    )
+    fn = weave.define_fn(
+        {"row": types.Timestamp(), "index": types.Int()}, lambda row, index: row
+    ).val
+    assert np.allclose(
+        list_ops._fn_values_as_float(awl, fn), [v / per_ms for v in values]
+    )
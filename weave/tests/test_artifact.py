@@ -1,8 +1,14 @@
+import json
+import os
+
 import pytest
 import weave
 from .. import artifact_local
 from .. import artifact_fs
+from .. import artifact_wandb
+from .. import filesystem
 from .. import storage
+from .. import wandb_file_manager
 
 from .. import ops_arrow as arrow
 
@@ -78,3 +84,65 @@ def test_local_artifact_name():
         artifact_local.LocalArtifact("a:b")
     with pytest.raises(ValueError):
         artifact_local.LocalArtifact("a..b")
+
+
+def _wandb_manifest(sizes):
+    return artifact_wandb.WandbArtifactManifest(
+        {
+            "version": 1,
+            "storagePolicy": "wandb-storage-policy-v1",
+            "storagePolicyConfig": {},
+            "contents": {
+                path: {"digest": path, "size": size} for path, size in sizes.items()
+            },
+        }
+    )
+
+
+def test_wandb_manifest_dir_index():
+    manifest = _wandb_manifest(
+        {"a.txt": 1, "d/b.txt": 2, "d/e/c.txt": 4, "d/e/f/g.txt": 8}
+    )
+    root = manifest.get_dir("")
+    assert root.size == 15
+    assert root.files == {"a.txt": "a.txt"}
+    assert root.dirs == {"d": "d/b.txt"}
+
+    d = manifest.get_dir("d")
+    assert d.size == 14
+    assert d.files == {"b.txt": "d/b.txt"}
+    assert d.dirs == {"e": "d/e/c.txt"}
+
+    e = manifest.get_dir("d/e")
+    assert e.size == 12
+    assert e.files == {"c.txt": "d/e/c.txt"}
+    assert e.dirs == {"f": "d/e/f/g.txt"}
+
+    assert manifest.get_dir("d/b.txt") is None
+    assert manifest.get_dir("x") is None
+
+
+def test_wandb_manifest_cache_shared_by_file_managers():
+    uri = artifact_wandb.WeaveWBArtifactURI(
+        "test_manifest_cache",
+        "v0",
+        entity_name="e",
+        project_name="p",
+    )
+    fs = filesystem.get_filesystem()
+    manifest_path = wandb_file_manager.manifest_path(uri)
+    fs.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with fs.open_write(manifest_path, mode="w") as f:
+        json.dump(_wandb_manifest({"a.txt": 1})._manifest_json, f)
+
+    file_man_1 = wandb_file_manager.WandbFileManager(fs, None, None)
+    file_man_2 = wandb_file_manager.WandbFileManager(fs, None, None)
+    try:
+        manifest = file_man_1.manifest(uri)
+        assert manifest.get_entry_by_path("a.txt") == {"digest": "a.txt", "size": 1}
+
+        # The second manager doesn't re-read the manifest from disk
+        os.remove(fs.path(manifest_path))
+        assert file_man_2.manifest(uri) is manifest
+    finally:
+        wandb_file_manager.get_manifest_cache().clear()
@@ -36,3 +36,36 @@ def test_lru_time_window_cache():
         ((None, "bar"), (datetime.datetime(2020, 1, 1, 0, 0, 7), "f")),
         ((None, "bar2"), (datetime.datetime(2020, 1, 1, 0, 0, 8), "h")),
     ]
+
+
+def test_lru_size_bounded_cache():
+    curtime = {"t": datetime.datetime(2020, 1, 1)}
+
+    def now_fn():
+        return curtime["t"]
+
+    c = cache.LruSizeBoundedCache(max_entries=3, max_bytes=100, now_fn=now_fn)
+    c.set("a", 1, 10)
+    c.set("b", 2, 10)
+    c.set("c", 3, 10)
+    assert c.get("a") == 1
+    # Evicts b, the least recently used entry
+    c.set("d", 4, 10)
+    assert c.get("b") is c.NOT_FOUND
+    assert [k for _, k in c._cache] == ["c", "a", "d"]
+    assert c.total_bytes == 30
+
+    # Evicts by size
+    c.set("e", 5, 80)
+    assert [k for _, k in c._cache] == ["a", "d", "e"]
+    assert c.total_bytes == 100
+
+    # Too big to cache at all
+    c.set("f", 6, 101)
+    assert c.get("f") is c.NOT_FOUND
+
+    c.set("g", 7, 5, ttl=datetime.timedelta(seconds=5))
+    assert c.get("g") == 7
+    curtime["t"] += datetime.timedelta(seconds=6)
+    assert c.get("g") is c.NOT_FOUND
+    assert c.get("e") == 5
@@ -8,6 +8,7 @@ from .. import graph
 from .. import weave_types as types
 from .. import async_demo
 from .. import compile
+from .. import compile_cache
 
 
 def test_automatic_await_compile():
@@ -199,6 +200,33 @@ def test_compile_lambda_uniqueness():
     assert count_nodes(compiled) == 15
 
 
+def test_fused_compile_passes_match_unfused():
+    assert [p.name for p in compile._FUSED_COMPILE_PASSES][:3] == [
+        "fix_calls+simple_optimizations",
+        "lambda_uniqueness",
+        "await+execute+function_calls+quote",
+    ]
+
+    fn_node = define_fn({"x": types.Number()}, lambda x: x + 1)
+    called = fn_node(make_const_node(types.Number(), 5))
+    merged = weave.ops.TypedDict.merge(
+        weave.ops.dict_(), weave.ops.dict_(a=called, b=2)
+    )
+    awaited = async_demo.slowmult(2, async_demo.slowmult(3, 4, 0.01), 0.01)
+    nodes = [merged["a"], called * 2, awaited]
+
+    unfused = nodes
+    for compile_pass in compile.COMPILE_PASSES:
+        unfused = compile_pass.compile_fn(unfused, None)
+    fused = compile._compile(nodes).unwrap()
+
+    for fused_node, unfused_node in zip(fused, unfused):
+        assert str(fused_node) == str(unfused_node)
+        assert fused_node.type == unfused_node.type
+        assert count_nodes(fused_node) == count_nodes(unfused_node)
+    assert use(nodes[:2]) == [6, 12]
+
+
 def test_compile_through_execution(user_by_api_key_in_env):
     run = wandb.init(project="project_exists")
     for i in range(10):
@@ -235,3 +263,36 @@ def test_compile_through_function_call(user_by_api_key_in_env):
     pick = called_node.pick("val")
     res = weave.use(pick)
     assert res.to_pylist_notags() == list(range(10))
+
+
+@pytest.fixture()
+def compiled_plan_cache(monkeypatch):
+    monkeypatch.setenv("WEAVE_COMPILED_PLAN_CACHE_MAX_ENTRIES", "100")
+    c = compile_cache.get_compiled_plan_cache()
+    c.clear()
+    yield c
+    c.clear()
+
+
+def test_compiled_plan_cache(compiled_plan_cache):
+    def make_node(x):
+        # Build a new graph each time, so nodes are not shared by identity
+        arr = weave.ops.make_list(
+            a=make_const_node(types.Int(), 1), b=make_const_node(types.Int(), x)
+        )
+        return arr.map(lambda row: row + 1)
+
+    compiled = compile.compile([make_node(3)])
+    assert len(compiled_plan_cache) == 1
+    assert compile.compile([make_node(3)])[0] is compiled[0]
+
+    # Different consts are compiled separately
+    assert compile.compile([make_node(4)])[0] is not compiled[0]
+    assert len(compiled_plan_cache) == 2
+
+    assert use(make_node(3)) == [2, 4]
+    assert use(make_node(4)) == [2, 5]
+
+    # Mutations can change refined types, so they clear the cache
+    weave.save([1, 2, 3])
+    assert len(compiled_plan_cache) == 0
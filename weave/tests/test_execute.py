@@ -1,12 +1,21 @@
 import typing
 import os
+import threading
+import time
 import weave
 from .. import api
 from .. import weave_types as types
 from .. import weave_internal
 from .. import ops
 from .. import execute
+from .. import forward_graph
 from .. import environment
+from .. import op_policy
+from .. import parallelism
+from .. import errors
+from .. import artifact_local
+from .. import context_state
+from .. import trace_local
 from . import test_wb
 import pytest
 
@@ -83,6 +92,75 @@ def test_execute_cache_mode_minimal_no_recursive_refinement(weave_cache_mode_min
     assert REFINE_CALLED == 5
 
 
+@pytest.fixture()
+def weave_execute_scheduler_ready(monkeypatch):
+    monkeypatch.setenv("WEAVE_EXECUTE_SCHEDULER", "ready")
+
+
+_ready_scheduler_barrier = threading.Barrier(2, timeout=10)
+
+
+@weave.op()
+def _test_execute_wait_for_other_branch(x: int) -> int:
+    _ready_scheduler_barrier.wait()
+    return x + 1
+
+
+def test_execute_ready_scheduler_runs_independent_branches(
+    weave_execute_scheduler_ready, monkeypatch
+):
+    monkeypatch.setattr(
+        op_policy, "PARALLEL_OP_NAMES", ["op-_test_execute_wait_for_other_branch"]
+    )
+    # The two calls are at different depths of the graph. The wave scheduler
+    # would run them one after the other, so they could never meet at the
+    # barrier. The ready scheduler runs the second branch while the first
+    # is still blocked.
+    one = weave_internal.make_const_node(types.Int(), 1)
+    two = weave_internal.make_const_node(types.Int(), 2)
+    left = _test_execute_wait_for_other_branch(one)
+    right = _test_execute_wait_for_other_branch(two + 1)
+    res = execute.execute_nodes([left + right, left, right], no_cache=True)
+    assert res.unwrap() == [6, 2, 4]
+
+
+@weave.op()
+def _test_execute_thread_id(x: int) -> int:
+    return threading.get_ident()
+
+
+def test_execute_ready_scheduler_runs_serial_ops_inline(
+    weave_execute_scheduler_ready, monkeypatch
+):
+    one = weave_internal.make_const_node(types.Int(), 1)
+    two = weave_internal.make_const_node(types.Int(), 2)
+    res = execute.execute_nodes(
+        [_test_execute_thread_id(one), _test_execute_thread_id(two)], no_cache=True
+    )
+    assert res.unwrap() == [threading.get_ident()] * 2
+
+    monkeypatch.setattr(op_policy, "PARALLEL_OP_NAMES", ["op-_test_execute_thread_id"])
+    res = execute.execute_nodes(
+        [_test_execute_thread_id(one), _test_execute_thread_id(two)], no_cache=True
+    )
+    assert threading.get_ident() not in res.unwrap()
+
+
+@weave.op()
+def _test_execute_ready_scheduler_raises(x: int) -> int:
+    raise ValueError("boom")
+
+
+def test_execute_ready_scheduler_propagates_errors(weave_execute_scheduler_ready):
+    ten = weave_internal.make_const_node(types.Int(), 10)
+    res = execute.execute_nodes(
+        [ten + 1, _test_execute_ready_scheduler_raises(ten) + 1], no_cache=True
+    )
+    (ok_val, ok_err), (_, failed_err) = list(res.iter_items())
+    assert ok_val == 11 and ok_err is None
+    assert isinstance(failed_err, ValueError)
+
+
 def test_we_dont_over_execute(fake_wandb):
     fake_wandb.fake_api.add_mock(test_wb.table_mock1)
     cell_node = (
@@ -196,3 +274,201 @@ def test_none_not_cached():
     )
     assert len(latest_obj) == 1  # not 2! None not cached!
     assert len(weave.versions(latest_obj)) == 1
+
+
+shared_result_cache_op_run_count = 0
+
+
+@weave.op()
+def _test_shared_result_cache_op(x: int) -> int:
+    global shared_result_cache_op_run_count
+    shared_result_cache_op_run_count += 1
+    return x * 2
+
+
+@pytest.fixture()
+def shared_result_cache(monkeypatch):
+    monkeypatch.setenv("WEAVE_SHARED_RESULT_CACHE_MAX_ENTRIES", "100")
+    c = forward_graph.get_shared_result_cache()
+    c.clear()
+    yield c
+    c.clear()
+
+
+def test_shared_result_cache_across_requests(
+    shared_result_cache, weave_cache_mode_minimal
+):
+    global shared_result_cache_op_run_count
+    shared_result_cache_op_run_count = 0
+
+    def make_node():
+        # Build a new graph each time, so nodes are not shared by identity
+        five = weave_internal.make_const_node(types.Int(), 5)
+        return _test_shared_result_cache_op(five) + 1
+
+    assert weave.use(make_node()) == 11
+    assert weave.use(make_node()) == 11
+    assert shared_result_cache_op_run_count == 1
+
+    # no_cache bypasses the shared cache
+    assert execute.execute_nodes([make_node()], no_cache=True).unwrap() == [11]
+    assert shared_result_cache_op_run_count == 2
+
+
+single_flight_op_run_count = 0
+_single_flight_op_started = threading.Event()
+_single_flight_op_release = threading.Event()
+
+
+@weave.op()
+def _test_single_flight_op(x: int) -> int:
+    global single_flight_op_run_count
+    single_flight_op_run_count += 1
+    _single_flight_op_started.set()
+    _single_flight_op_release.wait(10)
+    return x * 2
+
+
+def test_execute_single_flight():
+    from .test_single_flight import watch_flight
+
+    global single_flight_op_run_count
+    single_flight_op_run_count = 0
+    _single_flight_op_started.clear()
+    _single_flight_op_release.clear()
+
+    results = []
+
+    def use():
+        node = _test_single_flight_op(weave_internal.make_const_node(types.Int(), 5))
+        with context_state.analytics_disabled():
+            results.append(weave.use(node))
+
+    leader = threading.Thread(target=use)
+    leader.start()
+    assert _single_flight_op_started.wait(10)
+
+    # Watch the in-flight run, so we know when the second request is waiting
+    (flight,) = execute.RUN_SINGLE_FLIGHT._flights.values()
+    event = watch_flight(flight, 1)
+    follower = threading.Thread(target=use)
+    follower.start()
+    event.wait_for_waiters()
+
+    _single_flight_op_release.set()
+    leader.join()
+    follower.join()
+    assert results == [10, 10]
+    assert single_flight_op_run_count == 1
+
+
+def test_execute_single_flight_lands_on_error(monkeypatch):
+    orig_deref = execute._tag_safe_deref
+
+    def failing_deref(ref):
+        monkeypatch.setattr(execute, "_tag_safe_deref", orig_deref)
+        raise ValueError("deref failed")
+
+    monkeypatch.setattr(execute, "_tag_safe_deref", failing_deref)
+    node = _test_single_flight_op(weave_internal.make_const_node(types.Int(), 7))
+    _single_flight_op_release.set()
+    with pytest.raises(ValueError, match="deref failed"):
+        weave.use(node)
+    assert len(execute.RUN_SINGLE_FLIGHT) == 0
+    assert weave.use(node) == 14
+
+
+@weave.op()
+def _test_process_pool_op(x: int) -> list[int]:
+    if x < 0:
+        # Simulate a worker being killed
+        os._exit(1)
+    return [x, os.getpid()]
+
+
+@weave.op()
+def _test_process_pool_head_op(x: list[int]) -> list[int]:
+    return x[:2]
+
+
+@pytest.fixture()
+def process_pool_op(monkeypatch):
+    monkeypatch.setenv("WEAVE_PROCESS_POOL_WORKERS", "1")
+    monkeypatch.setattr(
+        op_policy,
+        "PROCESS_OP_NAMES",
+        ["op-_test_process_pool_op", "op-_test_process_pool_head_op"],
+    )
+
+
+def test_execute_op_in_process_pool(process_pool_op):
+    five = weave_internal.make_const_node(types.Int(), 5)
+    x, pid = weave.use(_test_process_pool_op(five))
+    assert x == 5
+    assert pid != os.getpid()
+
+
+def test_execute_op_in_process_pool_recovers_from_dead_worker(process_pool_op):
+    with pytest.raises(errors.WeaveExecutionError, match="exited unexpectedly"):
+        weave.use(
+            _test_process_pool_op(weave_internal.make_const_node(types.Int(), -1))
+        )
+    x, pid = weave.use(
+        _test_process_pool_op(weave_internal.make_const_node(types.Int(), 6))
+    )
+    assert x == 6
+    assert pid != os.getpid()
+
+
+def test_execute_op_in_process_pool_not_public(process_pool_op, monkeypatch):
+    op_def = _test_process_pool_op
+    assert parallelism.run_op_in_process(op_def, {"x": 5}) is not None
+    monkeypatch.setattr(environment, "is_public", lambda: True)
+    assert parallelism.run_op_in_process(op_def, {"x": 5}) is None
+
+
+def process_input_dirs():
+    return [
+        name
+        for name in os.listdir(artifact_local.local_artifact_dir())
+        if name.startswith("process-input-")
+    ]
+
+
+def test_process_inputs_saved_once():
+    inputs = {"a": [1, 2, 3], "b": 5}
+    encoded, paths = parallelism._encode_process_inputs(inputs)
+    assert encoded["b"] == ("val", 5)
+    encoded_again, paths_again = parallelism._encode_process_inputs(
+        {"a": [1, 2, 3], "b": 5}
+    )
+    assert encoded_again == encoded
+    assert paths_again == paths
+    name = encoded["a"][1].split("///")[1].split(":")[0]
+    versions = os.listdir(os.path.join(artifact_local.local_artifact_dir(), name))
+    assert len([v for v in versions if v != "latest"]) == 1
+
+    # Inputs are deleted once nothing uses them
+    parallelism._release_process_inputs(paths)
+    assert process_input_dirs() == [name]
+    parallelism._release_process_inputs(paths_again)
+    assert process_input_dirs() == []
+
+
+def test_process_input_name_includes_type(monkeypatch):
+    monkeypatch.setattr(trace_local, "_value_id", lambda val: "same")
+    assert parallelism._process_input_name([1, 2]) != parallelism._process_input_name(
+        ["1", "2"]
+    )
+
+
+def test_process_inputs_deleted_after_op(process_pool_op):
+    x = weave_internal.make_const_node(types.List(types.Int()), [5, 6, 7])
+    assert weave.use(_test_process_pool_head_op(x)) == [5, 6]
+    # Inputs are released by a callback which may run just after the result
+    # is returned.
+    for _ in range(100):
+        if not process_input_dirs():
+            break
+        time.sleep(0.01)
+    assert process_input_dirs() == []
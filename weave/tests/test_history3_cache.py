@@ -0,0 +1,138 @@
+import time
+
+import pytest
+
+from .. import filesystem
+
+from ..ops_domain import wb_domain_types as wdt
+from ..ops_domain.run_history import history_cache
+from ..ops_domain.run_history import history_op_common
+from ..ops_domain.run_history import run_history_v3_parquet_stream_optimized as h3
+
+
+def make_run(
+    live_data, name="run-name", run_id="run-id", parquet_urls=(), parquet_rows=0
+):
+    """A run with _step and loss history, parquet_rows of which are in the
+    files at parquet_urls."""
+    count = len(live_data) + parquet_rows
+    number_key = {"typeCounts": [{"type": "number", "count": count}]}
+    return wdt.Run.from_gql(
+        {
+            "id": run_id,
+            "name": name,
+            "project": {"name": "project-name", "entity": {"name": "entity-name"}},
+            "historyKeys": {"keys": {"_step": number_key, "loss": number_key}},
+            "sampledParquetHistory": {
+                "liveData": live_data,
+                "parquetUrls": list(parquet_urls),
+            },
+        }
+    )
+
+
+@pytest.fixture()
+def history3_cache(monkeypatch):
+    monkeypatch.setenv("WEAVE_HISTORY3_CACHE", "true")
+
+
+def cache_path(run):
+    return history_cache.cache_path(
+        run, None, history_op_common.refine_history_type(run)
+    )
+
+
+def test_history3_cache_appends_new_live_rows(history3_cache, monkeypatch):
+    rows = [{"_step": i, "loss": 1 / (i + 1)} for i in range(5)]
+    first = h3._get_history3(make_run(rows))
+    assert first.to_pylist_notags() == rows
+
+    def build_history_table(*args, **kwargs):
+        raise AssertionError("history should be read from the cache")
+
+    monkeypatch.setattr(h3, "_build_history_table", build_history_table)
+    more_rows = rows + [{"_step": 5, "loss": None}, {"_step": 6, "loss": 0.1}]
+    second = h3._get_history3(make_run(more_rows))
+    assert second.to_pylist_notags() == more_rows
+
+    path = cache_path(make_run(more_rows))
+    cached = history_cache.read(path, history_cache.parquet_key([]))
+    assert cached.live_count == 7
+    assert cached.live_step == 6
+    # The new rows were appended as a delta
+    assert cached.delta_count == 1
+    fs = filesystem.get_filesystem()
+    assert fs.exists(history_cache._delta_path(path, 1))
+
+    # If the live set changes some other way, the history is rebuilt
+    with pytest.raises(AssertionError, match="from the cache"):
+        h3._get_history3(make_run(more_rows[1:]))
+
+
+def test_history3_cache_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("WEAVE_HISTORY3_CACHE", raising=False)
+    assert cache_path(make_run([{"_step": 0, "loss": 1.0}])) is None
+
+
+def test_history3_cache_rewrites_table_after_max_deltas(history3_cache, monkeypatch):
+    monkeypatch.setattr(history_cache, "MAX_DELTAS", 2)
+    rows = [{"_step": i, "loss": float(i)} for i in range(3)]
+    h3._get_history3(make_run(rows))
+    for i in range(3, 6):
+        rows = rows + [{"_step": i, "loss": float(i)}]
+        assert h3._get_history3(make_run(rows)).to_pylist_notags() == rows
+
+    path = cache_path(make_run(rows))
+    cached = history_cache.read(path, history_cache.parquet_key([]))
+    assert cached.table.to_pylist() == rows
+    assert cached.live_count == 6
+    # Two deltas were appended, then the table was rewritten with the third
+    assert cached.delta_count == 0
+    fs = filesystem.get_filesystem()
+    assert not fs.exists(history_cache._delta_path(path, 1))
+
+    # Rows logged out of order are merged into a rewritten table
+    rows = rows + [{"_step": 10, "loss": 10.0}]
+    h3._get_history3(make_run(rows))
+    rows = rows + [{"_step": 7, "loss": 7.0}]
+    history = h3._get_history3(make_run(rows)).to_pylist_notags()
+    assert [row["_step"] for row in history] == [0, 1, 2, 3, 4, 5, 7, 10]
+
+
+def test_history3_cache_eviction(history3_cache, monkeypatch):
+    fs = filesystem.get_filesystem()
+    runs = [
+        make_run([{"_step": 0, "loss": 1.0}], name=f"run-{i}", run_id=f"run-{i}")
+        for i in range(3)
+    ]
+    paths = [cache_path(run) for run in runs]
+    for run in runs:
+        h3._get_history3(run)
+    # run-0 also gets a delta
+    h3._get_history3(
+        make_run(
+            [{"_step": 0, "loss": 1.0}, {"_step": 1, "loss": 2.0}],
+            name="run-0",
+            run_id="run-0",
+        )
+    )
+    delta_path = history_cache._delta_path(paths[0], 1)
+    assert fs.exists(delta_path)
+    now = time.time()
+    for i, path in enumerate(paths):
+        fs.touch(path, now - 100 + i)
+    fs.touch(delta_path, now - 200)
+
+    # Entries that haven't been used for longer than the max age are evicted
+    monkeypatch.setenv("WEAVE_HISTORY3_CACHE_MAX_AGE_SEC", "99.5")
+    assert history_cache.read(paths[0], history_cache.parquet_key([])) is None
+    history_cache.evict()
+    assert not fs.exists(paths[0]) and not fs.exists(delta_path)
+    assert fs.exists(paths[1]) and fs.exists(paths[2])
+
+    # Then the least recently used, until the cache is small enough
+    monkeypatch.setenv("WEAVE_HISTORY3_CACHE_MAX_AGE_SEC", "1000")
+    monkeypatch.setenv("WEAVE_HISTORY3_CACHE_MAX_BYTES", str(fs.getsize(paths[2]) + 1))
+    history_cache.evict()
+    assert not fs.exists(paths[1])
+    assert fs.exists(paths[2])
@@ -0,0 +1,58 @@
+import threading
+
+import pyarrow as pa
+from pyarrow import parquet as pq
+
+import weave
+
+from .. import io_service
+from .. import registry_mem
+from .test_history3_cache import make_run
+
+
+class RecordingIOClient:
+    def __init__(self):
+        self.fs = self
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def path(self, local_path):
+        return local_path
+
+    def ensure_files_downloaded(self, urls):
+        with self.lock:
+            self.requests.append(list(urls))
+        return urls
+
+
+def make_parquet_run(name, parquet_path, steps):
+    pq.write_table(
+        pa.table({"_step": steps, "loss": [float(s) for s in steps]}), parquet_path
+    )
+    return make_run(
+        [],
+        name=name,
+        run_id=name,
+        parquet_urls=[str(parquet_path)],
+        parquet_rows=len(steps),
+    )
+
+
+def test_mapped_history3_prefetches_parquet(tmp_path, monkeypatch):
+    client = RecordingIOClient()
+    monkeypatch.setattr(io_service, "get_sync_client", lambda: client)
+    runs = [
+        make_parquet_run(
+            f"run-{i}", tmp_path / f"run-{i}.parquet", list(range(i, i + 3))
+        )
+        for i in range(5)
+    ]
+    mapped_history = registry_mem.memory_registry.get_op(
+        "mapped_run-history3_with_columns"
+    )
+    res = weave.use(mapped_history(runs, ["loss"]))
+    assert [[row["_step"] for row in awl.to_pylist_notags()] for awl in res] == [
+        list(range(i, i + 3)) for i in range(5)
+    ]
+    # All parquet files are requested in one batch, before the runs are read.
+    assert client.requests[0] == [str(tmp_path / f"run-{i}.parquet") for i in range(5)]
@@ -0,0 +1,154 @@
+import pyarrow as pa
+from pyarrow import parquet as pq
+
+import weave
+
+from .. import compile
+from .. import weave_internal
+from .. import weave_types as types
+from ..ops_primitives import Boolean
+from ..ops_arrow import ArrowWeaveListType
+from ..ops_domain import wb_domain_types as wdt
+from ..ops_domain.run_history import history_op_common
+from ..ops_domain.run_history import run_history_v3_parquet_stream_optimized as h3
+from .test_history3_cache import make_run
+
+
+def write_history_parquet(path, steps):
+    table = pa.table({"_step": steps, "loss": [float(s) for s in steps]})
+    pq.write_table(table, path, row_group_size=100)
+    return str(path)
+
+
+def test_history_parquet_read_skips_row_groups(tmp_path, monkeypatch):
+    path = write_history_parquet(tmp_path / "history.parquet", list(range(1000)))
+    read_row_groups = []
+    orig_read_row_groups = pq.ParquetFile.read_row_groups
+
+    def record_read_row_groups(self, row_groups, *args, **kwargs):
+        read_row_groups.extend(row_groups)
+        return orig_read_row_groups(self, row_groups, *args, **kwargs)
+
+    monkeypatch.setattr(pq.ParquetFile, "read_row_groups", record_read_row_groups)
+    awl = history_op_common.awl_from_local_parquet_path(
+        path,
+        None,
+        columns=["_step", "loss"],
+        step_window=history_op_common.StepWindow(min_step=950, max_step=1200),
+    )
+    assert read_row_groups == [9]
+    assert [row["_step"] for row in awl.to_pylist_notags()] == list(range(950, 1000))
+
+
+def test_history3_step_window(tmp_path, monkeypatch):
+    path = write_history_parquet(tmp_path / "history.parquet", list(range(1000)))
+    monkeypatch.setattr(h3, "_download_parquet_files", lambda run: [path])
+    live_rows = [{"_step": s, "loss": float(s)} for s in range(1000, 1010)]
+    run = make_run(live_rows)
+
+    def steps(step_window):
+        return [
+            row["_step"]
+            for row in h3._get_history3(
+                run, ["_step", "loss"], step_window
+            ).to_pylist_notags()
+        ]
+
+    assert steps(history_op_common.StepWindow(min_step=995, max_step=1002.5)) == list(
+        range(995, 1003)
+    )
+    assert steps(history_op_common.StepWindow(row_limit=3)) == [0, 1, 2]
+    assert steps(history_op_common.StepWindow(min_step=998, row_limit=4)) == list(
+        range(998, 1002)
+    )
+    assert steps(history_op_common.StepWindow(min_step=2000)) == []
+
+    # row_limit is turned into a max_step using row group statistics
+    stats = history_op_common.parquet_step_stats(pq.read_metadata(path))
+    assert history_op_common.StepWindow(row_limit=150).bounded_by(
+        stats
+    ) == history_op_common.StepWindow(max_step=199, row_limit=150)
+
+
+def test_history_step_pushdown():
+    history_node = weave_internal.make_output_node(
+        ArrowWeaveListType(types.TypedDict({"_step": types.Int()})),
+        "run-history3_with_columns",
+        {
+            "run": weave_internal.make_const_node(types.Any(), None),
+            "history_cols": weave_internal.const(["_step"]),
+        },
+    )
+    filtered = history_node.filter(
+        lambda row: Boolean.bool_and(row["_step"] > 10, row["_step"] <= 20)
+    )
+    [pushed] = compile.compile_apply_history_step_pushdown([filtered])
+    window_node = pushed.from_op.inputs["self"]
+    assert window_node.from_op.name == "run-history3_with_columns_step_window"
+    assert window_node.from_op.inputs["min_step"].val == 10
+    assert window_node.from_op.inputs["max_step"].val == 20
+    assert window_node.from_op.inputs["row_limit"].val is None
+    assert str(pushed.from_op.inputs["filter_fn"]) == str(
+        filtered.from_op.inputs["filter_fn"]
+    )
+
+    [pushed] = compile.compile_apply_history_step_pushdown([history_node.limit(5)])
+    assert pushed.from_op.inputs["self"].from_op.inputs["row_limit"].val == 5
+
+    # Filters on other columns, and history nodes with other consumers, are
+    # left alone.
+    other_filter = history_node.filter(lambda row: row["_step"] != 3)
+    assert compile.compile_apply_history_step_pushdown([other_filter]) == [other_filter]
+    both = [history_node.limit(5), history_node.count()]
+    assert compile.compile_apply_history_step_pushdown(both) == both
+
+
+def test_history_downsample_pushdown(tmp_path, monkeypatch):
+    path = write_history_parquet(tmp_path / "history.parquet", list(range(1000)))
+    monkeypatch.setattr(h3, "_download_parquet_files", lambda run: [path])
+    run = make_run([{"_step": 1000, "loss": 0.0}], parquet_rows=1000)
+    unflattened_rows = []
+    unflatten_pa_table = h3._unflatten_pa_table
+
+    def record_unflatten_pa_table(table):
+        unflattened_rows.append(len(table))
+        return unflatten_pa_table(table)
+
+    monkeypatch.setattr(h3, "_unflatten_pa_table", record_unflatten_pa_table)
+    history_node = weave_internal.make_output_node(
+        ArrowWeaveListType(
+            types.TypedDict({"_step": types.Int(), "loss": types.Float()})
+        ),
+        "run-history3_with_columns",
+        {
+            "run": weave_internal.make_const_node(wdt.RunType, run),
+            "history_cols": weave_internal.const(["_step", "loss"]),
+        },
+    )
+    expected = weave.use(
+        weave.save(h3._get_history3(run, ["_step", "loss"])).downsampleMinMax(
+            lambda row: row["_step"], lambda row: row["loss"], 10
+        )
+    ).to_pylist_notags()
+    assert unflattened_rows == [1001]
+
+    downsampled = history_node.downsampleMinMax(
+        lambda row: row["_step"], lambda row: row["loss"], 10
+    )
+    [pushed] = compile.compile_apply_history_step_pushdown([downsampled])
+    window_node = pushed.from_op.inputs["self"]
+    assert window_node.from_op.name == "run-history3_with_columns_step_window"
+    assert window_node.from_op.inputs["sample_method"].val == "minMax"
+    assert window_node.from_op.inputs["sample_y"].val == "loss"
+    assert window_node.from_op.inputs["sample_n"].val == 10
+
+    # Only the sampled rows are unflattened and returned by the history read.
+    assert weave.use(downsampled).to_pylist_notags() == expected
+    assert unflattened_rows == [1001, len(expected)]
+    assert len(expected) <= 22
+
+    # Downsampling by anything but _step is left alone.
+    by_loss = history_node.downsampleLTTB(
+        lambda row: row["loss"], lambda row: row["_step"], 10
+    )
+    assert compile.compile_apply_history_step_pushdown([by_loss]) == [by_loss]
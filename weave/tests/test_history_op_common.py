@@ -0,0 +1,48 @@
+import pyarrow as pa
+import pytest
+
+from ..ops_domain.run_history import history_op_common
+
+
+def history_table(*segments):
+    steps = [step for segment in segments for step in segment]
+    return pa.table({"_step": steps, "i": list(range(len(steps)))})
+
+
+def test_sort_history_stitches_sorted_segments(monkeypatch):
+    def sort_by_step(table):
+        raise AssertionError("sorted segments should not be re-sorted")
+
+    monkeypatch.setattr(history_op_common, "_sort_by_step", sort_by_step)
+
+    # Already in order
+    table = history_table([0, 1, 2], [3, 4], [5])
+    assert history_op_common.sort_history_pa_table(table, [3, 2, 1]) is table
+
+    # Out of order, but not overlapping (like the live set before parquet files)
+    table = history_table([7, 8], [0, 1, 2], [3, 4, 5, 5])
+    sorted_table = history_op_common.sort_history_pa_table(table, [2, 3, 4])
+    assert sorted_table["_step"].to_pylist() == [0, 1, 2, 3, 4, 5, 5, 7, 8]
+    assert sorted_table["i"].to_pylist() == [2, 3, 4, 5, 6, 7, 8, 0, 1]
+
+
+@pytest.mark.parametrize(
+    "segments",
+    [
+        # Overlapping segments
+        [[5, 6, 7], [0, 1, 2], [3, 6, 9]],
+        # Unsorted segment
+        [[0, 1], [4, 2, 3], [8, 9]],
+        # No segments given
+        [[3, 1, 2, 0]],
+    ],
+)
+def test_sort_history_sorts_overlapping_segments(segments):
+    table = history_table(*segments)
+    sorted_table = history_op_common.sort_history_pa_table(
+        table, [len(s) for s in segments] if len(segments) > 1 else None
+    )
+    steps = [step for segment in segments for step in segment]
+    assert sorted_table["_step"].to_pylist() == sorted(steps)
+    # Rows stay together
+    assert [steps[i] for i in sorted_table["i"].to_pylist()] == sorted(steps)
@@ -1,7 +1,14 @@
 import asyncio
+import json
+import os
+import time
 import pytest
+import pyarrow as pa
+from .. import artifact_wandb
 from .. import io_service
 from .. import filesystem
+from .. import wandb_file_manager
+from .. import weave_http
 
 
 @pytest.mark.timeout(10)
@@ -62,3 +69,130 @@ async def test_io_service_sync_client(io_server_factory, process):
         assert result == 0.1
 
     assert len(server.client_response_queues) == 0
+
+
+@pytest.mark.timeout(10)
+def test_io_service_batched_download(io_server_factory):
+    server: io_service.Server = io_server_factory(False)
+
+    async def fake_ensure_file_downloaded(download_url):
+        await asyncio.sleep(0.2)
+        return download_url.replace("https://", "")
+
+    server.handle_ensure_file_downloaded = fake_ensure_file_downloaded
+    client = io_service.SyncClient(server=server, fs=filesystem.get_filesystem())
+
+    urls = [f"https://example.com/shard-{i}.parquet" for i in range(10)]
+    start = time.time()
+    results = client.ensure_files_downloaded(urls)
+    # The downloads run concurrently, not one after another (10 * 0.2s)
+    assert time.time() - start < 1
+    assert results == [f"example.com/shard-{i}.parquet" for i in range(10)]
+    assert len(server.client_response_queues) == 0
+
+
+@pytest.mark.asyncio
+async def test_http_async_download_limits(monkeypatch):
+    monkeypatch.setenv("WEAVE_HTTP_MAX_INFLIGHT_DOWNLOADS", "8")
+    monkeypatch.setenv("WEAVE_HTTP_MAX_INFLIGHT_DOWNLOADS_PER_HOST", "2")
+    async with weave_http.HttpAsync(filesystem.FilesystemAsync()) as net:
+        assert net.session.connector.limit == 8
+        assert net.session.connector.limit_per_host == 2
+
+
+async def _big_value_handler(size):
+    return b"x" * size
+
+
+async def _big_table_handler(size):
+    return pa.table({"a": list(range(size))})
+
+
+async def _big_dict_handler(size):
+    return {"data": b"x" * size}
+
+
+@pytest.mark.timeout(20)
+def test_io_service_shared_memory_response(monkeypatch):
+    monkeypatch.setenv("WEAVE_IO_SERVICE_SHARED_MEMORY_MIN_BYTES", "1024")
+    server = io_service.Server(process=True)
+    server.register_handler_fn("big_value", _big_value_handler)
+    server.register_handler_fn("big_table", _big_table_handler)
+    server.register_handler_fn("big_dict", _big_dict_handler)
+    server.start()
+    try:
+        client = io_service.SyncClient(server=server, fs=filesystem.get_filesystem())
+        shm_dir = "/dev/shm"
+        before = set(os.listdir(shm_dir)) if os.path.isdir(shm_dir) else set()
+        assert client.request("big_value", 10) == b"x" * 10
+        assert client.request("big_value", 1024 * 1024) == b"x" * 1024 * 1024
+        table = client.request("big_table", 10000)
+        assert table.equals(pa.table({"a": list(range(10000))}))
+        # values without a known size are passed through the queue
+        assert client.request("big_dict", 1024 * 1024) == {"data": b"x" * 1024 * 1024}
+        # The segment is freed once the response is loaded
+        if os.path.isdir(shm_dir):
+            assert set(os.listdir(shm_dir)) == before
+    finally:
+        server.shutdown()
+
+
+def test_encode_process_response_value():
+    assert io_service.encode_process_response_value({"a": 1}, 1) == {"a": 1}
+    assert io_service.encode_process_response_value(b"xx", 4) == b"xx"
+    encoded = io_service.encode_process_response_value(b"xxxx", 4)
+    assert isinstance(encoded, io_service.SharedMemoryValue)
+    assert encoded.load() == b"xxxx"
+
+
+@pytest.mark.timeout(20)
+def test_io_service_shared_memory_manifest(monkeypatch):
+    monkeypatch.setenv("WEAVE_IO_SERVICE_SHARED_MEMORY_MIN_BYTES", "4096")
+    manifest_json = {
+        "version": 1,
+        "storagePolicy": "wandb-storage-policy-v1",
+        "storagePolicyConfig": {},
+        "contents": {
+            f"dir/file-{i}.txt": {"digest": f"digest-{i}", "size": i}
+            for i in range(100)
+        },
+    }
+    uris = [
+        artifact_wandb.WeaveWBArtifactURI.parse(
+            f"wandb-artifact:///entity/project/{name}:v0"
+        )
+        for name in ["big", "small"]
+    ]
+    fs = filesystem.get_filesystem()
+    with fs.open_write(wandb_file_manager.manifest_path(uris[0]), "w") as f:
+        json.dump(manifest_json, f)
+    small_manifest_json = dict(manifest_json, contents={})
+    with fs.open_write(wandb_file_manager.manifest_path(uris[1]), "w") as f:
+        json.dump(small_manifest_json, f)
+
+    loaded = []
+    load = io_service.SharedMemoryValue.load
+
+    def recording_load(self):
+        loaded.append(self.kind)
+        return load(self)
+
+    monkeypatch.setattr(io_service.SharedMemoryValue, "load", recording_load)
+    server = io_service.Server(process=True)
+    server.start()
+    try:
+        client = io_service.SyncClient(server=server, fs=fs)
+        manifest = client.manifest(uris[0])
+        assert isinstance(manifest, artifact_wandb.WandbArtifactManifest)
+        assert manifest._manifest_json == manifest_json
+        assert loaded == ["manifest"]
+
+        manifests = client.manifests(uris)
+        assert [m._manifest_json for m in manifests] == [
+            manifest_json,
+            small_manifest_json,
+        ]
+        # Only the big manifest goes through shared memory
+        assert loaded == ["manifest", "manifest"]
+    finally:
+        server.shutdown()
@@ -7,6 +7,8 @@ from ..dispatch import _dispatch_first_arg, _resolve_op_ambiguity
 from .. import context_state as _context
 from .. import weave_internal
 from .. import graph
+from .. import dispatch
+from .. import weave_types as types
 
 _loading_builtins_token = _context.set_loading_built_ins()
 
@@ -200,3 +202,28 @@ def test_get_op_for_inputs(name, first_arg_type, exp_op_name):
         ).name
         == exp_op_name
     )
+
+
+def test_dispatch_index():
+    index = dispatch.get_dispatch_index()
+    input_types = {"x": types.Int(), "y": types.Int()}
+    op = dispatch.get_op_for_inputs("number-special_mult", input_types)
+    assert op.name == "number-special_mult"
+    assert index.signature_op("number-special_mult", input_types) is op
+    assert dispatch.get_op_for_inputs("number-special_mult", input_types) is op
+
+    # Registering an op drops cached results, so it can be dispatched to
+    assert dispatch._dispatch_first_arg("dispatch_index_test", types.Int()) == []
+    token = _context.set_loading_built_ins()
+    try:
+
+        @weave.op(name="dispatch_index_test")
+        def dispatch_index_test(x: int) -> int:
+            return x
+
+    finally:
+        _context.clear_loading_built_ins(token)
+    assert index.signature_op("number-special_mult", input_types) is None
+    assert [
+        o.name for o in dispatch._dispatch_first_arg("dispatch_index_test", types.Int())
+    ] == ["dispatch_index_test"]
@@ -1,5 +1,8 @@
+import typing
+
 import numpy as np
 import pytest
+import scipy.sparse
 
 from .. import errors
 from ..ops_primitives import projection_utils
@@ -21,3 +24,140 @@ def test_projection_timeout_error_propagation():
         projection_utils.perform_2D_projection_with_timeout(
             embeddings, "pca", {}, timeout=1e4
         )
+
+
+@pytest.fixture()
+def projection_cache(monkeypatch):
+    monkeypatch.setenv("WEAVE_PROJECTION_CACHE_MAX_ENTRIES", "64")
+    monkeypatch.setattr(projection_utils, "_projection_cache", None)
+    projection_utils.clear_projection_cache()
+    yield
+    projection_utils.clear_projection_cache()
+
+
+def test_projection_cache_disabled_by_default(monkeypatch):
+    monkeypatch.delenv("WEAVE_PROJECTION_CACHE_MAX_ENTRIES", raising=False)
+    assert projection_utils.get_projection_cache() is None
+
+
+def test_projection_cache_skips_object_arrays(projection_cache):
+    embeddings = np.empty((3, 2), dtype=object)
+    embeddings[:] = 1.0
+    assert projection_utils._fingerprint(embeddings) is None
+    fitted = projection_utils.fit_2D_projection(np.ones((3, 2)), "pca", {})
+    projection_utils.cache_2D_projection(embeddings, "pca", {}, fitted)
+    assert projection_utils.cached_2D_projection(embeddings, "pca", {}) is None
+
+
+def test_projection_cache(projection_cache, monkeypatch):
+    projection_utils.clear_projection_cache()
+    fit_calls = []
+    fit_2D_projection = projection_utils.fit_2D_projection
+
+    def counting_fit_2D_projection(*args):
+        fit_calls.append(args)
+        return fit_2D_projection(*args)
+
+    monkeypatch.setattr(
+        projection_utils, "fit_2D_projection", counting_fit_2D_projection
+    )
+    rng = np.random.RandomState(0)
+    embeddings = rng.normal(0, 1, (100, 8))
+    result = projection_utils.perform_2D_projection_with_timeout(
+        embeddings, "pca", {}, timeout=None
+    )
+    result2 = projection_utils.perform_2D_projection_with_timeout(
+        embeddings.copy(), "pca", {}, timeout=None
+    )
+    assert len(fit_calls) == 1
+    assert (result == result2).all()
+
+    # Appended rows are projected with the fitted model
+    more_embeddings = np.concatenate([embeddings, rng.normal(0, 1, (10, 8))])
+    result3 = projection_utils.perform_2D_projection_with_timeout(
+        more_embeddings, "pca", {}, timeout=None
+    )
+    assert len(fit_calls) == 1
+    assert (result3[:100] == result).all()
+    assert np.allclose(
+        result3[100:],
+        projection_utils.fit_2D_projection_pca(embeddings, {}).model.transform(
+            more_embeddings[100:]
+        ),
+    )
+
+    projection_utils.clear_projection_cache()
+
+
+def test_projection_cache_transform_timeout(projection_cache):
+    projection_utils.clear_projection_cache()
+    rng = np.random.RandomState(0)
+    embeddings = rng.normal(0, 1, (100, 8))
+    projection_utils.perform_2D_projection_with_timeout(
+        embeddings, "pca", {}, timeout=None
+    )
+
+    # Projecting appended rows with the cached model is bounded by the timeout
+    more_embeddings = np.concatenate([embeddings, rng.normal(0, 1, (10, 8))])
+    result = projection_utils.perform_2D_projection_with_timeout(
+        more_embeddings, "pca", {}, timeout=1e-6
+    )
+    assert np.isclose(result, 0).all()
+    result = projection_utils.perform_2D_projection_with_timeout(
+        more_embeddings, "pca", {}, timeout=1e4
+    )
+    assert not np.isclose(result, 0).all()
+
+    projection_utils.clear_projection_cache()
+
+
+def test_projection_cache_skips_big_models(projection_cache, monkeypatch):
+    monkeypatch.setenv("WEAVE_PROJECTION_CACHE_MAX_BYTES", "5000")
+    monkeypatch.setattr(projection_utils, "_projection_cache", None)
+    projection_utils.clear_projection_cache()
+    rng = np.random.RandomState(0)
+    embeddings = rng.normal(0, 1, (100, 500))
+    fitted = projection_utils.fit_2D_projection(embeddings, "pca", {})
+    assert (
+        fitted.model_nbytes
+        >= fitted.model.components_.nbytes + fitted.model.mean_.nbytes
+    )
+    assert fitted.model_nbytes > 5000
+
+    # The model is dropped from the cache, but the projection is kept
+    for timeout in [None, 1e4]:
+        projection_utils.clear_projection_cache()
+        projection_utils.perform_2D_projection_with_timeout(
+            embeddings, "pca", {}, timeout=timeout
+        )
+        cached = projection_utils.get_projection_cache().get(
+            (
+                projection_utils._options_key("pca", {}),
+                projection_utils._fingerprint(embeddings),
+            )
+        )
+        assert cached.model is None
+        assert (cached.projection == fitted.projection).all()
+
+    projection_utils.clear_projection_cache()
+
+
+def test_model_nbytes_counts_nested_arrays():
+    class Tree(typing.NamedTuple):
+        indices: np.ndarray
+
+    class Model:
+        def __init__(self):
+            self.graph_ = scipy.sparse.random(100, 100, density=0.1, format="csr")
+            self._raw_data = np.zeros((100, 8))
+            self._rp_forest = [Tree(np.zeros(50, dtype=np.int64))]
+            self._same_data = self._raw_data
+
+    model = Model()
+    assert projection_utils._model_nbytes(model) == (
+        model.graph_.data.nbytes
+        + model.graph_.indices.nbytes
+        + model.graph_.indptr.nbytes
+        + model._raw_data.nbytes
+        + 50 * 8
+    )
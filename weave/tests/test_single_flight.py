@@ -0,0 +1,100 @@
+import threading
+
+import pytest
+
+from .. import single_flight
+
+
+class WatchedEvent(threading.Event):
+    """Event that lets tests wait until threads are blocked on it."""
+
+    def __init__(self, n_waiters: int) -> None:
+        super().__init__()
+        self._waiters = threading.Semaphore(0)
+        self._n_waiters = n_waiters
+
+    def wait(self, timeout=None):
+        self._waiters.release()
+        return super().wait(timeout)
+
+    def wait_for_waiters(self) -> None:
+        for _ in range(self._n_waiters):
+            assert self._waiters.acquire(timeout=10)
+
+
+def watch_flight(flight: single_flight.Flight, n_waiters: int) -> WatchedEvent:
+    event = WatchedEvent(n_waiters)
+    flight.done = event
+    return event
+
+
+def test_single_flight_waiters_share_leader_result():
+    flights = single_flight.SingleFlight()
+    flight, is_leader = flights.join("k")
+    assert is_leader
+    event = watch_flight(flight, 3)
+
+    results = []
+
+    def wait():
+        waiter_flight, is_leader = flights.join("k")
+        assert not is_leader
+        results.append(waiter_flight.wait(10))
+
+    with flight:
+        waiters = [threading.Thread(target=wait) for _ in range(3)]
+        for t in waiters:
+            t.start()
+        event.wait_for_waiters()
+        # Nested calls from the leader's thread don't wait on themselves
+        nested_flight, is_leader = flights.join("k")
+        assert not is_leader
+        assert nested_flight.wait(10) is single_flight.Flight.NO_RESULT
+        # Other keys have their own flights
+        other_flight, is_leader = flights.join("other")
+        assert is_leader
+        with other_flight:
+            pass
+        flight.set_result(5)
+    for t in waiters:
+        t.join()
+    assert results == [5, 5, 5]
+    assert len(flights) == 0
+
+
+def test_single_flight_propagates_errors():
+    flights = single_flight.SingleFlight()
+    flight, _ = flights.join("k")
+    event = watch_flight(flight, 1)
+
+    errors = []
+
+    def wait():
+        try:
+            flights.join("k")[0].wait(10)
+        except ValueError as e:
+            errors.append(e)
+
+    waiter = threading.Thread(target=wait)
+    with pytest.raises(ValueError):
+        with flight:
+            waiter.start()
+            event.wait_for_waiters()
+            raise ValueError("leader failed")
+    waiter.join()
+    assert len(errors) == 1
+    assert len(flights) == 0
+
+
+def test_single_flight_timeout():
+    flights = single_flight.SingleFlight()
+    flight, _ = flights.join("k")
+    with flight:
+        result = []
+        t = threading.Thread(
+            target=lambda: result.append(flights.join("k")[0].wait(0.01))
+        )
+        t.start()
+        t.join()
+        assert result == [single_flight.Flight.NO_RESULT]
+        flight.set_result(1)
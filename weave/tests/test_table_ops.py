@@ -10,6 +10,7 @@ from .. import weave_internal
 from .. import graph
 from .. import box
 from ..ops_domain import table as table_ops
+from ..ops_primitives import sql as ops_sql
 
 from . import weavejs_ops
 
@@ -181,6 +182,72 @@ def test_map(table_type):
     assert weave.use(mapped[0]) == 280
 
 
+@pytest.mark.parametrize("table_type", ["list", "pandas", "sql"])
+def test_filter_expressions(table_type):
+    table = get_test_table(table_type)
+    filtered = table.filter(
+        lambda row: ops.Boolean.bool_or(
+            ops.Boolean.bool_and(row["sugars"] / 2 > 5, row["mfr"] == "K"),
+            row["name"].startswith("Cinnamon"),
+        )
+    )
+    assert weave.use(filtered.count()) == 9
+    assert weave.use(filtered.map(lambda row: row["name"].lower())[0]) == "apple jacks"
+
+
+@pytest.mark.parametrize("table_type", ["list", "pandas", "sql"])
+def test_sort_offset_limit(table_type):
+    table = get_test_table(table_type)
+    sorted_table = table.sort(
+        lambda row: ops.make_list(a=row["sugars"], b=row["name"]), ["desc", "asc"]
+    )
+    assert list(weave.use(sorted_table.limit(3).pick("name"))) == [
+        "Golden Crisp",
+        "Smacks",
+        "Apple Jacks",
+    ]
+    # The filter applies to the rows selected by offset and limit
+    node = sorted_table.offset(1).limit(10).filter(lambda row: row["calories"] > 110)
+    assert list(weave.use(node.pick("name"))) == [
+        "Post Nat. Raisin Bran",
+        "Total Raisin Bran",
+        "Mueslix Crispy Blend",
+        "Cap'n'Crunch",
+    ]
+    # Sorting keeps earlier sorts as tie breakers
+    node = sorted_table.offset(1).limit(10)
+    node = node.sort(lambda row: ops.make_list(a=row["calories"]), ["asc"]).limit(4)
+    assert list(weave.use(node.pick("name"))) == [
+        "Smacks",
+        "Apple Jacks",
+        "Cocoa Puffs",
+        "Count Chocula",
+    ]
+
+
+def test_sql_pushdown():
+    table = weave.use(get_test_table("sql"))
+    columns = table.select.selected_columns
+    fn = weave.define_fn(
+        {"row": weave.types.TypedDict({})}, lambda row: row["potass"] + 1 > 280
+    ).val
+    assert str(ops_sql.fn_to_sql(columns, fn, "sqlite")) == (
+        "cereal.potass + :param_1 > :param_2"
+    )
+
+    # Functions that can't be executed in the database fall back to python
+    fn = weave.define_fn(
+        {"row": weave.types.TypedDict({})}, lambda row: row["name"].split(" ")
+    ).val
+    with pytest.raises(ops_sql._NotPushable):
+        ops_sql.fn_to_sql(columns, fn, "sqlite")
+    assert table.map.resolve_fn(table, fn)[0] == ["100%", "Bran"]
+
+    arrow_list = table.to_arrow.resolve_fn(table)
+    assert len(arrow_list) == 77
+    assert arrow_list._index(0)["name"] == "100% Bran"
+
+
 @weave.op(
     name="test_table_ops-op_list_table",
     input_type={"n": types.Int()},
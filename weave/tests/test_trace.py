@@ -50,3 +50,32 @@ def test_trace():
     add_run = trace.get_obj_creator(mult_run.inputs["lhs"])
     assert add_run.op_name == "number-add"
     assert add_run.inputs == {"lhs": 9, "rhs": 3}
+
+
+def test_value_id_fingerprints():
+    import pyarrow as pa
+    from .. import box
+    from .. import trace_local
+    from ..language_features.tagging import tag_store
+    from ..ops_arrow import ArrowWeaveList
+
+    assert trace_local._value_id(5) == trace_local._value_id(box.box(5))
+    assert trace_local._value_id(5) != trace_local._value_id(5.0)
+    assert trace_local._value_id(True) != trace_local._value_id(1)
+    assert trace_local._value_id([1, {"a": "x"}]) == trace_local._value_id(
+        [1, {"a": "x"}]
+    )
+    assert trace_local._value_id([1, {"a": "x"}]) != trace_local._value_id(
+        [1, {"a": "y"}]
+    )
+
+    # Equal arrow data hashes the same, even when sliced
+    awl = ArrowWeaveList(pa.array([1, 2, 3]))
+    sliced_awl = ArrowWeaveList(pa.array([0, 1, 2, 3]).slice(1))
+    other_awl = ArrowWeaveList(pa.array([1, 2, 4]))
+    assert trace_local._value_id(awl) == trace_local._value_id(sliced_awl)
+    assert trace_local._value_id(awl) != trace_local._value_id(other_awl)
+
+    # Tags are part of the fingerprint
+    tagged = tag_store.add_tags(box.box({"a": 1}), {"run": "x"})
+    assert trace_local._value_id(tagged) != trace_local._value_id({"a": 1})
@@ -0,0 +1,252 @@
+import multiprocessing
+import os
+import sqlite3
+import time
+
+import pytest
+
+import weave
+from .. import artifact_local
+from .. import trace_local_index
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _make_output(artifact_dir, name, size):
+    d = os.path.join(artifact_dir, name, "v1")
+    os.makedirs(d)
+    with open(os.path.join(d, "obj.json"), "wb") as f:
+        f.write(b"x" * size)
+
+
+def test_run_index_lru_eviction(tmp_path):
+    clock = FakeClock()
+    index = trace_local_index.RunIndex(str(tmp_path), max_bytes=250, now_fn=clock)
+    for i in range(3):
+        _make_output(str(tmp_path), f"run-op-{i}-output", 100)
+    index.put(
+        "0",
+        "op",
+        "local-artifact:///run-op-0-output:v1/obj",
+        artifact_name="run-op-0-output",
+    )
+    clock.now += 1
+    index.put(
+        "1",
+        "op",
+        "local-artifact:///run-op-1-output:v1/obj",
+        artifact_name="run-op-1-output",
+    )
+    clock.now += 1
+    assert index.get("0") is not None
+    clock.now += 1
+    # Over max_bytes, 1 is least recently used
+    index.put(
+        "2",
+        "op",
+        "local-artifact:///run-op-2-output:v1/obj",
+        artifact_name="run-op-2-output",
+    )
+    assert index.get("1") is None
+    assert index.get("0") is not None
+    assert index.get("2") is not None
+    assert index.total_bytes() == 200
+
+    # Evicted outputs are only deleted by compaction
+    assert os.path.exists(tmp_path / "run-op-1-output")
+    assert index.compact() == 1
+    assert not os.path.exists(tmp_path / "run-op-1-output")
+    assert os.path.exists(tmp_path / "run-op-0-output")
+    index.close()
+
+
+def test_run_index_age_eviction(tmp_path):
+    clock = FakeClock()
+    index = trace_local_index.RunIndex(
+        str(tmp_path), max_bytes=10000, max_age_sec=60, now_fn=clock
+    )
+    # Unowned outputs are never deleted
+    index.put("0", "op", "local-artifact:///shared:v1/obj")
+    clock.now += 30
+    index.put("1", "op", "local-artifact:///shared:v1/obj")
+    clock.now += 40
+    assert index.evict() == 1
+    assert index.get("0") is None
+    assert index.get("1") is not None
+    assert index.compact() == 0
+    index.close()
+
+
+run_index_op_run_count = 0
+
+
+@weave.op()
+def _test_run_index_op(x: int) -> list[int]:
+    global run_index_op_run_count
+    run_index_op_run_count += 1
+    return [x, x * 2]
+
+
+@pytest.fixture()
+def trace_cache_index(monkeypatch):
+    monkeypatch.setenv("WEAVE_TRACE_CACHE_INDEX", "true")
+    yield
+
+
+def test_trace_cache_index_execute(trace_cache_index):
+    global run_index_op_run_count
+    run_index_op_run_count = 0
+
+    assert weave.use(_test_run_index_op(5)) == [5, 10]
+    assert weave.use(_test_run_index_op(5)) == [5, 10]
+    assert run_index_op_run_count == 1
+
+    # The run is recorded in the index, only the output is saved as an
+    # artifact.
+    artifact_dir = artifact_local.local_artifact_dir()
+    names = os.listdir(artifact_dir)
+    assert trace_local_index.INDEX_FILE_NAME in names
+    run_names = [n for n in names if n.startswith("run-op-_test_run_index_op")]
+    assert len(run_names) == 1
+    assert run_names[0].endswith("-output")
+
+    # If the output is deleted, the op runs again.
+    index = trace_local_index.get_run_index(artifact_dir)
+    index.max_bytes = 0
+    index.compact()
+    assert not os.path.exists(os.path.join(artifact_dir, run_names[0]))
+    assert weave.use(_test_run_index_op(5)) == [5, 10]
+    assert run_index_op_run_count == 2
+
+
+def test_run_index_compact_skips_recomputed_outputs(tmp_path):
+    clock = FakeClock()
+    index = trace_local_index.RunIndex(str(tmp_path), max_bytes=150, now_fn=clock)
+    for i in range(2):
+        _make_output(tmp_path, f"run-op-{i}-output", 100)
+        index.put(
+            str(i),
+            "op",
+            f"local-artifact:///run-op-{i}-output:v1/obj",
+            artifact_name=f"run-op-{i}-output",
+        )
+        clock.now += 1
+    assert index.get("0") is None
+
+    # The evicted run is recomputed before compaction runs
+    index.put(
+        "0",
+        "op",
+        "local-artifact:///run-op-0-output:v1/obj",
+        artifact_name="run-op-0-output",
+    )
+    index.compact()
+    assert os.path.exists(tmp_path / "run-op-0-output")
+    index.close()
+
+
+def test_run_index_compact_skips_outputs_saved_before_put(tmp_path):
+    clock = FakeClock()
+    index = trace_local_index.RunIndex(str(tmp_path), max_bytes=150, now_fn=clock)
+    for i in range(2):
+        _make_output(tmp_path, f"run-op-{i}-output", 100)
+        index.put(
+            str(i),
+            "op",
+            f"local-artifact:///run-op-{i}-output:v1/obj",
+            artifact_name=f"run-op-{i}-output",
+        )
+        clock.now += 1
+    assert index.get("0") is None
+
+    # The evicted run is recomputed and saves its output, but compaction runs
+    # before put() registers it.
+    time.sleep(0.01)
+    os.makedirs(tmp_path / "run-op-0-output" / "v2")
+    index.compact()
+    assert os.path.exists(tmp_path / "run-op-0-output" / "v2")
+    index.put(
+        "0",
+        "op",
+        "local-artifact:///run-op-0-output:v2/obj",
+        artifact_name="run-op-0-output",
+    )
+    assert index.get("0") is not None
+    index.close()
+
+
+def _compact_in_process(artifact_dir, started):
+    index = trace_local_index.RunIndex(artifact_dir, max_bytes=150)
+    started.set()
+    index.compact()
+
+
+def test_run_index_compact_waits_for_other_processes(tmp_path):
+    index = trace_local_index.RunIndex(str(tmp_path), max_bytes=150)
+    for i in range(2):
+        _make_output(tmp_path, f"run-op-{i}-output", 100)
+        index.put(
+            str(i),
+            "op",
+            f"local-artifact:///run-op-{i}-output:v1/obj",
+            artifact_name=f"run-op-{i}-output",
+        )
+    index.close()
+
+    # Another process holds a write transaction, like a put() in progress
+    conn = sqlite3.connect(
+        str(tmp_path / trace_local_index.INDEX_FILE_NAME), isolation_level=None
+    )
+    conn.execute("BEGIN IMMEDIATE")
+    mp_context = multiprocessing.get_context("spawn")
+    started = mp_context.Event()
+    proc = mp_context.Process(target=_compact_in_process, args=(str(tmp_path), started))
+    proc.start()
+    try:
+        assert started.wait(30)
+        proc.join(1)
+        assert proc.is_alive()
+        assert os.path.exists(tmp_path / "run-op-0-output")
+    finally:
+        conn.execute("COMMIT")
+        conn.close()
+    proc.join(30)
+    assert proc.exitcode == 0
+    assert not os.path.exists(tmp_path / "run-op-0-output")
+
+
+def test_run_index_batches_access_times(tmp_path):
+    clock = FakeClock()
+    index = trace_local_index.RunIndex(str(tmp_path), max_bytes=250, now_fn=clock)
+    for i in range(2):
+        _make_output(tmp_path, f"run-op-{i}-output", 100)
+        index.put(
+            str(i),
+            "op",
+            f"local-artifact:///run-op-{i}-output:v1/obj",
+            artifact_name=f"run-op-{i}-output",
+        )
+        clock.now += 1
+    assert index.get("0") is not None
+    # Not written until eviction needs it
+    assert index._conn.execute(
+        "SELECT last_access FROM runs WHERE run_key = '0'"
+    ).fetchone() == (1000.0,)
+
+    # run 0 was used more recently than run 1, so run 1 is evicted
+    _make_output(tmp_path, "run-op-2-output", 100)
+    index.put(
+        "2",
+        "op",
+        "local-artifact:///run-op-2-output:v1/obj",
+        artifact_name="run-op-2-output",
+    )
+    assert index.get("1") is None
+    assert index.get("0") is not None
+    index.close()
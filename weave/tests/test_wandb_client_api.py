@@ -0,0 +1,40 @@
+from unittest import mock
+
+from .. import wandb_client_api
+
+
+def test_gql_client_shared_per_credentials(monkeypatch):
+    created = []
+
+    def wandb_public_api():
+        api = mock.Mock()
+        created.append(api)
+        return api
+
+    monkeypatch.setattr(wandb_client_api, "wandb_public_api", wandb_public_api)
+    wandb_client_api.clear_gql_clients()
+    try:
+        client = wandb_client_api.wandb_gql_client()
+        assert wandb_client_api.wandb_gql_client() is client
+        assert len(created) == 1
+
+        wandb_client_api.set_wandb_thread_local_api_settings("other-key", None, None)
+        other_client = wandb_client_api.wandb_gql_client()
+        assert other_client is not client
+        assert len(created) == 2
+    finally:
+        wandb_client_api.reset_wandb_thread_local_api_settings()
+        wandb_client_api.clear_gql_clients()
+
+
+def test_gql_query_parsed_once(monkeypatch):
+    query_str = "query TestParsedOnce { viewer { id } }"
+    client = mock.Mock()
+    client.execute.return_value = {"viewer": {"id": "1"}}
+    monkeypatch.setattr(wandb_client_api, "wandb_gql_client", lambda: client)
+
+    assert wandb_client_api.wandb_gql_query(query_str) == {"viewer": {"id": "1"}}
+    wandb_client_api.wandb_gql_query(query_str)
+    first_query = client.execute.call_args_list[0].args[0]
+    assert client.execute.call_args_list[1].args[0] is first_query
+    assert first_query is wandb_client_api.parse_gql(query_str)
@@ -1,9 +1,14 @@
+import os
+
 import wandb
 import weave
+from weave import errors
+from weave import filesystem
 from weave.language_features.tagging import make_tag_getter_op
 from weave.language_features.tagging.tagged_value_type import TaggedValueType
 from weave.ops_domain.wandb_domain_gql import _make_alias
 from weave.ops_domain import wbmedia
+from weave.ops_domain import table as table_ops
 import numpy as np
 from weave.ops_arrow.list_ops import filter
 from weave.weave_internal import make_const_node
@@ -73,6 +78,23 @@ def test_wb_partitioned_table(fake_wandb):
     assert weave.use(cell_node) == {"a": 1.0, "b": 2.0, "c": 3.0}
 
 
+def test_wb_partitioned_table_prefetch_failure(fake_wandb, monkeypatch):
+    prefetched = []
+
+    def failing_ensure_files(artifact_uris):
+        prefetched.extend(artifact_uris)
+        raise errors.WeaveInternalError("prefetch failed")
+
+    monkeypatch.setattr(fake_wandb.fake_io, "ensure_files", failing_ensure_files)
+    art_node = use_static_artifact_node(
+        fake_wandb, collection_name="partitioned_table_artifact"
+    )
+    rows_node = art_node.file("table.partitioned-table.json").partitionedTable().rows()
+    # Parts are read one by one when the prefetch fails
+    assert weave.use(rows_node.count()) == 3
+    assert len(prefetched) > 0
+
+
 def test_convert_optional_list_cell(fake_wandb):
     tab = wandb.Table(columns=["a"])
     tab.add_data([wandb.Html("<p>hello</p>")])
@@ -378,3 +400,27 @@ def test_symbols_in_name(fake_wandb):
     assert weave.use(table_1_rows).to_pylist_notags() == [
         dict(zip(columns, row)) for row in data
     ]
+
+
+def test_table_arrow_cache(fake_wandb, monkeypatch):
+    table = wandb.Table(
+        columns=["id", "image", "score"],
+        data=[[1, _quick_image(1), 0.5], [2, _quick_image(2), None]],
+    )
+    art = wandb.Artifact("test_name", "test_type")
+    art.add(table, "table")
+    art_node = fake_wandb.mock_artifact_as_node(art)
+    file = weave.use(art_node.file("table.table.json"))
+
+    decoded = table_ops._get_table_like_awl_from_file(file).awl
+    cache_path = table_ops._table_arrow_cache_path(file)
+    assert os.path.exists(filesystem.get_filesystem().path(cache_path))
+
+    # The second load reads the cache instead of decoding the json
+    def no_json(file):
+        raise AssertionError("table json should not be read")
+
+    monkeypatch.setattr(table_ops, "_get_table_data_from_file", no_json)
+    cached = table_ops._get_table_like_awl_from_file(file).awl
+    assert cached.object_type == decoded.object_type
+    assert cached.to_pylist_notags() == decoded.to_pylist_notags()
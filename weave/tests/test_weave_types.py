@@ -6,6 +6,8 @@ import weave.weave_types
 from .. import errors
 from .. import weave_types as types
 from .. import runs
+from .. import box
+from ..language_features.tagging import tag_store
 from ..ops_primitives import _dict_utils
 from ..ops_domain import wbmedia
 
@@ -724,3 +726,79 @@ def test_union_auto_execute():
     assert weave.types.optional(weave.types.Timestamp()).assign_type(
         weave.types.Function(output_type=weave.types.optional(weave.types.Timestamp()))
     )
+
+
+def test_assign_and_merge_types_memoized():
+    t = types.TypedDict({"a": types.List(types.Int()), "b": types.String()})
+    t2 = types.TypeRegistry.type_from_dict(t.to_dict())
+    assert t2 == t and t2 is not t
+
+    assert t.assign_type(t2)
+    assert types._assign_type_memo[(types._interned(t), types._interned(t2))]
+    # Equal types share an interned type, but aren't replaced by it
+    assert types._interned(t2) is types._interned(t)
+    assert types.TypeRegistry.type_from_dict(t.to_dict()) is not t
+
+    other = types.TypedDict({"b": types.String(), "c": types.Int()})
+    merged = types.merge_types(t, other)
+    expected = types.TypedDict(
+        {
+            "a": types.optional(types.List(types.Int())),
+            "b": types.String(),
+            "c": types.optional(types.Int()),
+        }
+    )
+    assert merged == expected
+    assert (types._interned(t), types._interned(other)) in types._merge_types_memo
+    # Memo hits are copies, not the memoized instance
+    merged2 = types.merge_types(t2, other)
+    assert merged2 == merged
+    assert merged2 is not merged
+    assert (
+        merged2
+        is not types._merge_types_memo[(types._interned(t), types._interned(other))]
+    )
+
+
+def test_merge_types_not_memoized_for_unions():
+    a = types.TypedDict({"a": types.union(types.Int(), types.String())})
+    b = types.TypedDict({"a": types.union(types.String(), types.Int())})
+    c = types.TypedDict({"b": types.Int()})
+    merged_a = types.merge_types(a, c)
+    merged_b = types.merge_types(b, c)
+    assert (types._interned(a), types._interned(c)) not in types._merge_types_memo
+    # Each caller gets its own union member order
+    assert types.non_none(merged_a.property_types["a"]).members == [
+        types.Int(),
+        types.String(),
+    ]
+    assert types.non_none(merged_b.property_types["a"]).members == [
+        types.String(),
+        types.Int(),
+    ]
+
+
+def test_type_of_large_list_dedupes_shapes():
+    rows = [{"a": i, "b": [1.5] if i % 2 else []} for i in range(100)]
+    rows[50] = {"a": None, "b": ["x"], "c": True}
+    assert len(types._shape_representatives(rows)) == 3
+    assert types.TypeRegistry.type_of(rows) == types.List(
+        types.TypedDict(
+            {
+                "a": types.optional(types.Int()),
+                "b": types.List(types.union(types.Float(), types.String())),
+                "c": types.optional(types.Boolean()),
+            }
+        )
+    )
+
+    # Items that aren't plain python values use the full type walk
+    tagged = box.box(5)
+    tag_store.add_tags(tagged, {"t": "x"})
+    assert types._shape_representatives(rows + [tagged]) is None
+    assert types.TypeRegistry.type_of(rows[:40] + [tagged]) == types.List(
+        types.union(
+            types.TypedDict({"a": types.Int(), "b": types.List(types.Float())}),
+            TaggedValueType(types.TypedDict({"t": types.String()}), types.Int()),
+        )
+    )
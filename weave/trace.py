@@ -7,6 +7,23 @@ from . import weave_types as types
 from . import graph
 from . import runs
 from . import errors
+from . import trace_local
+
+
+def _is_creator(run: runs.Run, ref: ref_base.Ref) -> bool:
+    if isinstance(run.output, ref_base.Ref) and str(run.output) == str(ref):
+        # If any input is also the ref, this run did not create obj, since
+        # the obj already existed. This fixes an infinite loop where list-createIndexCheckpointTag
+        # which just returns its input would be treated as a the obj creator
+        # TODO: This whole thing is a pile of hacks, not production ready! Fix! We should
+        #     not need heuristics.
+        # TODO: for one, if we order all the artifacts by created_at, then
+        #     the first one will be the creator. Can't do that in this branch
+        #     since it doesn't have the created at change.
+        if any(str(input) == str(ref) for input in run.inputs.values()):
+            return False
+        return True
+    return False
 
 
 def get_obj_creator(ref: ref_base.Ref) -> typing.Optional[runs.Run]:
@@ -17,6 +34,9 @@ def get_obj_creator(ref: ref_base.Ref) -> typing.Optional[runs.Run]:
     # backend = ref.backend.filter(type="Run", referenced=ref.artifact)
     # Extremely inefficient!
     # TODO
+    for run in trace_local.TraceLocal().indexed_runs(output=ref):
+        if _is_creator(run, ref):
+            return run
     for art_name in os.listdir(artifact_local.local_artifact_dir()):
         if (
             art_name.startswith("run-")
@@ -30,26 +50,12 @@ def get_obj_creator(ref: ref_base.Ref) -> typing.Optional[runs.Run]:
                 # deserializes everything.
                 continue
 
-            def _is_creator(run):
-                if isinstance(run.output, ref_base.Ref) and str(run.output) == str(ref):
-                    # If any input is also the ref, this run did not create obj, since
-                    # the obj already existed. This fixes an infinite loop where list-createIndexCheckpointTag
-                    # which just returns its input would be treated as a the obj creator
-                    # TODO: This whole thing is a pile of hacks, not production ready! Fix! We should
-                    #     not need heuristics.
-                    # TODO: for one, if we order all the artifacts by created_at, then
-                    #     the first one will be the creator. Can't do that in this branch
-                    #     since it doesn't have the created at change.
-                    if any(str(input) == str(ref) for input in run.inputs.values()):
-                        return False
-                    return True
-
             if isinstance(cache_obj._ref.type, types.List):
                 for run in cache_obj:
-                    if _is_creator(run):
+                    if _is_creator(run, ref):
                         return run
             else:
-                if _is_creator(cache_obj):
+                if _is_creator(cache_obj, ref):
                     return cache_obj
     return None
 
@@ -70,6 +76,14 @@ def get_obj_expr(obj):
 
 def used_by(ref, op_name: str) -> list[runs.Run]:
     users = []
+    for run in trace_local.TraceLocal().indexed_runs(op_name=op_name):
+        run_inputs = list(run.inputs.values())
+        if (
+            run_inputs
+            and isinstance(run_inputs[0], artifact_local.LocalArtifactRef)
+            and ref.uri == run_inputs[0].uri
+        ):
+            users.append(run)
     for artifact_name in os.listdir(artifact_local.local_artifact_dir()):
         if artifact_name.startswith("run-") and not artifact_name.endswith("-output"):
             run = artifact_local.get_local_version(artifact_name, "latest")
@@ -5,6 +5,7 @@ import json
 import dataclasses
 import random
 
+from . import box
 from . import storage
 from . import ref_base
 from . import op_def
@@ -14,6 +15,10 @@ from . import graph
 from . import artifact_local
 from . import weave_internal
 from . import op_policy
+from . import environment
+from . import trace_local_index
+from . import uris
+from .language_features.tagging import tag_store
 
 
 @dataclasses.dataclass
@@ -22,14 +27,79 @@ class RunKey:
     id: str
 
 
+# Values can provide a cheap fingerprint for run keys by implementing
+# `_weave_fingerprint(self) -> typing.Optional[str]`. A fingerprint must change
+# whenever the value changes, and should be memoized on the object if it is
+# expensive to compute. Returning None falls back to serializing the value.
+def new_fingerprint_hash() -> "hashlib._Hash":
+    # blake2b is much faster than md5 and we don't need a cryptographic hash.
+    return hashlib.blake2b(digest_size=16)
+
+
+_PRIMITIVE_TYPES = (type(None), bool, int, float, str)
+_BOXED_PRIMITIVE_TYPES = (
+    box.BoxedNone,
+    box.BoxedBool,
+    box.BoxedInt,
+    box.BoxedFloat,
+    box.BoxedStr,
+)
+
+
+def _value_fingerprint(val: typing.Any) -> typing.Optional[str]:
+    fingerprint = _untagged_value_fingerprint(val)
+    if fingerprint is None or not tag_store.is_tagged(val):
+        return fingerprint
+    # Tag getter ops produce different results for equal values with
+    # different tags, so tags must be part of the fingerprint.
+    tags_fingerprint = _value_fingerprint(tag_store.get_tags(val))
+    if tags_fingerprint is None:
+        return None
+    return json.dumps([fingerprint, tags_fingerprint])
+
+
+def _untagged_value_fingerprint(val: typing.Any) -> typing.Optional[str]:
+    if isinstance(val, ref_base.Ref):
+        try:
+            return "ref:" + val.uri
+        except NotImplementedError:
+            return None
+    if type(val) in _BOXED_PRIMITIVE_TYPES:
+        val = box.unbox(val)
+    if type(val) in _PRIMITIVE_TYPES:
+        return "py:" + json.dumps(val)
+    fingerprint_fn = getattr(type(val), "_weave_fingerprint", None)
+    if fingerprint_fn is not None:
+        return fingerprint_fn(val)
+    if type(val) in (list, tuple, box.BoxedList):
+        items: typing.Iterable[typing.Tuple[typing.Any, typing.Any]] = enumerate(val)
+        hash = new_fingerprint_hash()
+        hash.update(b"list:")
+    elif type(val) in (dict, box.BoxedDict):
+        items = val.items()
+        hash = new_fingerprint_hash()
+        hash.update(b"dict:")
+    else:
+        return None
+    for k, v in items:
+        item_fingerprint = _value_fingerprint(v)
+        if item_fingerprint is None:
+            return None
+        hash.update(json.dumps([str(k), item_fingerprint]).encode())
+    return hash.hexdigest()
+
+
 def _value_id(val):
     # Important, do not include the type here, as it can change.
     # This happens because you can have a ref to an item that's in a list.
     # The list's object_type can change as items are appended to it.
     # We don't know the specific type of each item within the list without
     # further refinement.
+    fingerprint = _value_fingerprint(val)
+    if fingerprint is not None:
+        return fingerprint
     hash_val = json.dumps(storage.to_python(val)["_val"])
-    hash = hashlib.md5()
+    hash = new_fingerprint_hash()
     hash.update(json.dumps(hash_val).encode())
     return hash.hexdigest()
 
@@ -47,7 +117,7 @@ def make_run_key(op_def: op_def.OpDef, inputs_refs: Mapping[str, typing.Any]) ->
             "op_version": op_def.version,
             "inputs": hashable_inputs,
         }
-    hash = hashlib.md5()
+    hash = new_fingerprint_hash()
     hash.update(json.dumps(hash_val).encode())
 
     # For now, put op_def name in the run ID. This makes debugging much
@@ -56,6 +126,42 @@ def make_run_key(op_def: op_def.OpDef, inputs_refs: Mapping[str, typing.Any]) ->
     return RunKey(op_def.simple_name, hash.hexdigest())
 
 
+# The index stores inputs as JSON, which is enough to reconstruct run
+# lineage. Refs are stored by uri, other values only if they are primitives.
+def _encode_index_inputs(inputs: dict[str, typing.Any]) -> typing.Optional[str]:
+    encoded = {}
+    for name, val in inputs.items():
+        if isinstance(val, ref_base.Ref):
+            try:
+                encoded[name] = {"ref": val.uri}
+            except NotImplementedError:
+                return None
+            continue
+        if type(val) in _BOXED_PRIMITIVE_TYPES:
+            val = box.unbox(val)
+        if type(val) not in _PRIMITIVE_TYPES:
+            return None
+        encoded[name] = {"py": val}
+    return json.dumps(encoded)
+
+
+def _indexed_run_to_run(indexed: trace_local_index.IndexedRun) -> runs.Run:
+    inputs = {}
+    if indexed.inputs is not None:
+        for name, val in json.loads(indexed.inputs).items():
+            if "ref" in val:
+                inputs[name] = ref_base.Ref.from_str(val["ref"])
+            else:
+                inputs[name] = val["py"]
+    return runs.Run(
+        indexed.run_key,
+        indexed.op_name,
+        state="finished",
+        inputs=inputs,
+        output=ref_base.Ref.from_str(indexed.output_uri),
+    )
+
+
 # Trace interface. Makes use of objects and mutations to store trace data.
 # Manually constructs nodes and op calls to avoid recursively calling
 # the execute engine, either via use or type refinement.
@@ -71,9 +177,85 @@ class TraceLocal:
             run.inputs = inputs
         if output is not None:
             run.output = output
+        if self._should_index(run_key):
+            output_uri = None
+            if isinstance(output, ref_base.Ref):
+                try:
+                    output_uri = output.uri
+                except NotImplementedError:
+                    pass
+            if output_uri is not None:
+                # Finished runs only need to be found by run key, so they are
+                # recorded in the index instead of being saved as artifacts.
+                run.state = "finished"
+                self._index().put(
+                    run_key.id,
+                    run_key.op_simple_name,
+                    output_uri,
+                    inputs=_encode_index_inputs(run.inputs),
+                    artifact_name=self._owned_output_name(run_key, output_uri),
+                )
+                return graph.ConstNode(types.RunType(), run)
+            # Async runs are mutated as they execute, so they are still saved
+            # as artifacts. The index only records that they exist.
+            self.save_run(run)
+            self._index().put(run_key.id, run_key.op_simple_name, None)
+            return self.get_run(run_key)
         self.save_run(run)
         return self.get_run(run_key)
 
+    def _should_index(self, run_key: RunKey) -> bool:
+        return environment.trace_cache_index_enabled() and not (
+            self._should_save_to_table(run_key)
+        )
+
+    def indexed_runs(
+        self,
+        op_name: typing.Optional[str] = None,
+        output: typing.Optional[ref_base.Ref] = None,
+    ) -> list[runs.Run]:
+        """Finished runs recorded in the trace cache index, oldest first."""
+        if not environment.trace_cache_index_enabled():
+            return []
+        output_uri = None if output is None else str(output)
+        return [
+            _indexed_run_to_run(indexed)
+            for indexed in self._index().find(op_name=op_name, output_uri=output_uri)
+            if indexed.output_uri is not None
+        ]
+
+    def _index(self) -> trace_local_index.RunIndex:
+        return trace_local_index.get_run_index(artifact_local.local_artifact_dir())
+
+    def _output_name(self, run_key: RunKey) -> str:
+        return f"run-{run_key.op_simple_name}-{run_key.id}-output"
+
+    def _owned_output_name(
+        self, run_key: RunKey, output_uri: str
+    ) -> typing.Optional[str]:
+        # Only outputs saved by save_run_output belong to the run. Other
+        # outputs (like the result of get()) may be shared, so they are never
+        # evicted with the run.
+        uri = uris.WeaveURI.parse(output_uri)
+        if isinstance(uri, artifact_local.WeaveLocalArtifactURI) and (
+            uri.name == self._output_name(run_key)
+        ):
+            return uri.name
+        return None
+
+    def _indexed_run_val(
+        self, run_key: RunKey, indexed: trace_local_index.IndexedRun
+    ) -> typing.Optional[runs.Run]:
+        assert indexed.output_uri is not None
+        uri = uris.WeaveURI.parse(indexed.output_uri)
+        if isinstance(
+            uri, artifact_local.WeaveLocalArtifactURI
+        ) and not artifact_local.local_artifact_exists(uri.name, uri.version):
+            # The output was deleted out from under us, treat as a miss.
+            self._index().delete(run_key.id)
+            return None
+        return _indexed_run_to_run(indexed)
+
     def _single_run(self, run_key: RunKey) -> graph.Node[runs.Run]:
         single_uri = artifact_local.WeaveLocalArtifactURI(
             f"run-{run_key.op_simple_name}-{run_key.id}", "latest", "obj"
@@ -115,6 +297,12 @@ class TraceLocal:
     def get_run_val(self, run_key: RunKey) -> typing.Optional[runs.Run]:
         from . import execute_fast
 
+        if self._should_index(run_key):
+            indexed = self._index().get(run_key.id)
+            if indexed is None:
+                return None
+            if indexed.output_uri is not None:
+                return self._indexed_run_val(run_key, indexed)
         res = execute_fast._execute_fn_no_engine(None, None, self.get_run(run_key))
         return res
 
@@ -138,9 +326,7 @@ class TraceLocal:
             return self.save_object(output)
         # TODO: table caching is currently disabled, but this path doesn't handle it
         # when we turn it back on!
-        return self.save_object(
-            output, name=f"run-{run_key.op_simple_name}-{run_key.id}-output"
-        )
+        return self.save_object(output, name=self._output_name(run_key))
 
     def save_object(
         self, obj: typing.Any, name: typing.Optional[str] = None
@@ -0,0 +1,362 @@
+"""SQLite index of cached op runs, used by TraceLocal.
+
+Without the index, TraceLocal saves every run record as its own local
+artifact, and finds cached runs by executing a get op against it. That is a
+directory tree, a symlink and an md5 pass over every file for each op call,
+and nothing is ever deleted.
+
+With the index, a finished run is one row that points at the run's output
+ref. Run outputs are still saved as local artifacts, because downstream run
+keys and tags are restored through their refs. The index records how large
+each output artifact is and when it was last used, so it can evict the least
+recently used runs when the cache grows past its max size, or runs older than
+a max age. Evicted output artifacts are deleted by a background compaction
+thread.
+
+Server processes sharing an artifact dir share its index. Eviction and
+compaction run in sqlite write transactions, which sqlite serializes across
+processes, and the index's lock serializes threads within a process.
+
+Async runs are still stored as artifacts, because they are mutated while they
+run. The index only records that they exist.
+"""
+
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import typing
+import uuid
+
+from . import engine_trace
+from . import environment
+
+statsd = engine_trace.statsd()  # type: ignore
+
+INDEX_FILE_NAME = "run-index.sqlite"
+# Evicted output artifacts are moved here before they are deleted
+TOMBSTONE_DIR_NAME = ".evicted"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_key TEXT PRIMARY KEY,
+    op_name TEXT NOT NULL,
+    output_uri TEXT,
+    inputs TEXT,
+    artifact_name TEXT,
+    size_bytes INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_last_access ON runs (last_access);
+CREATE INDEX IF NOT EXISTS runs_output_uri ON runs (output_uri);
+CREATE TABLE IF NOT EXISTS evicted_artifacts (
+    artifact_name TEXT PRIMARY KEY,
+    evicted_at REAL NOT NULL
+);
+"""
+
+
+class IndexedRun(typing.NamedTuple):
+    run_key: str
+    op_name: str
+    # None for runs that are stored as artifacts (async runs)
+    output_uri: typing.Optional[str]
+    # JSON encoded inputs, see TraceLocal._encode_index_inputs
+    inputs: typing.Optional[str]
+
+
+def dir_size_bytes(path: str) -> int:
+    size = 0
+    for dirpath, _, fnames in os.walk(path):
+        for f in fnames:
+            try:
+                size += os.lstat(os.path.join(dirpath, f)).st_size
+            except FileNotFoundError:
+                pass
+    return size
+
+
+class RunIndex:
+    def __init__(
+        self,
+        artifact_dir: str,
+        max_bytes: int,
+        max_age_sec: typing.Optional[float] = None,
+        now_fn: typing.Callable[[], float] = time.time,
+    ) -> None:
+        self.artifact_dir = artifact_dir
+        self.max_bytes = max_bytes
+        self.max_age_sec = max_age_sec
+        self._now_fn = now_fn
+        self._lock = threading.Lock()
+        # run_key -> last access time, written to the db by _flush_access
+        self._pending_access: dict[str, float] = {}
+        self._conn = sqlite3.connect(
+            os.path.join(artifact_dir, INDEX_FILE_NAME),
+            check_same_thread=False,
+            isolation_level=None,
+            timeout=30,
+        )
+        # WAL lets processes read the index while another writes to it.
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_access()
+            self._conn.close()
+
+    def get(self, run_key: str) -> typing.Optional[IndexedRun]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT run_key, op_name, output_uri, inputs FROM runs "
+                "WHERE run_key = ?",
+                (run_key,),
+            ).fetchone()
+            if row is None:
+                statsd.increment("weave.run_index.miss")
+                return None
+            # Access times only matter to eviction, so we write them then.
+            self._pending_access[run_key] = self._now_fn()
+        statsd.increment("weave.run_index.hit")
+        return IndexedRun(*row)
+
+    def put(
+        self,
+        run_key: str,
+        op_name: str,
+        output_uri: typing.Optional[str],
+        inputs: typing.Optional[str] = None,
+        artifact_name: typing.Optional[str] = None,
+    ) -> None:
+        """Record a run.
+
+        artifact_name is the output artifact owned by this run, if any. Owned
+        artifacts count towards the cache size and are deleted on eviction.
+        """
+        size_bytes = 0
+        if artifact_name is not None:
+            size_bytes = dir_size_bytes(os.path.join(self.artifact_dir, artifact_name))
+        now = self._now_fn()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    run_key,
+                    op_name,
+                    output_uri,
+                    inputs,
+                    artifact_name,
+                    size_bytes,
+                    now,
+                    now,
+                ),
+            )
+            if artifact_name is not None:
+                self._conn.execute(
+                    "DELETE FROM evicted_artifacts WHERE artifact_name = ?",
+                    (artifact_name,),
+                )
+            over_size = self._total_bytes() > self.max_bytes
+        if over_size:
+            self.evict()
+
+    def find(
+        self,
+        op_name: typing.Optional[str] = None,
+        output_uri: typing.Optional[str] = None,
+    ) -> list[IndexedRun]:
+        """Find runs by op name and/or output uri, oldest first."""
+        query = "SELECT run_key, op_name, output_uri, inputs FROM runs WHERE 1"
+        params = []
+        if op_name is not None:
+            query += " AND op_name = ?"
+            params.append(op_name)
+        if output_uri is not None:
+            query += " AND output_uri = ?"
+            params.append(output_uri)
+        query += " ORDER BY created_at"
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        return [IndexedRun(*row) for row in rows]
+
+    def delete(self, run_key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM runs WHERE run_key = ?", (run_key,))
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes()
+
+    def _total_bytes(self) -> int:
+        return self._conn.execute(
+            "SELECT COALESCE(SUM(size_bytes), 0) FROM runs"
+        ).fetchone()[0]
+
+    def _flush_access(self) -> None:
+        if not self._pending_access:
+            return
+        self._conn.executemany(
+            "UPDATE runs SET last_access = MAX(last_access, ?) WHERE run_key = ?",
+            [(t, run_key) for run_key, t in self._pending_access.items()],
+        )
+        self._pending_access.clear()
+
+    def _evict_rows(self, rows: list[typing.Tuple[str, typing.Optional[str]]]) -> None:
+        self._conn.executemany(
+            "DELETE FROM runs WHERE run_key = ?", [(run_key,) for run_key, _ in rows]
+        )
+        # Wall clock time rather than _now_fn, since compact() compares it to
+        # the output's modification time.
+        evicted_at = time.time()
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO evicted_artifacts VALUES (?, ?)",
+            [(name, evicted_at) for _, name in rows if name is not None],
+        )
+        statsd.increment("weave.run_index.eviction", len(rows))
+
+    def evict(self) -> int:
+        """Drop runs older than max age, then least recently used runs until
+        the cache fits in max bytes. Returns the number of runs evicted.
+
+        Output artifacts are deleted later, by compact().
+        """
+        evicted = 0
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._flush_access()
+                if self.max_age_sec is not None:
+                    rows = self._conn.execute(
+                        "SELECT run_key, artifact_name FROM runs WHERE last_access < ?",
+                        (self._now_fn() - self.max_age_sec,),
+                    ).fetchall()
+                    self._evict_rows(rows)
+                    evicted += len(rows)
+                excess = self._total_bytes() - self.max_bytes
+                if excess > 0:
+                    rows = []
+                    cursor = self._conn.execute(
+                        "SELECT run_key, artifact_name, size_bytes FROM runs "
+                        "ORDER BY last_access"
+                    )
+                    for run_key, artifact_name, size_bytes in cursor:
+                        if excess <= 0:
+                            break
+                        rows.append((run_key, artifact_name))
+                        excess -= size_bytes
+                    self._evict_rows(rows)
+                    evicted += len(rows)
+                self._conn.execute("COMMIT")
+            except:
+                self._conn.execute("ROLLBACK")
+                raise
+        return evicted
+
+    def _tombstone(self, name: str, tombstone_dir: str) -> None:
+        """Move an evicted output out of the way, to be deleted later.
+
+        Must be called in a write transaction, so no process can register the
+        output with put() while we decide.
+        """
+        row = self._conn.execute(
+            "SELECT evicted_at FROM evicted_artifacts WHERE artifact_name = ?",
+            (name,),
+        ).fetchone()
+        if row is None:
+            # put() registered the output again since we read the names.
+            return
+        path = os.path.join(self.artifact_dir, name)
+        try:
+            saved_since_eviction = os.stat(path).st_mtime > row[0]
+        except FileNotFoundError:
+            saved_since_eviction = False
+        # If the run was recomputed and saved its output again after it was
+        # evicted, put() is about to register it, so we keep it.
+        if not saved_since_eviction:
+            try:
+                os.rename(path, os.path.join(tombstone_dir, uuid.uuid4().hex))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logging.warning("Failed to delete evicted run output %s", path)
+                return
+        self._conn.execute(
+            "DELETE FROM evicted_artifacts WHERE artifact_name = ?", (name,)
+        )
+
+    def compact(self) -> int:
+        """Evict, then delete the output artifacts of evicted runs. Returns the
+        number of artifacts deleted."""
+        self.evict()
+        with self._lock:
+            names = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT artifact_name FROM evicted_artifacts"
+                ).fetchall()
+            ]
+        tombstone_dir = os.path.join(self.artifact_dir, TOMBSTONE_DIR_NAME)
+        if names:
+            os.makedirs(tombstone_dir, exist_ok=True)
+        for name in names:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    self._tombstone(name, tombstone_dir)
+                    self._conn.execute("COMMIT")
+                except:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        deleted = 0
+        tombstones = os.listdir(tombstone_dir) if os.path.isdir(tombstone_dir) else []
+        for tombstone in tombstones:
+            path = os.path.join(tombstone_dir, tombstone)
+            try:
+                shutil.rmtree(path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logging.warning("Failed to delete evicted run output %s", path)
+        statsd.gauge("weave.run_index.bytes", self.total_bytes())
+        return deleted
+
+
+_indexes: dict[str, RunIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _compaction_loop(index: RunIndex, interval_sec: float) -> None:
+    while True:
+        time.sleep(interval_sec)
+        try:
+            index.compact()
+        except Exception:
+            logging.exception("Run index compaction failed")
+
+
+def get_run_index(artifact_dir: str) -> RunIndex:
+    """Get the process-wide index for a local artifact dir.
+
+    The first call for a dir starts its background compaction thread.
+    """
+    with _indexes_lock:
+        index = _indexes.get(artifact_dir)
+        if index is None:
+            index = RunIndex(
+                artifact_dir,
+                environment.trace_cache_max_bytes(),
+                environment.trace_cache_max_age_sec(),
+            )
+            _indexes[artifact_dir] = index
+            threading.Thread(
+                target=_compaction_loop,
+                args=(index, environment.trace_cache_compaction_interval_sec()),
+                daemon=True,
+            ).start()
+        return index
@@ -3,15 +3,81 @@
 
 from wandb.apis import public
 from wandb.sdk.internal.internal_api import _thread_local_api_settings
+import collections
+import functools
+import graphql
+import json
+import os
+import threading
+import time
 import typing
 
+from . import engine_trace
 from . import errors
 
+statsd = engine_trace.statsd()  # type: ignore
+
+# Max number of credentials we keep a GraphQL client for.
+MAX_GQL_CLIENTS = 32
+
+# Max number of parsed GraphQL queries to keep.
+MAX_PARSED_GQL_QUERIES = 1024
+
 
 def wandb_public_api() -> public.Api:
     return public.Api(timeout=30)
 
 
+# Creating a public Api creates a new http session, so queries pay for a new
+# connection every time. Apis cache runs and other objects, so we can't share
+# them in general, but their GraphQL clients are stateless. We keep the Api of
+# the most recently used credentials, and query with its client.
+_gql_apis: collections.OrderedDict[
+    typing.Tuple[typing.Optional[str], ...], public.Api
+] = collections.OrderedDict()
+_gql_apis_lock = threading.Lock()
+
+
+def _credentials_key() -> typing.Tuple[typing.Optional[str], ...]:
+    # Everything public.Api reads its url and credentials from.
+    return (
+        os.environ.get("WANDB_BASE_URL"),
+        os.environ.get("WANDB_API_KEY"),
+        _thread_local_api_settings.api_key,
+        json.dumps(_thread_local_api_settings.cookies, sort_keys=True, default=str),
+        json.dumps(_thread_local_api_settings.headers, sort_keys=True, default=str),
+    )
+
+
+def wandb_gql_client() -> typing.Any:
+    """The GraphQL client for the current credentials, shared across queries."""
+    key = _credentials_key()
+    with _gql_apis_lock:
+        api = _gql_apis.get(key)
+        if api is not None:
+            _gql_apis.move_to_end(key)
+            return api.client
+    api = wandb_public_api()
+    with _gql_apis_lock:
+        api = _gql_apis.setdefault(key, api)
+        _gql_apis.move_to_end(key)
+        while len(_gql_apis) > MAX_GQL_CLIENTS:
+            _gql_apis.popitem(last=False)
+    return api.client
+
+
+def clear_gql_clients() -> None:
+    with _gql_apis_lock:
+        _gql_apis.clear()
+
+
+@functools.lru_cache(maxsize=MAX_PARSED_GQL_QUERIES)
+def parse_gql(query_str: str) -> graphql.DocumentNode:
+    # Queries are built by compile_domain, so the same query strings are
+    # sent over and over. Parsed documents are not modified by execution.
+    return public.gql(query_str)
+
+
 def assert_wandb_authenticated() -> None:
     authenticated = (
         wandb_public_api().api_key is not None
@@ -26,10 +92,13 @@ def assert_wandb_authenticated() -> None:
 def wandb_gql_query(
     query_str: str, variables: dict[str, typing.Any] = {}
 ) -> typing.Any:
-    return wandb_public_api().client.execute(
-        public.gql(query_str),
-        variable_values=variables,
-    )
+    start_time = time.time()
+    query = parse_gql(query_str)
+    parse_time = time.time()
+    result = wandb_gql_client().execute(query, variable_values=variables)
+    statsd.timing("weave.wbgqlquery.parse", (parse_time - start_time) * 1000)
+    statsd.timing("weave.wbgqlquery.execute", (time.time() - parse_time) * 1000)
+    return result
 
 
 def set_wandb_thread_local_api_settings(
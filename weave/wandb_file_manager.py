@@ -37,6 +37,45 @@ def _file_path(uri: artifact_wandb.WeaveWBArtifactURI, md5_hex: str) -> str:
     return f"wandb_file_manager/{uri.entity_name}/{uri.project_name}/{uri.name}/{md5_hex}{extension}"
 
 
+def manifest_path(uri: artifact_wandb.WeaveWBArtifactURI) -> str:
+    assert uri.version is not None
+    return f"wandb_file_manager/{uri.entity_name}/{uri.project_name}/{uri.name}/manifest-{uri.version}.json"
+
+
+# Parsed manifests are shared by all file managers in the process, and by
+# WandbArtifact, keyed by manifest path (and user). Manifests are immutable
+# for a given version, so only missing manifests expire.
+_manifest_cache: typing.Optional[
+    cache.LruSizeBoundedCache[
+        str, typing.Optional[artifact_wandb.WandbArtifactManifest]
+    ]
+] = None
+
+MISSING_MANIFEST_TTL = datetime.timedelta(minutes=5)
+
+
+def get_manifest_cache() -> cache.LruSizeBoundedCache[
+    str, typing.Optional[artifact_wandb.WandbArtifactManifest]
+]:
+    global _manifest_cache
+    if _manifest_cache is None:
+        _manifest_cache = cache.LruSizeBoundedCache(
+            weave_env.manifest_cache_max_entries(),
+            weave_env.manifest_cache_max_bytes(),
+            stats_name="weave.manifest_cache",
+        )
+    return _manifest_cache
+
+
+def cache_manifest(
+    path: str, manifest: typing.Optional[artifact_wandb.WandbArtifactManifest]
+) -> None:
+    if manifest is None:
+        get_manifest_cache().set(path, None, 0, ttl=MISSING_MANIFEST_TTL)
+    else:
+        get_manifest_cache().set(path, manifest, manifest.approx_size_bytes())
+
+
 def _local_path_and_download_url(
     art_uri: artifact_wandb.WeaveWBArtifactURI,
     manifest: artifact_wandb.WandbArtifactManifest,
@@ -80,13 +119,9 @@ class WandbFileManagerAsync:
         self.fs = filesystem
         self.http = http
         self.wandb_api = wandb_api
-        self._manifests: cache.LruTimeWindowCache[
-            str, typing.Optional[artifact_wandb.WandbArtifactManifest]
-        ] = cache.LruTimeWindowCache(datetime.timedelta(minutes=5))
 
     def manifest_path(self, uri: artifact_wandb.WeaveWBArtifactURI) -> str:
-        assert uri.version is not None
-        return f"wandb_file_manager/{uri.entity_name}/{uri.project_name}/{uri.name}/manifest-{uri.version}.json"
+        return manifest_path(uri)
 
     async def _manifest(
         self, art_uri: artifact_wandb.WeaveWBArtifactURI, manifest_path: str
@@ -122,11 +157,11 @@ class WandbFileManagerAsync:
         with tracer.trace("wandb_file_manager.manifest") as span:
             assert art_uri.version is not None
             manifest_path = self.manifest_path(art_uri)
-            manifest = self._manifests.get(manifest_path)
-            if not isinstance(manifest, cache.LruTimeWindowCache.NotFound):
+            manifest = get_manifest_cache().get(manifest_path)
+            if not isinstance(manifest, cache.LruSizeBoundedCache.NotFound):
                 return manifest
             manifest = await self._manifest(art_uri, manifest_path)
-            self._manifests.set(manifest_path, manifest)
+            cache_manifest(manifest_path, manifest)
             return manifest
 
     async def local_path_and_download_url(
@@ -240,13 +275,9 @@ class WandbFileManager:
         self.fs = filesystem
         self.http = http
         self.wandb_api = wandb_api
-        self._manifests: cache.LruTimeWindowCache[
-            str, typing.Optional[artifact_wandb.WandbArtifactManifest]
-        ] = cache.LruTimeWindowCache(datetime.timedelta(minutes=5))
 
     def manifest_path(self, uri: artifact_wandb.WeaveWBArtifactURI) -> str:
-        assert uri.version is not None
-        return f"wandb_file_manager/{uri.entity_name}/{uri.project_name}/{uri.name}/manifest-{uri.version}.json"
+        return manifest_path(uri)
 
     def _manifest(
         self, art_uri: artifact_wandb.WeaveWBArtifactURI, manifest_path: str
@@ -282,11 +313,11 @@ class WandbFileManager:
         with tracer.trace("wandb_file_manager.manifest") as span:
             assert art_uri.version is not None
             manifest_path = self.manifest_path(art_uri)
-            manifest = self._manifests.get(manifest_path)
-            if not isinstance(manifest, cache.LruTimeWindowCache.NotFound):
+            manifest = get_manifest_cache().get(manifest_path)
+            if not isinstance(manifest, cache.LruSizeBoundedCache.NotFound):
                 return manifest
             manifest = self._manifest(art_uri, manifest_path)
-            self._manifests.set(manifest_path, manifest)
+            cache_manifest(manifest_path, manifest)
             return manifest
 
     def local_path_and_download_url(
@@ -13,6 +13,7 @@ import requests
 
 
 from . import engine_trace
+from . import environment
 from . import filesystem
 from . import server_error_handling
 
@@ -83,10 +84,23 @@ def logging_trace_config() -> aiohttp.TraceConfig:
 
 
 class HttpAsync:
-    def __init__(self, fs: filesystem.FilesystemAsync) -> None:
+    def __init__(
+        self,
+        fs: filesystem.FilesystemAsync,
+        max_inflight: typing.Optional[int] = None,
+        max_inflight_per_host: typing.Optional[int] = None,
+    ) -> None:
         self.fs = fs
 
-        conn = aiohttp.TCPConnector(limit=50)
+        # Requests over these limits wait in the connector's queue until a
+        # connection frees up. 0 means no limit.
+        if max_inflight is None:
+            max_inflight = environment.http_max_inflight_downloads()
+        if max_inflight_per_host is None:
+            max_inflight_per_host = environment.http_max_inflight_downloads_per_host()
+        conn = aiohttp.TCPConnector(
+            limit=max_inflight, limit_per_host=max_inflight_per_host
+        )
         trace_configs = []
         if ENABLE_REQUEST_TRACING:
             trace_configs.append(logging_trace_config())
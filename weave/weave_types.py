@@ -149,6 +149,87 @@ def _clear_global_type_class_cache():
     instance_class_to_potential_type.cache_clear()
     type_name_to_type_map.cache_clear()
     type_name_to_type.cache_clear()
+    _type_attrs_cache.clear()
+    _clear_type_memos()
+
+
+_type_attrs_cache: dict[type, list[str]] = {}
+
+# assign_type and merge_types results are memoized, keyed by interned
+# (hash-consed) types. Each type remembers its interned equal type, so a memo
+# lookup is a cached hash and identity comparisons, rather than a deep
+# comparison of two equal types.
+#
+# Interned types are only used as memo keys, and are never handed out in place
+# of the caller's type: weave attaches refs to objects (including types) by
+# identity, so equal types must not be merged into one object.
+#
+# Types containing Const or UnionType are never memoized. Const values take
+# part in equality, and values like 1 and True compare equal. UnionType
+# equality ignores member order, so a memoized merge would hand every caller
+# the first caller's member order.
+#
+# Memo hits return a copy of the memoized result, so callers can't change the
+# memoized type (or attach refs to it).
+#
+# The memos are cleared when they get too big, rather than evicting least
+# recently used entries, to keep hits cheap.
+MEMO_MAX_ENTRIES = 100000
+_interned_types: dict["Type", "Type"] = {}
+_assign_type_memo: dict[typing.Tuple["Type", "Type"], bool] = {}
+_merge_types_memo: dict[typing.Tuple["Type", "Type"], "Type"] = {}
+
+
+def _clear_type_memos() -> None:
+    _interned_types.clear()
+    _assign_type_memo.clear()
+    _merge_types_memo.clear()
+
+
+def _interned(t: "Type") -> "Type":
+    try:
+        return t.__dict__["_interned"]
+    except KeyError:
+        pass
+    interned = _interned_types.setdefault(t, t)
+    if len(_interned_types) > MEMO_MAX_ENTRIES:
+        _clear_type_memos()
+    t.__dict__["_interned"] = interned
+    return interned
+
+
+def _memoizable(t: "Type") -> bool:
+    try:
+        return t.__dict__["_memoizable"]
+    except KeyError:
+        pass
+    if isinstance(t, (Const, UnionType)):
+        result = False
+    else:
+        result = all(
+            _memoizable_value(getattr(t, field.name)) for field in dataclasses.fields(t)
+        )
+    t.__dict__["_memoizable"] = result
+    return result
+
+
+def _memoizable_value(v: typing.Any) -> bool:
+    if isinstance(v, Type):
+        return _memoizable(v)
+    if isinstance(v, dict):
+        return all(_memoizable_value(item) for item in v.values())
+    if isinstance(v, (list, tuple, set, frozenset)):
+        return all(_memoizable_value(item) for item in v)
+    return True
+
+
+def _copy_memoized(t: "Type") -> "Type":
+    # Copy the instance dict directly: copy.copy goes through __getattr__,
+    # which some types (like UnionType) implement in terms of their fields.
+    result = object.__new__(t.__class__)
+    result.__dict__.update(t.__dict__)
+    result.__dict__.pop("_ref", None)
+    return result
 
 
 def _cached_hash(self):
@@ -225,6 +306,10 @@ class Type(metaclass=_TypeSubclassWatcher):
 
     @classmethod
     def type_attrs(cls):
+        try:
+            return _type_attrs_cache[cls]
+        except KeyError:
+            pass
         type_attrs = []
         for field in dataclasses.fields(cls):
             if (inspect.isclass(field.type) and issubclass(field.type, Type)) or (
@@ -232,6 +317,7 @@ class Type(metaclass=_TypeSubclassWatcher):
                 and any(issubclass(a, Type) for a in field.type.__args__)
             ):
                 type_attrs.append(field.name)
+        _type_attrs_cache[cls] = type_attrs
         return type_attrs
 
     @property
@@ -274,6 +360,23 @@ class Type(metaclass=_TypeSubclassWatcher):
         return self._instance_classes()[-1]
 
     def assign_type(self, next_type: "Type") -> bool:
+        if not (_memoizable(self) and _memoizable(next_type)):
+            return self._assign_type_uncached(next_type)
+        try:
+            key = (_interned(self), _interned(next_type))
+            return _assign_type_memo[key]
+        except KeyError:
+            pass
+        except TypeError:
+            # Unhashable type
+            return self._assign_type_uncached(next_type)
+        result = self._assign_type_uncached(next_type)
+        if len(_assign_type_memo) >= MEMO_MAX_ENTRIES:
+            _assign_type_memo.clear()
+        _assign_type_memo[key] = result
+        return result
+
+    def _assign_type_uncached(self, next_type: "Type") -> bool:
         # assign_type needs to be as fast as possible, so there are optimizations
         # throughout this code path, like checking for class equality instead of using isinstance
 
@@ -775,6 +878,50 @@ class UnionType(Type):
         )
 
 
+# Large lists of plain python values (like rows of json) are usually made of
+# items with the same shape. Computing a shape signature per item is much
+# cheaper than building and merging a Type per item, so List.type_of_instance
+# only computes the types of one item per distinct shape.
+#
+# Shapes are only computed for the exact builtin classes below: their types
+# are determined by their class and contents alone, and they can't carry tags
+# (tags are only attached to boxed values). Lists containing anything else use
+# the full type walk.
+LIST_SHAPE_DEDUPE_MIN_LEN = 32
+_SHAPE_LEAF_CLASSES = frozenset([bool, int, float, str, type(None)])
+
+
+class _NoShape(Exception):
+    pass
+
+
+def _shape(obj: typing.Any) -> typing.Hashable:
+    obj_class = obj.__class__
+    if obj_class in _SHAPE_LEAF_CLASSES:
+        return obj_class
+    elif obj_class is dict:
+        return (dict, tuple((k, _shape(v)) for k, v in obj.items()))
+    elif obj_class is list:
+        return (list, tuple(dict.fromkeys(_shape(v) for v in obj)))
+    raise _NoShape()
+
+
+def _shape_representatives(
+    items: typing.Iterable[typing.Any],
+) -> typing.Optional[list[typing.Any]]:
+    """One item per distinct shape, in order of first appearance.
+
+    Returns None if any item doesn't have a shape.
+    """
+    representatives: dict[typing.Hashable, typing.Any] = {}
+    try:
+        for item in items:
+            representatives.setdefault(_shape(item), item)
+    except _NoShape:
+        return None
+    return list(representatives.values())
+
+
 @dataclasses.dataclass(frozen=True)
 class List(Type):
     name = "list"
@@ -786,6 +933,10 @@ class List(Type):
     def type_of_instance(cls, obj):
         if not obj:
             return cls(UnknownType())
+        if len(obj) >= LIST_SHAPE_DEDUPE_MIN_LEN:
+            representatives = _shape_representatives(obj)
+            if representatives is not None:
+                obj = representatives
         list_obj_type = TypeRegistry.type_of(obj[0])
         for item in obj[1:]:
             obj_type = TypeRegistry.type_of(item)
@@ -1278,6 +1429,26 @@ def merge_types(a: Type, b: Type) -> Type:
     This implementation must match list.concat implementations (which is the only
     way to extend a list in Weave). Ie list.concat(list[a], [b]) -> list[merge_types(a, b)]
     """
+    if a is b:
+        return a
+    if not (_memoizable(a) and _memoizable(b)):
+        return _merge_types_uncached(a, b)
+    try:
+        key = (_interned(a), _interned(b))
+        return _copy_memoized(_merge_types_memo[key])
+    except KeyError:
+        pass
+    except TypeError:
+        # Unhashable type
+        return _merge_types_uncached(a, b)
+    result = _merge_types_uncached(a, b)
+    if len(_merge_types_memo) >= MEMO_MAX_ENTRIES:
+        _merge_types_memo.clear()
+    _merge_types_memo[key] = _copy_memoized(result)
+    return result
+
+
+def _merge_types_uncached(a: Type, b: Type) -> Type:
     from .language_features.tagging import tagged_value_type
 
     if a == b: